@@ -0,0 +1,40 @@
+"""
+Cold start of a worker: importing the app, running its startup and serving the first request,
+each measured in a fresh interpreter.
+
+Runs with the app settings (.env), e.g.
+
+    python -m benchmarks.cold_start [runs]
+"""
+import json
+import statistics
+import subprocess
+import sys
+
+CHILD = """
+import json, time
+start = time.perf_counter()
+from fastapi.testclient import TestClient
+import main
+imported = time.perf_counter()
+with TestClient(main.app) as client:
+    started = time.perf_counter()
+    client.get("/internal/pool").raise_for_status()
+    served = time.perf_counter()
+print(json.dumps({"import": imported - start, "startup": started - imported, "first_request": served - started}))
+"""
+
+
+def run_once() -> dict:
+    output = subprocess.run([sys.executable, "-c", CHILD], check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    results = [run_once() for _ in range(runs)]
+    for phase in ("import", "startup", "first_request"):
+        times = [result[phase] * 1000 for result in results]
+        print(f"{phase:>13}: median {statistics.median(times):7.1f} ms, max {max(times):7.1f} ms")
+    total = [sum(result.values()) * 1000 for result in results]
+    print(f"{'cold start':>13}: median {statistics.median(total):7.1f} ms over {runs} runs")
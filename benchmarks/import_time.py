@@ -0,0 +1,72 @@
+"""
+Import time report of a worker, from python -X importtime in a fresh interpreter:
+the total time to import the app and the packages that cost the most.
+
+Runs with the app settings (.env), e.g.
+
+    python -m benchmarks.import_time [module] [top]
+"""
+import subprocess
+import sys
+from typing import List, NamedTuple
+
+# imported on first use by the code that needs them, never by importing the app
+DEFERRED_PACKAGES = ("cloudinary", "fastapi_mail", "libgravatar", "jinja2")
+
+
+class ImportTime(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def measure_imports(module: str = "main") -> List[ImportTime]:
+    """
+    The measure_imports function imports a module in a fresh interpreter under -X importtime.
+
+    :param module: str: The module to import
+    :return: Every module imported, in the order the interpreter finished importing them
+    """
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            check=True, capture_output=True, text=True).stderr
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        if not self_us.strip().isdigit():
+            # the header line
+            continue
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append(ImportTime(name.strip(), int(self_us), int(cumulative_us), depth))
+    return imports
+
+
+def total_us(imports: List[ImportTime], module: str = "main") -> int:
+    return next(item.cumulative_us for item in imports if item.module == module and item.depth == 0)
+
+
+def packages(imports: List[ImportTime]) -> dict:
+    """
+    The packages function sums the self time of the imported modules by top level package.
+
+    :param imports: List[ImportTime]: The result of measure_imports
+    :return: The import time in microseconds by package
+    """
+    totals = {}
+    for item in imports:
+        package = item.module.split(".")[0]
+        totals[package] = totals.get(package, 0) + item.self_us
+    return totals
+
+
+if __name__ == "__main__":
+    module = sys.argv[1] if len(sys.argv) > 1 else "main"
+    top = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+    imports = measure_imports(module)
+    print(f"import {module}: {total_us(imports, module) / 1000:.1f} ms, {len(imports)} modules")
+    for package, us in sorted(packages(imports).items(), key=lambda item: -item[1])[:top]:
+        print(f"{package:>24}: {us / 1000:7.1f} ms")
+    loaded = {item.module.split(".")[0] for item in imports}
+    print("deferred packages imported at startup:", ", ".join(sorted(loaded & set(DEFERRED_PACKAGES))) or "none")
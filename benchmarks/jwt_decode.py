@@ -0,0 +1,47 @@
+"""
+Per-request cost of authenticating an access token with and without the verified token cache.
+
+    python -m benchmarks.jwt_decode [iterations]
+"""
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+import rsa
+from jose import jwt
+
+from src.services.token_cache import VerifiedTokenCache
+
+
+def make_keys(algorithm: str):
+    if algorithm == "HS256":
+        return "benchmark-secret", "benchmark-secret"
+    public_key, private_key = rsa.newkeys(2048)
+    return private_key.save_pkcs1().decode(), public_key.save_pkcs1().decode()
+
+
+def run(algorithm: str, iterations: int) -> None:
+    signing_key, verifying_key = make_keys(algorithm)
+    claims = {"sub": "deadpool@example.com", "scope": "access_token", "iat": datetime.utcnow(),
+              "exp": datetime.utcnow() + timedelta(minutes=15)}
+    token = jwt.encode(claims, signing_key, algorithm=algorithm)
+    cache = VerifiedTokenCache(max_size=10000)
+
+    def cached_decode():
+        payload = cache.get(token)
+        if payload is None:
+            payload = jwt.decode(token, verifying_key, algorithms=[algorithm])
+            cache.put(token, payload)
+        return payload
+
+    uncached = min(timeit.repeat(lambda: jwt.decode(token, verifying_key, algorithms=[algorithm]),
+                                 number=iterations, repeat=3)) / iterations
+    cached = min(timeit.repeat(cached_decode, number=iterations, repeat=3)) / iterations
+    print(f"{algorithm}: jwt.decode {uncached * 1e6:8.1f} us/request, cached {cached * 1e6:6.1f} us/request, "
+          f"{uncached / cached:5.1f}x")
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    for algorithm in ("HS256", "RS256"):
+        run(algorithm, iterations)
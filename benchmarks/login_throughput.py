@@ -0,0 +1,56 @@
+"""
+Login throughput and the latency of concurrent cheap sync requests, with bcrypt verification run
+inline in the request threadpool (as sync routes did) or on the password pool.
+
+Runs with the app settings (.env), e.g.
+
+    python -m benchmarks.login_throughput [logins] [requests] [rounds]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+from fastapi.concurrency import run_in_threadpool
+from passlib.hash import bcrypt
+
+from src.services.password_pool import PasswordPool, verify_password
+
+
+async def cheap_request() -> float:
+    # a sync route doing a short database call
+    start = time.perf_counter()
+    await run_in_threadpool(time.sleep, 0.002)
+    return time.perf_counter() - start
+
+
+async def run(mode: str, logins: int, requests: int, hashed: str) -> None:
+    pool = PasswordPool(kind="thread", workers=os.cpu_count() or 1, max_pending=logins)
+
+    async def login():
+        if mode == "inline":
+            return await run_in_threadpool(verify_password, "secret", hashed)
+        return await pool.run(verify_password, "secret", hashed)
+
+    start = time.perf_counter()
+    login_tasks = [asyncio.create_task(login()) for _ in range(logins)]
+    await asyncio.sleep(0.01)
+    latencies = await asyncio.gather(*(cheap_request() for _ in range(requests)))
+    await asyncio.gather(*login_tasks)
+    elapsed = time.perf_counter() - start
+    pool.shutdown()
+    latencies = sorted(latencies)
+    print(f"{mode:>6}: {logins / elapsed:6.1f} logins/s, other requests "
+          f"p50 {statistics.median(latencies) * 1000:7.1f} ms, p95 {latencies[int(len(latencies) * 0.95)] * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    rounds = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    hashed = bcrypt.using(rounds=rounds).hash("secret")
+    print(f"{logins} concurrent logins (bcrypt rounds={rounds}), {requests} concurrent cheap requests, "
+          f"{os.cpu_count()} CPU")
+    for mode in ("inline", "pool"):
+        asyncio.run(run(mode, logins, requests, hashed))
@@ -0,0 +1,79 @@
+"""
+Throughput and Redis commands per request of fastapi_limiter's RateLimiter (one Lua script call
+per request), the Redis sliding window limiter (one script call per request) and the local
+token bucket limiter synced with Redis in the background.
+
+The app no longer depends on fastapi-limiter, its RateLimiter is only measured when the package
+is installed (pip install fastapi-limiter). Needs the Redis server of the app settings (.env), e.g.
+
+    python -m benchmarks.rate_limiter [requests] [clients]
+"""
+import asyncio
+import sys
+import time
+
+import httpx
+from fastapi import Depends, FastAPI, Request, Response
+try:
+    from fastapi_limiter import FastAPILimiter
+    from fastapi_limiter.depends import RateLimiter
+except ImportError:
+    FastAPILimiter = None
+
+from src.services.rate_limit import LocalRateLimiter, RateLimit, RedisRateLimiter, client_identifier
+from src.services.redis_client import async_redis
+
+
+async def commands_processed() -> int:
+    return int((await async_redis.info("stats"))["total_commands_processed"])
+
+
+async def run(mode: str, requests: int, clients: int) -> None:
+    app = FastAPI()
+    # high enough that no request is rejected, the benchmark measures the cost of the check
+    if mode == "fastapi_limiter":
+        await FastAPILimiter.init(async_redis)
+        dependency = RateLimiter(times=requests, seconds=60)
+    else:
+        limits = {"benchmark": RateLimit(requests, 60)}
+        if mode == "local":
+            limiter = LocalRateLimiter(limits, async_redis, sync_interval=0.5)
+        else:
+            limiter = RedisRateLimiter(limits, async_redis)
+        limiter.start()
+
+        async def dependency(request: Request, response: Response):
+            await limiter.check(request, response, "benchmark", client_identifier(request))
+
+    @app.get("/ping", dependencies=[Depends(dependency)])
+    async def ping():
+        return {}
+
+    async def client(index: int):
+        headers = {"X-Forwarded-For": f"10.0.0.{index}"}
+        async with httpx.AsyncClient(app=app, base_url="http://benchmark") as http:
+            for _ in range(requests // clients):
+                (await http.get("/ping", headers=headers)).raise_for_status()
+
+    before = await commands_processed()
+    start = time.perf_counter()
+    await asyncio.gather(*(client(index) for index in range(clients)))
+    elapsed = time.perf_counter() - start
+    if mode != "fastapi_limiter":
+        await limiter.stop()
+    commands = await commands_processed() - before - 1
+    print(f"{mode:>15}: {requests / elapsed:8.1f} requests/s, {commands / requests:5.2f} Redis commands/request")
+
+
+async def main(requests: int, clients: int) -> None:
+    print(f"{requests} requests from {clients} clients")
+    modes = ("fastapi_limiter", "redis", "local") if FastAPILimiter is not None else ("redis", "local")
+    for mode in modes:
+        await run(mode, requests, clients)
+    await async_redis.close()
+
+
+if __name__ == "__main__":
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    asyncio.run(main(requests, clients))
@@ -1,12 +1,20 @@
 
+import os
+
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 
+# count rate limits in process, the tests do not need a Redis server
+os.environ.setdefault("RATE_LIMITER", "memory")
+os.environ.setdefault("CONTACT_VERSIONS", "memory")
+os.environ.setdefault("REPLICA_PINS", "memory")
+
 from main import app
 from src.database.models import Base
 from src.database.db import get_db
+from src.services.rate_limit import rate_limiter
 
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
@@ -31,6 +39,29 @@ def session():
         db.close()
 
 
+@pytest.fixture(autouse=True)
+def clear_rate_limits():
+    # every test starts with empty rate limit counters
+
+    rate_limiter.clear()
+
+
+@pytest.fixture()
+def query_counter():
+    # Collects the SQL statements sent to the test database while the test runs
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
 @pytest.fixture(scope="module")
 def client(session):
     # Dependency override
@@ -1,16 +1,18 @@
-import redis.asyncio as redis
+from contextlib import asynccontextmanager
+
 import uvicorn
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 
-
-from fastapi_limiter import FastAPILimiter
-from fastapi_limiter.depends import RateLimiter
-
-from src.database.db import Base, engine
-from src.routes import contacts, auth, users
-
-app = FastAPI()
+from src.conf.config import settings
+from src.database.db import engine
+from src.database.models import Base
+from src.database.shards import shard_map
+from src.services.redis_client import close_redis
+from src.services.password_pool import password_pool
+from src.services.rate_limit import rate_limiter
+from src.services.route_audit import check_routes
 
 # setup CORS
 origins = [
@@ -18,40 +20,66 @@ origins = [
     "http://localhost:8095",
 ]
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# create tables
-Base.metadata.create_all(bind=engine)
-
-# include routes
-app.include_router(auth.router)
-app.include_router(contacts.router)
-app.include_router(users.router)
-
-# setup rate limiting
-@app.on_event("startup")
-async def startup():
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    The lifespan function sets up the resources of the application when it starts and releases them when it stops.
+    Nothing connects to the database or Redis at import, so importing the app (workers, test collection,
+    Alembic) stays cheap. On startup it refuses duplicate routes, creates the tables if db_create_all is set,
+    refuses contact shards whose id ranges overlap and starts the rate limiter, the routes declare their
+    rate limit policy (see src.services.rate_limit).
+    On shutdown it closes the Redis connections and the password pool.
+
+    :param app: FastAPI: The application
+    :return: None
     """
-    The startup function is called when the application starts up.
-    It's a good place to initialize things that are needed by your app,
-    like connecting to databases or initializing external APIs.
+    check_routes(app.routes, settings.route_table_max)
+    if settings.db_create_all:
+        await run_in_threadpool(Base.metadata.create_all, bind=engine)
+    if shard_map.enabled:
+        await run_in_threadpool(shard_map.check_id_ranges)
+    rate_limiter.start()
+    yield
+    await rate_limiter.stop()
+    await close_redis()
+    password_pool.shutdown()
+
 
-    :return: A fastapilimiter instance
+def create_app() -> FastAPI:
     """
-    r = await redis.Redis(host='localhost', port=6379, db=0, encoding="utf-8", decode_responses=True)
-    await FastAPILimiter.init(r)
-
-# apply rate limiting to contacts routes
-app.include_router(
-    contacts.router,
-    dependencies=[Depends(RateLimiter(times=2, seconds=5))]
-)
+    The create_app function builds the application: middleware and the routers of the database mode.
+
+    :return: The application
+    """
+    # DATABASE_MODE=async serves the same API from async def routes over the AsyncSession
+    if settings.database_mode == "async":
+        from src.routes import contacts_async as contacts, auth_async as auth, users_async as users
+    else:
+        from src.routes import contacts, auth, users
+
+    app = FastAPI(lifespan=lifespan)
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=origins,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # include routes
+    app.include_router(auth.router)
+    app.include_router(contacts.router)
+    app.include_router(users.router)
+    # the diagnostics are not public, they are only mounted when a token to read them is configured
+    if settings.internal_token:
+        from src.routes import internal
+        app.include_router(internal.router)
+    return app
+
+
+app = create_app()
 
 if __name__ == "__main__":
     uvicorn.run(app, host="127.0.0.1", port=8095)
@@ -0,0 +1,34 @@
+"""contacts birthday day of year
+
+Revision ID: 2f6a9b7d4c13
+Revises: 8c3e4d2a91f0
+Create Date: 2026-10-16 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2f6a9b7d4c13'
+down_revision = '8c3e4d2a91f0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('birthday_doy', sa.Integer(), nullable=True))
+    # day of year counted in a leap year (2000), matching models.birthday_day_of_year
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("UPDATE contacts SET birthday_doy = extract(doy from make_date(2000, "
+                   "extract(month from birthday)::int, extract(day from birthday)::int))::int "
+                   "WHERE birthday IS NOT NULL")
+    else:
+        op.execute("UPDATE contacts SET birthday_doy = CAST(strftime('%j', '2000' || substr(birthday, 5, 6)) AS INTEGER) "
+                   "WHERE birthday IS NOT NULL")
+    op.create_index('ix_contacts_user_id_birthday_doy', 'contacts', ['user_id', 'birthday_doy'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_birthday_doy', table_name='contacts')
+    op.drop_column('contacts', 'birthday_doy')
@@ -0,0 +1,24 @@
+"""users tokens revoked at
+
+Revision ID: 5b8d1e7c2a94
+Revises: 9d2e6f1b3a57
+Create Date: 2026-10-16 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8d1e7c2a94'
+down_revision = '9d2e6f1b3a57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('tokens_revoked_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'tokens_revoked_at')
@@ -0,0 +1,54 @@
+"""contact search indexes
+
+Revision ID: 8c3e4d2a91f0
+Revises: 5b1f0c9e7a21
+Create Date: 2026-10-16 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c3e4d2a91f0'
+down_revision = '5b1f0c9e7a21'
+branch_labels = None
+depends_on = None
+
+TRGM_COLUMNS = ['first_name', 'last_name', 'email']
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for column in TRGM_COLUMNS:
+            op.create_index(f'ix_contacts_{column}_trgm', 'contacts', [column], unique=False,
+                            postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'})
+    elif dialect == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5("
+                   "first_name, last_name, email, content='contacts', content_rowid='id', tokenize='trigram')")
+        op.execute("CREATE TRIGGER IF NOT EXISTS contacts_fts_ai AFTER INSERT ON contacts BEGIN "
+                   "INSERT INTO contacts_fts(rowid, first_name, last_name, email) "
+                   "VALUES (new.id, new.first_name, new.last_name, new.email); END")
+        op.execute("CREATE TRIGGER IF NOT EXISTS contacts_fts_ad AFTER DELETE ON contacts BEGIN "
+                   "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email) "
+                   "VALUES ('delete', old.id, old.first_name, old.last_name, old.email); END")
+        op.execute("CREATE TRIGGER IF NOT EXISTS contacts_fts_au AFTER UPDATE ON contacts BEGIN "
+                   "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email) "
+                   "VALUES ('delete', old.id, old.first_name, old.last_name, old.email); "
+                   "INSERT INTO contacts_fts(rowid, first_name, last_name, email) "
+                   "VALUES (new.id, new.first_name, new.last_name, new.email); END")
+        # index the rows that existed before the triggers
+        op.execute("INSERT INTO contacts_fts(contacts_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for column in TRGM_COLUMNS:
+            op.drop_index(f'ix_contacts_{column}_trgm', table_name='contacts')
+    elif dialect == 'sqlite':
+        for trigger in ('contacts_fts_ai', 'contacts_fts_ad', 'contacts_fts_au'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS contacts_fts")
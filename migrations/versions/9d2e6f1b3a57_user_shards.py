@@ -0,0 +1,28 @@
+"""user shards
+
+Revision ID: 9d2e6f1b3a57
+Revises: 2f6a9b7d4c13
+Create Date: 2026-10-16 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d2e6f1b3a57'
+down_revision = '2f6a9b7d4c13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('user_shards',
+                    sa.Column('user_id', sa.Integer(), nullable=False),
+                    sa.Column('shard', sa.String(length=50), nullable=False),
+                    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+                    sa.PrimaryKeyConstraint('user_id'))
+
+
+def downgrade() -> None:
+    op.drop_table('user_shards')
@@ -1,10 +1,56 @@
+from typing import Dict, List, Optional
+
 from pydantic import BaseSettings
 
 
 class Settings(BaseSettings):
     sqlalchemy_database_url: str
+    database_mode: str = 'sync'
+    async_database_url: Optional[str] = None
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    # create missing tables on startup, deployments migrated with Alembic can turn it off
+    db_create_all: bool = True
+    # read-only contact routes read from these replicas (a JSON list of urls), falling back to the primary
+    # when none passed its last check or lags more than replica_max_lag seconds
+    replica_database_urls: List[str] = []
+    replica_max_lag: float = 5
+    replica_check_interval: float = 5
+    # after a write the user reads from the primary for this long, so it sees its own writes
+    replica_pin_seconds: float = 10
+    # 'redis' shares these pins between workers, 'memory' keeps them in process (single worker only)
+    replica_pins: str = 'redis'
+    # contacts of a user live on the main database or on one of these shards (a JSON object of name: url),
+    # picked by the hash of the user id unless the user_shards table says otherwise
+    shard_database_urls: Dict[str, str] = {}
+    shard_lookup_ttl: float = 30
+    shard_move_batch_size: int = 1000
+    contact_search_engine: str = 'ilike'
+    contact_search_limit: int = 50
+    contact_search_index: bool = False
+    contact_search_index_memory_mb: int = 64
+    contact_search_index_ttl: float = 300
+    contact_bulk_chunk_size: int = 1000
+    contact_bulk_max_errors: int = 1000
+    contact_export_batch_size: int = 1000
     secret_key: str
     algorithm: str
+    jwt_cache_size: int = 10000
+    # 'redis' keeps refresh token families in Redis, 'db' only uses the refresh_token column of the user
+    refresh_token_store: str = 'redis'
+    refresh_token_ttl: int = 7 * 24 * 3600
+    # the first scheme hashes new passwords, keep the previous ones listed while their hashes exist
+    password_schemes: str = 'bcrypt'
+    bcrypt_rounds: int = 12
+    argon2_time_cost: int = 3
+    argon2_memory_cost: int = 65536
+    argon2_parallelism: int = 4
+    password_pool: str = 'thread'
+    password_workers: int = 4
+    password_max_pending: int = 64
     mail_username: str
     mail_password: str
     mail_from: str
@@ -12,6 +58,30 @@ class Settings(BaseSettings):
     mail_server: str
     redis_host: str = 'localhost'
     redis_port: int = 6379
+    redis_connect_timeout: float = 0.5
+    redis_timeout: float = 1
+    redis_max_connections: int = 50
+    # 'redis' counts sliding windows in Redis (one script call per request), 'memory' counts them in process,
+    # 'local' keeps token buckets in process and syncs them with Redis every rate_limit_sync_interval seconds
+    rate_limiter: str = 'redis'
+    # times/seconds by policy (search, reads, writes, login) or, to override a single route, by route name
+    rate_limits: Dict[str, str] = {'search': '30/60', 'reads': '120/60', 'writes': '60/60', 'login': '10/60'}
+    rate_limit_sync_interval: float = 0.5
+    # proxies in front of the app that append to X-Forwarded-For, 0 identifies clients by the peer address
+    trusted_proxies: int = 0
+    # the diagnostics under /internal are only mounted with a token, requests send it in X-Internal-Token
+    internal_token: Optional[str] = None
+    # startup warns above this many routes, every request may scan the whole table
+    route_table_max: int = 64
+    # 'redis' shares the contact version counters behind the ETags of contact reads between workers,
+    # 'memory' keeps them in process (single worker only)
+    contact_versions: str = 'redis'
+    contact_version_ttl: int = 7 * 24 * 3600
+    # clients may keep contact reads but revalidate them with If-None-Match every time
+    contact_cache_control: str = 'private, no-cache'
+    user_cache_ttl: int = 900
+    user_cache_local_size: int = 1024
+    user_cache_local_ttl: float = 5
     cloudinary_name: str
     cloudinary_api_key: str
     cloudinary_api_secret: str
@@ -21,4 +91,4 @@ class Settings(BaseSettings):
         env_file_encoding = "utf-8"
 
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
@@ -1,18 +1,66 @@
 import os
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
+from src.conf.config import settings
+from src.database.pool import InstrumentedAsyncQueuePool, InstrumentedQueuePool
+
 load_dotenv()
 
 SQLALCHEMY_DATABASE_URL = os.getenv("SQLALCHEMY_DATABASE_URL")
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def get_async_database_url(url: str) -> str:
+    """
+    The get_async_database_url function maps a sync database url onto its async driver,
+    e.g. postgresql:// becomes postgresql+asyncpg:// and sqlite:// becomes sqlite+aiosqlite://.
+
+    :param url: str: The sync database url
+    :return: The database url for the async engine
+    """
+    sync_url = make_url(url)
+    drivername = ASYNC_DRIVERS.get(sync_url.drivername, sync_url.drivername)
+    return sync_url.set(drivername=drivername).render_as_string(hide_password=False)
+
+
+def get_pool_options() -> dict:
+    """
+    The get_pool_options function collects the connection pool settings shared by the sync and async engines.
+    pool_pre_ping tests each connection on checkout, so connections dropped by a database restart
+    are replaced transparently, and pool_recycle retires connections before server-side idle timeouts.
+
+    :return: Keyword arguments for create_engine / create_async_engine
+    """
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, poolclass=InstrumentedQueuePool, **get_pool_options())
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base = declarative_base()
+# the async engine is only built in async mode, so the sync deployment does not need asyncpg/aiosqlite
+ASYNC_DATABASE_URL = settings.async_database_url or get_async_database_url(SQLALCHEMY_DATABASE_URL)
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL, poolclass=InstrumentedAsyncQueuePool, **get_pool_options()
+) if settings.database_mode == "async" else None
+
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 
 def get_db():
     """
@@ -26,3 +74,14 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db() -> AsyncSession:
+    """
+    The get_async_db function is the async counterpart of get_db.
+    It yields an AsyncSession bound to the async engine and closes it after each request.
+
+    :return: An async database session
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,12 +1,28 @@
-from sqlalchemy import Column, Integer, String, Date, DateTime, Boolean
+from datetime import date
+
+from sqlalchemy import Column, Integer, String, Date, DateTime, Boolean, Index, DDL, event
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, validates
 
 from sqlalchemy.sql.schema import ForeignKey
 
 Base = declarative_base()
 
+
+def birthday_day_of_year(birthday: date):
+    """
+    The birthday_day_of_year function returns the day of year of a birthday counted in a leap year,
+    so every calendar day has the same number whatever the birth year (Feb 29 is 60, Mar 1 is always 61).
+
+    :param birthday: date: The birthday
+    :return: The normalized day of year (1-366), or None without a birthday
+    """
+    if birthday is None:
+        return None
+    return date(2000, birthday.month, birthday.day).timetuple().tm_yday
+
+
 class Contact(Base):
     __tablename__ = "contacts"
 
@@ -16,10 +32,28 @@ class Contact(Base):
     email = Column(String, unique=True, index=True)
     phone = Column(String, unique=True, index=True)
     birthday = Column(Date, index=True)
+    birthday_doy = Column(Integer, nullable=True)
     additional_info = Column(String, nullable=True)
     user_id = Column('user_id', ForeignKey('users.id', ondelete='CASCADE'), default=None)
     user = relationship('User', backref="contacts")
 
+    __table_args__ = (
+        Index('ix_contacts_user_id_id', 'user_id', 'id'),
+        Index('ix_contacts_user_id_birthday_doy', 'user_id', 'birthday_doy'),
+        # trigram indexes let ILIKE '%q%' search use an index on Postgres (requires pg_trgm)
+        Index('ix_contacts_first_name_trgm', 'first_name', postgresql_using='gin',
+              postgresql_ops={'first_name': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+        Index('ix_contacts_last_name_trgm', 'last_name', postgresql_using='gin',
+              postgresql_ops={'last_name': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+        Index('ix_contacts_email_trgm', 'email', postgresql_using='gin',
+              postgresql_ops={'email': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+    )
+
+    @validates('birthday')
+    def _set_birthday_doy(self, key, birthday):
+        self.birthday_doy = birthday_day_of_year(birthday)
+        return birthday
+
 
 class User(Base):
     __tablename__ = "users"
@@ -31,4 +65,37 @@ class User(Base):
     avatar = Column(String(255), nullable=True)
     refresh_token = Column(String(255), nullable=True)
     confirmed = Column(Boolean, default=False)
+    # access tokens issued before this time (whole seconds, UTC) are rejected, set on password change
+    tokens_revoked_at = Column(DateTime, nullable=True)
+
+
+class UserShard(Base):
+    # users whose contacts live on another shard than the hash of their id says (see src.database.shards),
+    # kept in the main database
+    __tablename__ = "user_shards"
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    shard = Column(String(50), nullable=False)
+
+
+# SQLite stand-in for the trigram indexes: an external content FTS5 table with the trigram tokenizer,
+# kept in sync with contacts by triggers
+CONTACTS_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5("
+    "first_name, last_name, email, content='contacts', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_ai AFTER INSERT ON contacts BEGIN "
+    "INSERT INTO contacts_fts(rowid, first_name, last_name, email) "
+    "VALUES (new.id, new.first_name, new.last_name, new.email); END",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_ad AFTER DELETE ON contacts BEGIN "
+    "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email) "
+    "VALUES ('delete', old.id, old.first_name, old.last_name, old.email); END",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_au AFTER UPDATE ON contacts BEGIN "
+    "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email) "
+    "VALUES ('delete', old.id, old.first_name, old.last_name, old.email); "
+    "INSERT INTO contacts_fts(rowid, first_name, last_name, email) "
+    "VALUES (new.id, new.first_name, new.last_name, new.email); END",
+]
 
+event.listen(Base.metadata, 'before_create', DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect='postgresql'))
+for statement in CONTACTS_FTS_DDL:
+    event.listen(Contact.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(Contact.__table__, 'before_drop', DDL("DROP TABLE IF EXISTS contacts_fts").execute_if(dialect='sqlite'))
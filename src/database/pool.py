@@ -0,0 +1,102 @@
+import bisect
+import threading
+import time
+from typing import List, Optional
+
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+# upper bounds of the checkout wait time buckets, in milliseconds
+WAIT_BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+
+class PoolStats:
+    """
+    Checkout wait time histogram shared by the instrumented pools.
+    Every connection checkout records how long it waited for the pool,
+    checkouts that hit pool_timeout are counted separately.
+    """
+
+    def __init__(self, buckets: List[float] = None):
+        self.buckets = list(buckets or WAIT_BUCKETS_MS)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counts = [0] * (len(self.buckets) + 1)
+            self.checkouts = 0
+            self.timeouts = 0
+            self.wait_total_ms = 0.0
+            self.wait_max_ms = 0.0
+
+    def observe(self, wait_ms: float) -> None:
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, wait_ms)] += 1
+            self.checkouts += 1
+            self.wait_total_ms += wait_ms
+            self.wait_max_ms = max(self.wait_max_ms, wait_ms)
+
+    def observe_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def histogram(self) -> dict:
+        with self._lock:
+            labels = [f"le_{bound}ms" for bound in self.buckets] + ["inf"]
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_avg_ms": round(self.wait_total_ms / self.checkouts, 3) if self.checkouts else 0.0,
+                "wait_max_ms": round(self.wait_max_ms, 3),
+                "buckets": dict(zip(labels, self.counts)),
+            }
+
+
+class _InstrumentedPoolMixin:
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.stats.observe_timeout()
+            raise
+        self.stats.observe((time.perf_counter() - start) * 1000)
+        return connection
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    """QueuePool that records checkout wait times in PoolStats."""
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that records checkout wait times in PoolStats."""
+
+
+def pool_status(pool: Optional[Pool]) -> Optional[dict]:
+    """
+    The pool_status function returns the current occupancy of a pool together with its wait histogram.
+
+    :param pool: Pool: The engine pool to inspect
+    :return: A dict with size, checked_in, checked_out, overflow and wait time statistics
+    """
+    if pool is None:
+        return None
+    status = {"class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=max(pool.overflow(), 0),
+            timeout=pool.timeout(),
+        )
+    stats = getattr(pool, "stats", None)
+    if stats is not None:
+        status["wait"] = stats.histogram()
+    return status
@@ -0,0 +1,192 @@
+"""
+Moves the contacts of a user between shards (see src.database.shards), e.g.
+
+    python -m src.database.rebalance move 42 east
+    python -m src.database.rebalance record
+    python -m src.database.rebalance ids
+
+record writes the current shard of every user without one to user_shards, run it with the current
+shard settings before adding a shard, so adding it does not move users by hash.
+ids gives the contacts id sequence of every shard its own block of ids, main the first one and the shards
+the next ones in the order of SHARD_DATABASE_URLS, so add new shards at its end.
+"""
+import argparse
+import time
+from typing import Callable, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+
+from src.conf.config import settings
+from src.database.models import Contact, User, UserShard
+from src.database.shards import MAIN_SHARD, ShardMap, shard_map
+
+
+def copy_contacts(source: Engine, target: Engine, user_id: int, after_id: int, batch_size: int) -> Tuple[int, int]:
+    """
+    The copy_contacts function streams the contacts of a user with an id above after_id from source to target,
+    one transaction per batch. The contacts keep their ids.
+
+    :param source: Engine: The shard the contacts are read from
+    :param target: Engine: The shard the contacts are written to
+    :param user_id: int: The id of the user
+    :param after_id: int: Only contacts with a larger id are copied
+    :param batch_size: int: The number of contacts per round trip
+    :return: The number of contacts copied and the largest id copied
+    """
+    copied, last_id = 0, after_id
+    statement = select(Contact.__table__).where(Contact.user_id == user_id, Contact.id > after_id)\
+        .order_by(Contact.id).execution_options(yield_per=batch_size)
+    with source.connect() as source_connection:
+        for rows in source_connection.execute(statement).partitions():
+            with target.begin() as target_connection:
+                target_connection.execute(insert(Contact.__table__), [dict(row._mapping) for row in rows])
+            copied += len(rows)
+            last_id = rows[-1].id
+    return copied, last_id
+
+
+def delete_contacts(engine: Engine, user_id: int, batch_size: int) -> int:
+    """
+    The delete_contacts function deletes the contacts of a user in batches of batch_size,
+    so no transaction holds locks on all of them.
+
+    :param engine: Engine: The shard
+    :param user_id: int: The id of the user
+    :param batch_size: int: The number of contacts per transaction
+    :return: The number of contacts deleted
+    """
+    deleted = 0
+    while True:
+        with engine.begin() as connection:
+            ids = connection.execute(select(Contact.id).where(Contact.user_id == user_id)
+                                     .order_by(Contact.id).limit(batch_size)).scalars().all()
+            if not ids:
+                return deleted
+            connection.execute(delete(Contact).where(Contact.id.in_(ids)))
+        deleted += len(ids)
+
+
+def move_user(shards: ShardMap, user_id: int, target: str, batch_size: int = 1000, settle: Optional[float] = None,
+              sleep: Callable[[float], None] = time.sleep) -> dict:
+    """
+    The move_user function moves the contacts of a user to another shard.
+
+    The contacts are copied in batches, then user_shards sends the user to the target. The workers may
+    still use the source for up to their lookup_ttl, so after settle seconds (lookup_ttl by default)
+    the contacts created on the source meanwhile are copied too, and the contacts are deleted from
+    the source in batches. Changes made to already copied contacts during the move are not carried over,
+    move users while they are idle. The id ranges of the shards are checked first (see ShardMap.check_id_ranges).
+    A conflict on the target (a taken email or phone) rolls the copy back and leaves the user on the source.
+
+    :param shards: ShardMap: The shard map
+    :param user_id: int: The id of the user
+    :param target: str: The name of the target shard
+    :param batch_size: int: The number of contacts per batch
+    :param settle: Optional[float]: Seconds to wait between switching the shard and deleting the source contacts
+    :param sleep: Callable[[float], None]: Waits, for tests
+    :return: The source and target shards and the numbers of contacts copied and deleted
+    """
+    if target not in shards.engines:
+        raise LookupError(f"Unknown shard {target}")
+    shards.check_id_ranges()
+    shards.forget(user_id)
+    source = shards.shard_for(user_id)
+    result = {"user_id": user_id, "source": source, "target": target, "copied": 0, "deleted": 0}
+    if source == target:
+        return result
+    with shards.engines[MAIN_SHARD].connect() as connection:
+        user = connection.execute(select(User).where(User.id == user_id)).first()
+    if user is None:
+        raise LookupError(f"Unknown user {user_id}")
+    shards.ensure_user(target, user)
+
+    source_engine, target_engine = shards.engines[source], shards.engines[target]
+    existing = select(func.count()).select_from(Contact).where(Contact.user_id == user_id)
+    with target_engine.connect() as connection:
+        if connection.execute(existing).scalar():
+            raise RuntimeError(f"Shard {target} already has contacts of user {user_id}")
+    try:
+        result["copied"], last_id = copy_contacts(source_engine, target_engine, user_id, 0, batch_size)
+    except IntegrityError:
+        delete_contacts(target_engine, user_id, batch_size)
+        raise
+    shards.assign(user_id, target)
+
+    sleep(shards.lookup_ttl if settle is None else settle)
+    copied, _ = copy_contacts(source_engine, target_engine, user_id, last_id, batch_size)
+    result["copied"] += copied
+    result["deleted"] = delete_contacts(source_engine, user_id, batch_size)
+    return result
+
+
+def record_assignments(shards: ShardMap, batch_size: int = 1000) -> int:
+    """
+    The record_assignments function writes the hashed shard of every user missing from user_shards.
+
+    :param shards: ShardMap: The shard map
+    :param batch_size: int: The number of users per transaction
+    :return: The number of users recorded
+    """
+    recorded = 0
+    statement = select(User.id).outerjoin(UserShard, UserShard.user_id == User.id)\
+        .where(UserShard.user_id.is_(None)).order_by(User.id)
+    main = shards.engines[MAIN_SHARD]
+    while True:
+        with main.begin() as connection:
+            ids = connection.execute(statement.limit(batch_size)).scalars().all()
+            if not ids:
+                return recorded
+            connection.execute(insert(UserShard), [{"user_id": user_id, "shard": shards.hashed(user_id)}
+                                                   for user_id in ids])
+        recorded += len(ids)
+
+
+def assign_id_ranges(shards: ShardMap, block: int) -> dict:
+    """
+    The assign_id_ranges function restricts the contacts id sequence of every shard to its own block of ids,
+    the k-th shard (main first) to k * block + 1 up to (k + 1) * block. The sequences go on after
+    the largest id in use. Only Postgres has the sequences.
+
+    :param shards: ShardMap: The shard map
+    :param block: int: The number of ids per shard
+    :return: The first and last id by shard
+    """
+    ranges = {}
+    for index, name in enumerate(shards.engines):
+        engine = shards.engines[name]
+        if engine.dialect.name != "postgresql":
+            raise RuntimeError(f"Shard {name} has no contacts id sequence ({engine.dialect.name})")
+        first, last = index * block + 1, (index + 1) * block
+        with engine.begin() as connection:
+            largest = connection.execute(select(func.max(Contact.id))).scalar() or 0
+            if largest > last:
+                raise RuntimeError(f"Shard {name} already uses id {largest}, above its block {first}-{last}")
+            connection.execute(text(f"ALTER SEQUENCE contacts_id_seq MINVALUE {first} MAXVALUE {last} "
+                                    f"RESTART WITH {max(first, largest + 1)}"))
+        ranges[name] = (first, last)
+    shards.check_id_ranges()
+    return ranges
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move users between contact shards")
+    commands = parser.add_subparsers(dest="command", required=True)
+    move = commands.add_parser("move", help="move the contacts of a user to another shard")
+    move.add_argument("user_id", type=int)
+    move.add_argument("target")
+    move.add_argument("--batch-size", type=int, default=settings.shard_move_batch_size)
+    move.add_argument("--settle", type=float, default=None, help="defaults to shard_lookup_ttl")
+    record = commands.add_parser("record", help="record the current shard of every user in user_shards")
+    record.add_argument("--batch-size", type=int, default=settings.shard_move_batch_size)
+    ids = commands.add_parser("ids", help="give the contacts id sequence of every shard its own block of ids")
+    ids.add_argument("--block", type=int, default=100_000_000, help="ids per shard, contact ids are 32 bit")
+    args = parser.parse_args()
+
+    if args.command == "move":
+        print(move_user(shard_map, args.user_id, args.target, args.batch_size, args.settle))
+    elif args.command == "ids":
+        print(assign_id_ranges(shard_map, args.block))
+    else:
+        print(f"recorded {record_assignments(shard_map, args.batch_size)} users")
@@ -0,0 +1,411 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import redis
+import redis.asyncio as aioredis
+from fastapi import Depends, Response
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from src.conf.config import settings
+from src.database.db import engine, async_engine, get_db, get_async_db, get_async_database_url, get_pool_options
+from src.database.models import User
+from src.database.pool import InstrumentedAsyncQueuePool, InstrumentedQueuePool, pool_status
+from src.services.redis_client import async_redis, sync_redis
+
+# seconds the replica is behind the primary, 0 while it has replayed everything it received
+LAG_QUERIES = {
+    "postgresql": "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                  "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END",
+}
+NO_LAG_QUERY = "SELECT 0"
+
+
+class Replica:
+    """
+    A replica engine with the outcome of its last health check.
+    A dropped connection seen by any query marks the replica down until its next check.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.healthy = True
+        self.lag = 0.0
+        self.checked_at = None
+        self.reads = 0
+        self.errors = 0
+        self.checking = threading.Lock()
+        event.listen(getattr(engine, "sync_engine", engine), "handle_error", self._on_error)
+
+    def _on_error(self, context) -> None:
+        if context.is_disconnect:
+            self.healthy = False
+            self.checked_at = time.monotonic()
+            self.errors += 1
+
+
+class ReplicaRouter:
+    """
+    Picks the replica that serves the reads of a session.
+
+    Replicas are taken round-robin among those that passed their last health check and lag at most
+    max_lag seconds behind the primary. A check (connect, then the lag query of the dialect) runs
+    at most every check_interval seconds per replica, on the request that finds it due, while other
+    requests go on with the last known state. Without an available replica choose returns None and
+    the caller reads from the primary. The engines are sync or async, async routers use achoose.
+    """
+
+    def __init__(self, primary, replicas: List, max_lag: float, check_interval: float,
+                 lag_query: Optional[str] = None):
+        self.primary = primary
+        self.replicas = [Replica(replica) for replica in replicas]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lag_query = lag_query
+        self._next = 0
+        self._lock = threading.Lock()
+        self.fallbacks = 0
+
+    def _query(self, replica: Replica):
+        return text(self.lag_query or LAG_QUERIES.get(replica.engine.dialect.name, NO_LAG_QUERY))
+
+    def _due(self, replica: Replica, now: float) -> bool:
+        if replica.checked_at is not None and now - replica.checked_at < self.check_interval:
+            return False
+        return replica.checking.acquire(blocking=False)
+
+    def _checked(self, replica: Replica, lag: Optional[float]) -> None:
+        replica.healthy = lag is not None
+        replica.lag = float(lag) if lag is not None else replica.lag
+        if lag is None:
+            replica.errors += 1
+        replica.checked_at = time.monotonic()
+        replica.checking.release()
+
+    def check(self, replica: Replica) -> None:
+        lag = None
+        try:
+            with replica.engine.connect() as connection:
+                lag = connection.execute(self._query(replica)).scalar() or 0
+        except (SQLAlchemyError, OSError):
+            pass
+        self._checked(replica, lag)
+
+    async def acheck(self, replica: Replica) -> None:
+        lag = None
+        try:
+            async with replica.engine.connect() as connection:
+                lag = (await connection.execute(self._query(replica))).scalar() or 0
+        except (SQLAlchemyError, OSError):
+            pass
+        self._checked(replica, lag)
+
+    def _pick(self):
+        available = [replica for replica in self.replicas if replica.healthy and replica.lag <= self.max_lag]
+        with self._lock:
+            if not available:
+                self.fallbacks += 1
+                return None
+            replica = available[self._next % len(available)]
+            self._next += 1
+            replica.reads += 1
+        return replica.engine
+
+    def choose(self) -> Optional[Engine]:
+        """
+        The choose function picks the replica for the reads of a new session.
+
+        :return: The replica engine, or None to read from the primary
+        """
+        if not self.replicas:
+            return None
+        now = time.monotonic()
+        for replica in self.replicas:
+            if self._due(replica, now):
+                self.check(replica)
+        return self._pick()
+
+    async def achoose(self) -> Optional[AsyncEngine]:
+        """
+        The achoose function is the async counterpart of choose.
+
+        :return: The replica engine, or None to read from the primary
+        """
+        if not self.replicas:
+            return None
+        now = time.monotonic()
+        for replica in self.replicas:
+            if self._due(replica, now):
+                await self.acheck(replica)
+        return self._pick()
+
+    def stats(self) -> dict:
+        return {
+            "max_lag": self.max_lag,
+            "fallbacks": self.fallbacks,
+            "replicas": [{
+                "url": replica.engine.url.render_as_string(hide_password=True),
+                "healthy": replica.healthy,
+                "lag": replica.lag,
+                "reads": replica.reads,
+                "errors": replica.errors,
+                "pool": pool_status(replica.engine.pool),
+            } for replica in self.replicas],
+        }
+
+
+class PrimaryPins:
+    """
+    Users that wrote in the last seconds, their reads stay on the primary until the replicas caught up.
+    These pins are kept per worker process, use them with a single worker (e.g. tests), several workers
+    need the Redis pins. The least recently pinned users are dropped above size.
+    """
+
+    kind = "memory"
+
+    def __init__(self, seconds: float, size: int = 10000):
+        self.seconds = seconds
+        self.size = size
+        self._pins: Dict[int, float] = OrderedDict()
+        self._lock = threading.Lock()
+        self.errors = 0
+
+    def pin(self, user_id: int) -> None:
+        with self._lock:
+            self._pins[user_id] = time.monotonic() + self.seconds
+            self._pins.move_to_end(user_id)
+            while len(self._pins) > self.size:
+                self._pins.popitem(last=False)
+
+    def pinned(self, user_id: int) -> bool:
+        with self._lock:
+            until = self._pins.get(user_id)
+            if until is None:
+                return False
+            if until <= time.monotonic():
+                del self._pins[user_id]
+                return False
+            return True
+
+    async def apin(self, user_id: int) -> None:
+        self.pin(user_id)
+
+    async def apinned(self, user_id: int) -> bool:
+        return self.pinned(user_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pins.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"kind": self.kind, "local": len(self._pins), "errors": self.errors}
+
+
+class RedisPrimaryPins(PrimaryPins):
+    """
+    Primary pins shared by the workers: a pin is a Redis key expiring after seconds, so after a write
+    on one worker the reads of the user stay on the primary on every worker. The worker that took the
+    write also pins the user locally and answers its own reads without Redis. While Redis is unreachable
+    the reads go to the primary. The sync dependencies use client, the async ones aclient.
+    """
+
+    kind = "redis"
+
+    def __init__(self, client: redis.Redis, aclient: aioredis.Redis, seconds: float, size: int = 10000,
+                 version: int = 1):
+        super().__init__(seconds, size)
+        self.client = client
+        self.aclient = aclient
+        self.version = version
+
+    def key(self, user_id: int) -> str:
+        return f"replicas:v{self.version}:pin:{user_id}"
+
+    def _error(self) -> None:
+        with self._lock:
+            self.errors += 1
+
+    @property
+    def _milliseconds(self) -> int:
+        return int(self.seconds * 1000)
+
+    def pin(self, user_id: int) -> None:
+        super().pin(user_id)
+        if self._milliseconds <= 0:
+            return
+        try:
+            self.client.set(self.key(user_id), 1, px=self._milliseconds)
+        except redis.RedisError:
+            self._error()
+
+    async def apin(self, user_id: int) -> None:
+        super().pin(user_id)
+        if self._milliseconds <= 0:
+            return
+        try:
+            await self.aclient.set(self.key(user_id), 1, px=self._milliseconds)
+        except redis.RedisError:
+            self._error()
+
+    def pinned(self, user_id: int) -> bool:
+        if super().pinned(user_id):
+            return True
+        try:
+            return bool(self.client.exists(self.key(user_id)))
+        except redis.RedisError:
+            self._error()
+            return True
+
+    async def apinned(self, user_id: int) -> bool:
+        if super().pinned(user_id):
+            return True
+        try:
+            return bool(await self.aclient.exists(self.key(user_id)))
+        except redis.RedisError:
+            self._error()
+            return True
+
+
+def build_primary_pins(kind: str) -> PrimaryPins:
+    """
+    The build_primary_pins function builds the primary pins selected by the replica_pins setting.
+
+    :param kind: str: memory or redis
+    :return: The primary pins
+    """
+    if kind == "memory":
+        return PrimaryPins(settings.replica_pin_seconds)
+    return RedisPrimaryPins(sync_redis, async_redis, settings.replica_pin_seconds)
+
+
+class RoutingSession(Session):
+    """
+    Session that sends its SELECTs to a replica and everything else to the primary.
+    Once it has flushed or executed anything but a plain SELECT it stays on the primary,
+    so the session reads its own writes. SELECT ... FOR UPDATE goes to the primary as well.
+    """
+
+    def __init__(self, primary: Engine = None, replica: Optional[Engine] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.primary = primary
+        self.replica = replica
+        self.wrote = False
+
+    def get_bind(self, mapper=None, *, clause=None, **kwargs):
+        if self.replica is None or self.wrote:
+            return self.primary
+        if self._flushing or (clause is not None and not isinstance(clause, Select)):
+            self.wrote = True
+            return self.primary
+        if clause is not None and clause._for_update_arg is not None:
+            return self.primary
+        return self.replica
+
+
+def build_replica_engines(urls: List[str], asynchronous: bool = False) -> List:
+    if asynchronous:
+        return [create_async_engine(get_async_database_url(url), poolclass=InstrumentedAsyncQueuePool,
+                                    **get_pool_options()) for url in urls]
+    return [create_engine(url, poolclass=InstrumentedQueuePool, **get_pool_options()) for url in urls]
+
+
+replica_router = ReplicaRouter(engine, build_replica_engines(settings.replica_database_urls),
+                               settings.replica_max_lag, settings.replica_check_interval)
+async_replica_router = ReplicaRouter(
+    async_engine, build_replica_engines(settings.replica_database_urls, asynchronous=True),
+    settings.replica_max_lag, settings.replica_check_interval,
+) if settings.database_mode == "async" else None
+primary_pins = build_primary_pins(settings.replica_pins)
+
+
+def unversioned(response: Response) -> None:
+    # a replica may not have replayed the write behind the current contact version yet (see
+    # src.services.contact_versions), what it returns must not be cached under the ETag of that version
+    if "ETag" in response.headers:
+        del response.headers["ETag"]
+
+
+def replica_session(current_user_dep: Callable, primary_db: Callable = get_db,
+                    router: ReplicaRouter = None) -> Callable:
+    """
+    The replica_session function builds the session dependency of read-only routes.
+    The session reads from a replica picked by the router, unless the current user is pinned to the primary
+    (see read_your_writes) or no replica is available, then the route gets the primary session of primary_db.
+    Replicas only mirror the main database, sessions of primary_db bound elsewhere (a shard) are kept as they are.
+
+    :param current_user_dep: Callable: The dependency that returns the authenticated user
+    :param primary_db: Callable: The dependency of the primary session, get_db or a shard session
+    :param router: ReplicaRouter: Defaults to replica_router
+    :return: The dependency
+    """
+
+    def get_replica_db(response: Response, db: Session = Depends(primary_db),
+                       current_user: User = Depends(current_user_dep)):
+        routing = router or replica_router
+        if db.bind is not routing.primary or not routing.replicas or primary_pins.pinned(current_user.id):
+            yield db
+            return
+        replica = routing.choose()
+        if replica is None:
+            yield db
+            return
+        unversioned(response)
+        session = RoutingSession(primary=routing.primary, replica=replica, autoflush=False)
+        try:
+            yield session
+        finally:
+            session.close()
+
+    return get_replica_db
+
+
+def async_replica_session(current_user_dep: Callable, primary_db: Callable = get_async_db,
+                          router: ReplicaRouter = None) -> Callable:
+    """
+    The async_replica_session function is the async counterpart of replica_session.
+
+    :param current_user_dep: Callable: The dependency that returns the authenticated user
+    :param primary_db: Callable: The dependency of the primary session, get_async_db or a shard session
+    :param router: ReplicaRouter: Defaults to async_replica_router
+    :return: The dependency
+    """
+
+    async def get_async_replica_db(response: Response, db: AsyncSession = Depends(primary_db),
+                                   current_user: User = Depends(current_user_dep)):
+        routing = router or async_replica_router
+        if db.bind is not routing.primary or not routing.replicas or await primary_pins.apinned(current_user.id):
+            yield db
+            return
+        replica = await routing.achoose()
+        if replica is None:
+            yield db
+            return
+        unversioned(response)
+        async with AsyncSession(sync_session_class=RoutingSession, primary=routing.primary.sync_engine,
+                                replica=replica.sync_engine, autoflush=False, expire_on_commit=False) as session:
+            yield session
+
+    return get_async_replica_db
+
+
+def read_your_writes(current_user_dep: Callable) -> Callable:
+    """
+    The read_your_writes function builds the dependency of write routes that pins the current user
+    to the primary for replica_pin_seconds, so the reads that follow a write see it.
+
+    :param current_user_dep: Callable: The dependency that returns the authenticated user
+    :return: The dependency
+    """
+
+    async def pin_primary(current_user: User = Depends(current_user_dep)) -> None:
+        if settings.replica_database_urls:
+            await primary_pins.apin(current_user.id)
+
+    return pin_primary
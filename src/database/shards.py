@@ -0,0 +1,259 @@
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from fastapi import Depends
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, delete, func, insert, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session
+
+from src.conf.config import settings
+from src.database.db import engine, async_engine, get_db, get_async_db, get_async_database_url, get_pool_options
+from src.database.models import Contact, User, UserShard
+from src.database.pool import InstrumentedAsyncQueuePool, InstrumentedQueuePool, pool_status
+
+# the database of SQLALCHEMY_DATABASE_URL, it keeps the users and the user_shards table
+MAIN_SHARD = "main"
+
+# the ids the contacts id sequence of a shard may hand out, dialects without sequences report the ids in use
+ID_RANGE_QUERIES = {
+    "postgresql": "SELECT min_value, max_value FROM pg_sequences WHERE sequencename = 'contacts_id_seq'",
+}
+
+
+def id_range(engine: Engine) -> Optional[Tuple[int, int]]:
+    """
+    The id_range function returns the contact ids a shard may use: the bounds of its contacts id sequence,
+    or on dialects without sequences the smallest and largest id in use.
+
+    :param engine: Engine: The shard
+    :return: The first and last id, or None if the shard has no sequence and no contacts
+    """
+    with engine.connect() as connection:
+        query = ID_RANGE_QUERIES.get(engine.dialect.name)
+        if query is not None:
+            row = connection.execute(text(query)).first()
+        else:
+            row = connection.execute(select(func.min(Contact.id), func.max(Contact.id))).first()
+    if row is None or row[0] is None:
+        return None
+    return int(row[0]), int(row[1])
+
+
+class ShardMap:
+    """
+    Maps a user to the database that holds its contacts.
+
+    The shards are the main database and the named engines of shards. A user lives on the shard
+    the crc32 of its id picks, unless the user_shards table of the main database names another one,
+    which is how the rebalancing tool (src.database.rebalance) moves users. Lookups are cached
+    for lookup_ttl seconds, so a move reaches every worker after at most that long.
+
+    Adding a shard changes the hashed shard of most users: record the current shard of every user
+    in user_shards first (python -m src.database.rebalance record). Contact ids are kept when contacts
+    move, so the id sequences of the shards must not overlap: python -m src.database.rebalance ids gives
+    every shard its own range, and check_id_ranges refuses to start with overlapping ones.
+    The unique email and phone of a contact are only checked within a shard.
+    A shard other than main keeps a copy of the user rows of its users for the contacts foreign key.
+    """
+
+    def __init__(self, main: Engine, shards: Dict[str, Engine], async_main=None, async_shards: Dict = None,
+                 lookup_ttl: float = 30, cache_size: int = 10000):
+        self.engines = {MAIN_SHARD: main, **shards}
+        self.async_engines = {MAIN_SHARD: async_main, **(async_shards or {})} if async_main is not None else {}
+        self.names = [MAIN_SHARD] + sorted(shards)
+        self.lookup_ttl = lookup_ttl
+        self.cache_size = cache_size
+        self._cache: Dict[int, tuple] = OrderedDict()
+        self._users = set()
+        self._lock = threading.Lock()
+        self.lookups = 0
+
+    @property
+    def enabled(self) -> bool:
+        return len(self.names) > 1
+
+    def hashed(self, user_id: int) -> str:
+        return self.names[zlib.crc32(str(user_id).encode()) % len(self.names)]
+
+    def cached_shard(self, user_id: int) -> Optional[str]:
+        """
+        The cached_shard function returns the shard of a user without touching the database.
+
+        :param user_id: int: The id of the user
+        :return: The shard name, or None if it has to be looked up
+        """
+        if not self.enabled:
+            return MAIN_SHARD
+        with self._lock:
+            cached = self._cache.get(user_id)
+            if cached is None:
+                return None
+            if cached[1] <= time.monotonic():
+                del self._cache[user_id]
+                return None
+            return cached[0]
+
+    def shard_for(self, user_id: int) -> str:
+        """
+        The shard_for function returns the shard of a user, looking it up in user_shards on a cache miss.
+
+        :param user_id: int: The id of the user
+        :return: The shard name
+        """
+        shard = self.cached_shard(user_id)
+        if shard is not None:
+            return shard
+        with self.engines[MAIN_SHARD].connect() as connection:
+            shard = connection.execute(select(UserShard.shard).where(UserShard.user_id == user_id)).scalar()
+        shard = shard or self.hashed(user_id)
+        if shard not in self.engines:
+            raise LookupError(f"User {user_id} is assigned to unknown shard {shard}")
+        with self._lock:
+            self.lookups += 1
+            self._cache[user_id] = (shard, time.monotonic() + self.lookup_ttl)
+            self._cache.move_to_end(user_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return shard
+
+    def assign(self, user_id: int, shard: str) -> None:
+        """
+        The assign function records the shard of a user in user_shards.
+
+        :param user_id: int: The id of the user
+        :param shard: str: The shard name
+        :return: None
+        """
+        if shard not in self.engines:
+            raise LookupError(f"Unknown shard {shard}")
+        with self.engines[MAIN_SHARD].begin() as connection:
+            connection.execute(delete(UserShard).where(UserShard.user_id == user_id))
+            connection.execute(insert(UserShard).values(user_id=user_id, shard=shard))
+        self.forget(user_id)
+
+    def forget(self, user_id: int) -> None:
+        with self._lock:
+            self._cache.pop(user_id, None)
+
+    def has_user(self, shard: str, user_id: int) -> bool:
+        return shard == MAIN_SHARD or (shard, user_id) in self._users
+
+    def ensure_user(self, shard: str, user: User) -> None:
+        """
+        The ensure_user function copies the user row to a shard other than main, once per worker process,
+        the contacts of the shard reference it. The password hash is not copied.
+
+        :param shard: str: The shard name
+        :param user: User: The user
+        :return: None
+        """
+        if self.has_user(shard, user.id):
+            return
+        try:
+            with self.engines[shard].begin() as connection:
+                if connection.execute(select(User.id).where(User.id == user.id)).first() is None:
+                    connection.execute(insert(User).values(id=user.id, username=user.username, email=user.email,
+                                                           password="", confirmed=user.confirmed))
+        except IntegrityError:
+            # inserted concurrently by another worker
+            pass
+        with self._lock:
+            self._users.add((shard, user.id))
+
+    def check_id_ranges(self) -> List[Tuple[str, int, int]]:
+        """
+        The check_id_ranges function makes sure no two shards can hand out the same contact id,
+        which moving contacts between them relies on.
+
+        :return: The id ranges by shard, ordered by their first id
+        :raises RuntimeError: Two ranges overlap
+        """
+        ranges = []
+        for name in self.names:
+            bounds = id_range(self.engines[name])
+            if bounds is not None:
+                ranges.append((name, *bounds))
+        ranges.sort(key=lambda bounds: bounds[1])
+        for (name, _, last), (next_name, first, _) in zip(ranges, ranges[1:]):
+            if first <= last:
+                raise RuntimeError(f"Contact ids of shards {name} and {next_name} overlap from {first} to {last}, "
+                                   f"give every shard its own range (python -m src.database.rebalance ids)")
+        return ranges
+
+    def stats(self) -> dict:
+        with self._lock:
+            cached = len(self._cache)
+        return {
+            "shards": {name: pool_status(self.engines[name].pool) for name in self.names},
+            "cached": cached,
+            "lookups": self.lookups,
+        }
+
+
+def build_shard_map() -> ShardMap:
+    urls = settings.shard_database_urls
+    shards = {name: create_engine(url, poolclass=InstrumentedQueuePool, **get_pool_options())
+              for name, url in urls.items()}
+    async_shards = {name: create_async_engine(get_async_database_url(url), poolclass=InstrumentedAsyncQueuePool,
+                                              **get_pool_options())
+                    for name, url in urls.items()} if async_engine is not None else None
+    return ShardMap(engine, shards, async_engine, async_shards, lookup_ttl=settings.shard_lookup_ttl)
+
+
+shard_map = build_shard_map()
+
+
+def shard_session(current_user_dep: Callable) -> Callable:
+    """
+    The shard_session function builds the get_db variant of contact routes: a session bound to the shard
+    of the authenticated user. Users of the main shard get the session of get_db.
+
+    :param current_user_dep: Callable: The dependency that returns the authenticated user
+    :return: The dependency
+    """
+
+    def get_shard_db(db: Session = Depends(get_db), current_user: User = Depends(current_user_dep)):
+        shard = shard_map.shard_for(current_user.id)
+        if shard == MAIN_SHARD:
+            yield db
+            return
+        shard_map.ensure_user(shard, current_user)
+        session = Session(bind=shard_map.engines[shard], autoflush=False)
+        try:
+            yield session
+        finally:
+            session.close()
+
+    return get_shard_db
+
+
+def async_shard_session(current_user_dep: Callable) -> Callable:
+    """
+    The async_shard_session function is the async counterpart of shard_session.
+    Only shard lookups that miss the cache and the first request of a user on a shard go to the threadpool.
+
+    :param current_user_dep: Callable: The dependency that returns the authenticated user
+    :return: The dependency
+    """
+
+    async def get_async_shard_db(db: AsyncSession = Depends(get_async_db),
+                                 current_user: User = Depends(current_user_dep)):
+        shard = shard_map.cached_shard(current_user.id)
+        if shard is None:
+            shard = await run_in_threadpool(shard_map.shard_for, current_user.id)
+        if shard == MAIN_SHARD:
+            yield db
+            return
+        if not shard_map.has_user(shard, current_user.id):
+            await run_in_threadpool(shard_map.ensure_user, shard, current_user)
+        async with AsyncSession(bind=shard_map.async_engines[shard], autoflush=False,
+                                expire_on_commit=False) as session:
+            yield session
+
+    return get_async_shard_db
@@ -1,11 +1,22 @@
-from typing import List
+import base64
+import binascii
+import calendar
+import json
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from datetime import datetime, date, timedelta
 
 from sqlalchemy.orm import Session
 
-from sqlalchemy import or_, extract
-from src.database.models import Contact, User
+from pydantic import ValidationError
+from sqlalchemy import or_, and_, select, insert, update, delete, func, text, Integer, Float
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql import Select
+from src.conf.config import settings
+from src.database.models import Contact, User, birthday_day_of_year
 from src.schemas import ContactCreate, ContactUpdate, ContactBirthday
+from src.services.contact_versions import contact_versions
+from src.services.search_index import contact_search_index
 
 
 def get_contacts(skip: int, limit: int, user: User, db: Session) -> List[Contact]:
@@ -21,6 +32,166 @@ def get_contacts(skip: int, limit: int, user: User, db: Session) -> List[Contact
     return db.query(Contact).filter(Contact.user_id == user.id).offset(skip).limit(limit).all()
 
 
+CURSOR_SORT_KEYS = {
+    "id": Contact.id,
+    "first_name": Contact.first_name,
+    "last_name": Contact.last_name,
+    "email": Contact.email,
+    "birthday": Contact.birthday,
+}
+
+
+def encode_cursor(sort: str, contact: Contact) -> str:
+    """
+    The encode_cursor function builds the opaque cursor pointing right after the given contact.
+    The cursor carries the sort key, the contact's value for that key and its id as a tie breaker.
+
+    :param sort: str: The sort key of the page
+    :param contact: Contact: The last contact of the page
+    :return: A url-safe cursor string
+    """
+    value = getattr(contact, sort)
+    if isinstance(value, date):
+        value = value.isoformat()
+    payload = json.dumps({"s": sort, "v": value, "id": contact.id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[object, int]:
+    """
+    The decode_cursor function reads back a cursor produced by encode_cursor.
+
+    :param cursor: str: The cursor received from the client
+    :param sort: str: The sort key requested for the page
+    :return: The (value, id) position of the last contact already returned
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value, last_id = payload["v"], int(payload["id"])
+        if payload["s"] != sort:
+            raise ValueError("Cursor was issued for another sort key")
+        if sort != "id" and not (value is None or isinstance(value, str)):
+            # the value ends up in the seek predicate, only what encode_cursor writes is accepted
+            raise ValueError("Invalid cursor value")
+        if sort == "birthday" and value is not None:
+            value = date.fromisoformat(value)
+    except (KeyError, TypeError, binascii.Error, json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+    return value, last_id
+
+
+def contacts_page_query(limit: int, user: User, cursor: Optional[str] = None, sort: str = "id") -> Select:
+    """
+    The contacts_page_query function builds the keyset pagination query for a user's contacts.
+    Instead of skipping rows with OFFSET it seeks past the (sort key, id) position stored in the cursor,
+    so every page costs the same index range scan regardless of its depth.
+    Contacts without a value for the sort key come last on every backend (NULLS LAST, the Postgres default).
+    One extra row is fetched to detect whether a next page exists.
+
+    :param limit: int: The page size
+    :param user: User: Filter the contacts by user
+    :param cursor: Optional[str]: The cursor returned with the previous page, None for the first page
+    :param sort: str: One of CURSOR_SORT_KEYS
+    :return: A select statement
+    """
+    if sort not in CURSOR_SORT_KEYS:
+        raise ValueError(f"Unsupported sort key: {sort}")
+    column = CURSOR_SORT_KEYS[sort]
+    query = select(Contact).filter(Contact.user_id == user.id)
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort)
+        if column is Contact.id:
+            query = query.filter(Contact.id > last_id)
+        elif value is None:
+            # the cursor is inside the trailing NULLs, only the rest of them is left
+            query = query.filter(column.is_(None), Contact.id > last_id)
+        else:
+            query = query.filter(or_(column > value, and_(column == value, Contact.id > last_id), column.is_(None)))
+    order_by = [Contact.id] if column is Contact.id else [column.asc().nulls_last(), Contact.id]
+    return query.order_by(*order_by).limit(limit + 1)
+
+
+def split_page(contacts: List[Contact], limit: int, sort: str) -> Tuple[List[Contact], Optional[str]]:
+    """
+    The split_page function trims the extra row fetched by contacts_page_query and builds the next cursor.
+
+    :param contacts: List[Contact]: Up to limit + 1 contacts
+    :param limit: int: The page size
+    :param sort: str: The sort key of the page
+    :return: The page and the cursor of the next page, or None on the last page
+    """
+    if limit < 1 or len(contacts) <= limit:
+        return contacts[:max(limit, 0)], None
+    page = contacts[:limit]
+    return page, encode_cursor(sort, page[-1])
+
+
+def get_contacts_page(limit: int, user: User, db: Session, cursor: Optional[str] = None,
+                      sort: str = "id") -> Tuple[List[Contact], Optional[str]]:
+    """
+    The get_contacts_page function returns one page of the user's contacts using keyset (cursor) pagination.
+
+    :param limit: int: The page size
+    :param user: User: Filter the contacts by user
+    :param db: Session: Pass the database session to the function
+    :param cursor: Optional[str]: The cursor returned with the previous page
+    :param sort: str: The sort key, id by default
+    :return: The contacts of the page and the cursor of the next page
+    """
+    contacts = db.execute(contacts_page_query(limit, user, cursor, sort)).scalars().all()
+    return split_page(contacts, limit, sort)
+
+
+EXPORT_COLUMNS = (Contact.id, Contact.first_name, Contact.last_name, Contact.email, Contact.phone,
+                  Contact.birthday, Contact.additional_info)
+
+
+def export_contacts_query(user: User, batch_size: int) -> Select:
+    """
+    The export_contacts_query function selects the exported columns of all the user's contacts.
+    yield_per makes the result stream through a server-side cursor in batches of batch_size rows.
+
+    :param user: User: Filter the contacts by user
+    :param batch_size: int: The number of rows fetched per round trip
+    :return: A select statement
+    """
+    return select(*EXPORT_COLUMNS).filter(Contact.user_id == user.id).order_by(Contact.id)\
+        .execution_options(yield_per=batch_size)
+
+
+def stream_contacts(db: Session, user: User, batch_size: int = 1000) -> Iterator[List[tuple]]:
+    """
+    The stream_contacts function streams all the user's contacts as batches of row tuples,
+    so memory use stays constant regardless of the number of contacts.
+
+    :param db: Session: Pass the database session to the function
+    :param user: User: Filter the contacts by user
+    :param batch_size: int: The number of rows per batch
+    :return: An iterator of row batches, columns ordered as EXPORT_COLUMNS
+    """
+    result = db.execute(export_contacts_query(user, batch_size))
+    for rows in result.partitions():
+        yield rows
+
+
+CONTACT_COLUMNS = EXPORT_COLUMNS + (Contact.user_id,)
+
+
+def contact_values(data: dict) -> dict:
+    """
+    The contact_values function prepares column values for Core INSERT/UPDATE statements,
+    which bypass the model and so must fill in the derived birthday_doy column themselves.
+
+    :param data: dict: The contact fields
+    :return: The column values
+    """
+    values = dict(data)
+    if "birthday" in values:
+        values["birthday_doy"] = birthday_day_of_year(values["birthday"])
+    return values
+
+
 def get_contact(db: Session, contact_id: int, user: User) -> Contact:
     """
     The get_contact function takes in a database session, contact_id, and user.
@@ -43,35 +214,148 @@ def create_contact(db: Session, contact: ContactCreate, user: User) -> Contact:
             contact (ContactCreate): The ContactCreate schema model to be created in the database.
             user (User): The User schema model that is creating this contact, used for foreign key relationship with contacts table.
 
+    The row is written with a single INSERT ... RETURNING instead of add + flush + refresh,
+    on databases without RETURNING the ORM path is used.
+
     :param db: Session: Access the database
     :param contact: ContactCreate: Create a new contact
     :param user: User: Get the user id from the user object
     :return: The newly created contact
     """
-    db_contact = Contact(**contact.dict(), user_id=user.id)
-    db.add(db_contact)
-    db.commit()
-    db.refresh(db_contact)
+    if db.get_bind().dialect.insert_returning:
+        values = contact_values(contact.dict())
+        db_contact = db.execute(insert(Contact).values(**values, user_id=user.id).returning(*CONTACT_COLUMNS)).one()
+        db.commit()
+    else:
+        db_contact = Contact(**contact.dict(), user_id=user.id)
+        db.add(db_contact)
+        db.commit()
+        db.refresh(db_contact)
+    contact_search_index.upsert(db_contact)
+    contact_versions.bump(db_contact.user_id)
     return db_contact
 
 
+def _bulk_error(result: dict, row: int, detail: str) -> None:
+    result["failed"] += 1
+    if len(result["errors"]) < settings.contact_bulk_max_errors:
+        result["errors"].append({"row": row, "detail": detail})
+
+
+def _insert_chunk(db: Session, chunk: List[Tuple[int, ContactCreate]], user: User, result: dict) -> None:
+    """
+    The _insert_chunk function inserts one validated chunk with a single executemany INSERT.
+    Rows whose email or phone already exists (in the database or earlier in the chunk) are reported
+    instead of inserted. If a concurrent writer still causes a unique violation, the chunk is retried
+    row by row so the conflict is attributed to its row.
+    """
+    emails = {contact.email for _, contact in chunk}
+    phones = {contact.phone for _, contact in chunk}
+    existing = db.execute(select(Contact.email, Contact.phone).filter(
+        or_(Contact.email.in_(emails), Contact.phone.in_(phones))
+    )).all()
+    taken_emails = {email for email, _ in existing}
+    taken_phones = {phone for _, phone in existing}
+
+    rows = []
+    for row, contact in chunk:
+        if contact.email in taken_emails:
+            _bulk_error(result, row, f"Contact with email {contact.email} already exists")
+            continue
+        if contact.phone in taken_phones:
+            _bulk_error(result, row, f"Contact with phone {contact.phone} already exists")
+            continue
+        taken_emails.add(contact.email)
+        taken_phones.add(contact.phone)
+        rows.append((row, contact_values(contact.dict()) | {"user_id": user.id}))
+    if not rows:
+        return
+
+    try:
+        db.execute(insert(Contact), [values for _, values in rows])
+        db.commit()
+        result["inserted"] += len(rows)
+    except IntegrityError:
+        db.rollback()
+        for row, values in rows:
+            try:
+                db.execute(insert(Contact), [values])
+                db.commit()
+                result["inserted"] += 1
+            except IntegrityError:
+                db.rollback()
+                _bulk_error(result, row, "Contact with this email or phone already exists")
+
+
+def import_contacts(db: Session, records: Iterable[Tuple[int, Optional[dict], Optional[str]]], user: User,
+                    chunk_size: int = 1000, bump_version: bool = True) -> dict:
+    """
+    The import_contacts function bulk inserts contacts streamed from an uploaded file.
+    Records are validated with ContactCreate and inserted in chunks of chunk_size rows,
+    one transaction and one multi-row INSERT per chunk, so only one chunk is held in memory.
+
+    :param db: Session: Access the database
+    :param records: Iterable: (row number, record, parse error) tuples, see services.contacts_io.read_records
+    :param user: User: The owner of the imported contacts
+    :param chunk_size: int: The number of rows inserted per statement
+    :param bump_version: bool: Bump the contact version of the user, the async repository bumps it itself
+    :return: A dict with the inserted and failed row counts and the per-row errors
+    """
+    user_id = user.id
+    result = {"inserted": 0, "failed": 0, "errors": []}
+    chunk = []
+    for row, record, error in records:
+        if error is None:
+            try:
+                chunk.append((row, ContactCreate(**record)))
+            except ValidationError as e:
+                error = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+        if error is not None:
+            _bulk_error(result, row, error)
+        if len(chunk) >= chunk_size:
+            _insert_chunk(db, chunk, user, result)
+            chunk = []
+    if chunk:
+        _insert_chunk(db, chunk, user, result)
+    contact_search_index.invalidate(user_id)
+    if bump_version and result["inserted"]:
+        contact_versions.bump(user_id)
+    return result
+
+
 def update_contact(db: Session, contact_id: int, contact: ContactUpdate, user: User) -> Contact:
     """
     The update_contact function updates a contact in the database.
 
+    A single UPDATE ... WHERE id = ... AND user_id = ... RETURNING both checks ownership and
+    returns the new row, on databases without RETURNING the ORM path is used.
+
     :param db: Session: Access the database
     :param contact_id: int: Find the contact in the database
     :param contact: ContactUpdate: Get the data from the request body
     :param user: User: Ensure that the user is only able to update their own contacts
     :return: The updated contact
     """
-    db_contact = db.query(Contact).filter(Contact.id == contact_id, Contact.user_id == user.id).first()
-    if not db_contact:
-        raise ValueError("Contact not found")
-    for field, value in contact.dict(exclude_unset=True).items():
-        setattr(db_contact, field, value)
-    db.commit()
-    db.refresh(db_contact)
+    changes = contact.dict(exclude_unset=True)
+    if changes and db.get_bind().dialect.update_returning:
+        db_contact = db.execute(
+            update(Contact).where(Contact.id == contact_id, Contact.user_id == user.id)
+            .values(**contact_values(changes)).returning(*CONTACT_COLUMNS),
+            execution_options={"synchronize_session": False},
+        ).one_or_none()
+        if db_contact is None:
+            raise ValueError("Contact not found")
+        db.commit()
+    else:
+        db_contact = db.query(Contact).filter(Contact.id == contact_id, Contact.user_id == user.id).first()
+        if not db_contact:
+            raise ValueError("Contact not found")
+        for field, value in changes.items():
+            setattr(db_contact, field, value)
+        db.commit()
+        db.refresh(db_contact)
+    contact_search_index.upsert(db_contact)
+    contact_versions.bump(db_contact.user_id)
     return db_contact
 
 
@@ -83,51 +367,263 @@ def delete_contact(db: Session, contact_id: int, user: User) -> Contact:
             contact_id (int): The id of the contact to delete.
             user (User): The user who is deleting the contact.
 
+    A single DELETE ... RETURNING removes the row and returns it,
+    on databases without RETURNING the ORM path is used.
+
     :param db: Session: Pass the database session to the function
     :param contact_id: int: Specify the contact to delete
     :param user: User: Make sure that the user is authorized to delete the contact
     :return: The deleted contact
     """
-    db_contact = db.query(Contact).filter(Contact.id == contact_id, Contact.user_id == user.id).first()
-    if not db_contact:
-        raise ValueError("Contact not found")
-    db.delete(db_contact)
+    if db.get_bind().dialect.delete_returning:
+        db_contact = db.execute(
+            delete(Contact).where(Contact.id == contact_id, Contact.user_id == user.id).returning(*CONTACT_COLUMNS),
+            execution_options={"synchronize_session": False},
+        ).one_or_none()
+        if db_contact is None:
+            raise ValueError("Contact not found")
+    else:
+        db_contact = db.query(Contact).filter(Contact.id == contact_id, Contact.user_id == user.id).first()
+        if not db_contact:
+            raise ValueError("Contact not found")
+        db.delete(db_contact)
     db.commit()
+    contact_search_index.remove(db_contact.user_id, contact_id)
+    contact_versions.bump(db_contact.user_id)
     return db_contact
 
 
-def search_contacts(db: Session, query: str, user: User) -> List[Contact]:
+def fulltext_search_query(dialect: str, query: str, user: User, limit: int) -> Optional[Select]:
+    """
+    The fulltext_search_query function builds the index backed, ranked search query for the given dialect.
+    On Postgres the ILIKE predicates are served by the pg_trgm GIN indexes and results are ranked by
+    trigram similarity; on SQLite the contacts_fts FTS5 table (trigram tokenizer) is matched and ranked by bm25.
+    Trigram indexes can not serve queries shorter than three characters, for those None is returned
+    and the caller falls back to the plain ILIKE scan.
+
+    :param dialect: str: The database dialect name
+    :param query: str: The search string
+    :param user: User: Filter the contacts by user
+    :param limit: int: The maximum number of results
+    :return: A select statement, or None when the query can not use the index
+    """
+    if len(query) < 3 or dialect not in ("postgresql", "sqlite"):
+        return None
+    if dialect == "postgresql":
+        rank = func.greatest(
+            func.similarity(Contact.first_name, query),
+            func.similarity(Contact.last_name, query),
+            func.similarity(Contact.email, query),
+        )
+        return select(Contact).filter(Contact.user_id == user.id).filter(or_(
+            Contact.first_name.ilike(f"%{query}%"),
+            Contact.last_name.ilike(f"%{query}%"),
+            Contact.email.ilike(f"%{query}%"),
+        )).order_by(rank.desc(), Contact.id).limit(limit)
+    phrase = '"' + query.replace('"', '""') + '"'
+    matches = text(
+        "SELECT rowid AS id, bm25(contacts_fts) AS rank FROM contacts_fts WHERE contacts_fts MATCH :phrase"
+    ).bindparams(phrase=phrase).columns(id=Integer, rank=Float).subquery("matches")
+    return select(Contact).join(matches, matches.c.id == Contact.id).filter(Contact.user_id == user.id)\
+        .order_by(matches.c.rank, Contact.id).limit(limit)
+
+
+def _affected_ids(db: Session, statement, ids: List[int], user: User, returning: bool) -> set:
+    """
+    The _affected_ids function runs a set-based UPDATE/DELETE scoped to the user and returns the ids it touched.
+    With RETURNING support the ids come back with the statement itself,
+    otherwise they are selected first in the same transaction.
+    """
+    if returning:
+        return set(db.execute(statement.returning(Contact.id),
+                              execution_options={"synchronize_session": False}).scalars().all())
+    found = set(db.execute(select(Contact.id).filter(Contact.id.in_(ids), Contact.user_id == user.id)).scalars().all())
+    if found:
+        db.execute(statement, execution_options={"synchronize_session": False})
+    return found
+
+
+def update_contacts_batch(db: Session, items: List[Tuple[int, dict]], user: User,
+                          bump_version: bool = True) -> List[Dict]:
+    """
+    The update_contacts_batch function applies partial updates to many contacts in one transaction.
+    Items with identical changes are grouped into a single UPDATE ... WHERE id IN (...) AND user_id = ...,
+    so a batch applying the same change to every contact costs one statement.
+
+    :param db: Session: Access the database
+    :param items: List[Tuple[int, dict]]: (contact id, changed fields) pairs, ids must be unique
+    :param user: User: Only the user's contacts are updated
+    :param bump_version: bool: Bump the contact version of the user, the async repository bumps it itself
+    :return: The outcome for each id: updated, unchanged or not_found
+    """
+    ids = [contact_id for contact_id, _ in items]
+    if len(set(ids)) != len(ids):
+        raise ValueError("Duplicate contact ids")
+    groups = defaultdict(list)
+    for contact_id, changes in items:
+        groups[tuple(sorted(changes.items()))].append(contact_id)
+
+    user_id = user.id
+    returning = db.get_bind().dialect.update_returning
+    outcomes = {}
+    try:
+        for changes, group_ids in groups.items():
+            if not changes:
+                found = set(db.execute(select(Contact.id).filter(
+                    Contact.id.in_(group_ids), Contact.user_id == user.id
+                )).scalars().all())
+                outcomes.update({contact_id: "unchanged" if contact_id in found else "not_found"
+                                 for contact_id in group_ids})
+                continue
+            statement = update(Contact).where(Contact.id.in_(group_ids), Contact.user_id == user.id)\
+                .values(**contact_values(dict(changes)))
+            updated = _affected_ids(db, statement, group_ids, user, returning)
+            outcomes.update({contact_id: "updated" if contact_id in updated else "not_found"
+                             for contact_id in group_ids})
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        raise ValueError("Contact with this email or phone already exists") from e
+    contact_search_index.invalidate(user_id)
+    if bump_version and "updated" in outcomes.values():
+        contact_versions.bump(user_id)
+    return [{"id": contact_id, "status": outcomes[contact_id]} for contact_id in ids]
+
+
+def delete_contacts_batch(db: Session, ids: List[int], user: User, bump_version: bool = True) -> List[Dict]:
+    """
+    The delete_contacts_batch function deletes many contacts with a single DELETE ... WHERE id IN (...) RETURNING id.
+
+    :param db: Session: Access the database
+    :param ids: List[int]: The contact ids
+    :param user: User: Only the user's contacts are deleted
+    :param bump_version: bool: Bump the contact version of the user, the async repository bumps it itself
+    :return: The outcome for each id: deleted or not_found
+    """
+    ids = list(dict.fromkeys(ids))
+    statement = delete(Contact).where(Contact.id.in_(ids), Contact.user_id == user.id)
+    deleted = _affected_ids(db, statement, ids, user, db.get_bind().dialect.delete_returning)
+    user_id = user.id
+    db.commit()
+    for contact_id in deleted:
+        contact_search_index.remove(user_id, contact_id)
+    if bump_version and deleted:
+        contact_versions.bump(user_id)
+    return [{"id": contact_id, "status": "deleted" if contact_id in deleted else "not_found"} for contact_id in ids]
+
+
+def search_contacts(db: Session, query: str, user: User, limit: Optional[int] = None) -> List[Contact]:
     """
     The search_contacts function searches the database for contacts that match a given query.
+    With contact_search_index enabled the query is answered from the in-process index,
+    which is built from the user's contacts on first use.
+    With contact_search_engine set to fulltext the ranked, index backed query is used,
+    otherwise the contacts are filtered with ILIKE.
 
     :param db: Session: Access the database
     :param query: str: Search for a contact by first name, last name or email
     :param user: User: Get the user id of the current user
+    :param limit: Optional[int]: The maximum number of results
     :return: A list of contacts that match the query
     """
     if not query:
         return []
-    return db.query(Contact).filter(Contact.user_id == user.id).filter(or_(
+    if settings.contact_search_index:
+        if not contact_search_index.is_loaded(user.id):
+            contact_search_index.build(user.id, db.query(Contact).filter(Contact.user_id == user.id).all())
+        contacts = contact_search_index.search(user.id, query, limit)
+        if contacts is not None:
+            return contacts
+    if settings.contact_search_engine == "fulltext":
+        statement = fulltext_search_query(db.get_bind().dialect.name, query, user,
+                                          limit or settings.contact_search_limit)
+        if statement is not None:
+            return db.execute(statement).scalars().all()
+    contacts = db.query(Contact).filter(Contact.user_id == user.id).filter(or_(
         Contact.first_name.ilike(f"%{query}%"),
         Contact.last_name.ilike(f"%{query}%"),
         Contact.email.ilike(f"%{query}%"),
-    )).all()
+    ))
+    if limit:
+        contacts = contacts.limit(limit)
+    return contacts.all()
+
+
+def birthday_window(today: date, days: int):
+    """
+    The birthday_window function builds the filter selecting birthdays from today to today + days.
+    It compares the indexed birthday_doy column against a day of year range,
+    splitting the range in two when it wraps around the end of the year.
+
+    :param today: date: The first day of the window
+    :param days: int: The length of the window in days
+    :return: A SQL expression, or None when the window covers the whole year
+    """
+    if days >= 365:
+        return None
+    start = birthday_day_of_year(today)
+    if (today.month, today.day) == (3, 1) and not calendar.isleap(today.year):
+        # birthdays on Feb 29 are celebrated on Mar 1 in non-leap years, as days_until_birthday counts them
+        start -= 1
+    end = birthday_day_of_year(today + timedelta(days=days))
+    if start <= end:
+        return Contact.birthday_doy.between(start, end)
+    return or_(Contact.birthday_doy >= start, Contact.birthday_doy <= end)
+
+
+def days_until_birthday(birthday: date, today: date) -> int:
+    """
+    The days_until_birthday function counts the days until the next birthday, 0 when it is today.
+    Birthdays on Feb 29 are celebrated on Mar 1 in non-leap years.
+
+    :param birthday: date: The birthday
+    :param today: date: The current date
+    :return: The number of days until the next birthday
+    """
+    def occurrence(year: int) -> date:
+        try:
+            return birthday.replace(year=year)
+        except ValueError:
+            return date(year, 3, 1)
+
+    next_birthday = occurrence(today.year)
+    if next_birthday < today:
+        next_birthday = occurrence(today.year + 1)
+    return (next_birthday - today).days
+
+
+def to_birthdays(contacts: List[Contact], today: date) -> List[ContactBirthday]:
+    """
+    The to_birthdays function converts contacts into ContactBirthday models, soonest birthday first.
+
+    :param contacts: List[Contact]: Contacts with a birthday in the window
+    :param today: date: The current date
+    :return: A list of ContactBirthday
+    """
+    birthdays = [
+        ContactBirthday(
+            id=contact.id,
+            full_name=f"{contact.first_name} {contact.last_name}",
+            birthday=contact.birthday,
+            days_until_birthday=days_until_birthday(contact.birthday, today),
+        )
+        for contact in contacts
+    ]
+    return sorted(birthdays, key=lambda birthday: (birthday.days_until_birthday, birthday.id))
 
 
-def get_contacts_with_birthdays(db: Session, user: User):
+def get_contacts_with_birthdays(db: Session, user: User, days: int = 7) -> List[ContactBirthday]:
     """
-    The get_contacts_with_birthdays function returns a list of contacts with birthdays in the next week.
+    The get_contacts_with_birthdays function returns the contacts with birthdays in the next days days,
+    including today. The window is matched on the (user_id, birthday_doy) index and wraps around the new year.
 
     :param db: Session: Pass in the database session
     :param user: User: Get the user_id from the database
-    :return: A list of contact objects
+    :param days: int: The length of the window in days
+    :return: A list of ContactBirthday ordered by days_until_birthday
     """
     today = date.today()
-    next_week = today + timedelta(days=7)
-
-    contacts = db.query(Contact).filter(Contact.user_id == user.id).filter(
-        extract('month', Contact.birthday) == today.month,
-        extract('day', Contact.birthday) >= today.day,
-        extract('day', Contact.birthday) <= next_week.day
-    ).all()
-    return contacts
+    window = birthday_window(today, days)
+    query = db.query(Contact).filter(Contact.user_id == user.id)
+    contacts = query.filter(window).all() if window is not None else query.filter(Contact.birthday.isnot(None)).all()
+    return to_birthdays(contacts, today)
@@ -0,0 +1,274 @@
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from datetime import date
+
+from sqlalchemy import select, insert, update, delete, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import settings
+from src.database.models import Contact, User
+from src.repository import contacts as repository_contacts
+from src.repository.contacts import contacts_page_query, split_page, fulltext_search_query, birthday_window, to_birthdays, \
+    export_contacts_query, contact_values, CONTACT_COLUMNS
+from src.schemas import ContactCreate, ContactUpdate, ContactBirthday
+from src.services.contact_versions import contact_versions
+from src.services.search_index import contact_search_index
+
+
+async def get_contacts(skip: int, limit: int, user: User, db: AsyncSession) -> List[Contact]:
+    """
+    The get_contacts function returns a list of contacts for the user.
+
+    :param skip: int: Skip the first n contacts
+    :param limit: int: Limit the number of contacts returned
+    :param user: User: Filter the contacts by user
+    :param db: AsyncSession: Pass the async database session to the function
+    :return: A list of contacts
+    """
+    result = await db.execute(select(Contact).filter(Contact.user_id == user.id).offset(skip).limit(limit))
+    return result.scalars().all()
+
+
+async def get_contacts_page(limit: int, user: User, db: AsyncSession, cursor: Optional[str] = None,
+                            sort: str = "id") -> Tuple[List[Contact], Optional[str]]:
+    """
+    The get_contacts_page function returns one page of the user's contacts using keyset (cursor) pagination.
+
+    :param limit: int: The page size
+    :param user: User: Filter the contacts by user
+    :param db: AsyncSession: Pass the async database session to the function
+    :param cursor: Optional[str]: The cursor returned with the previous page
+    :param sort: str: The sort key, id by default
+    :return: The contacts of the page and the cursor of the next page
+    """
+    result = await db.execute(contacts_page_query(limit, user, cursor, sort))
+    return split_page(result.scalars().all(), limit, sort)
+
+
+async def stream_contacts(db: AsyncSession, user: User, batch_size: int = 1000) -> AsyncIterator[List[tuple]]:
+    """
+    The stream_contacts function streams all the user's contacts as batches of row tuples
+    through a server-side cursor.
+
+    :param db: AsyncSession: Pass the async database session to the function
+    :param user: User: Filter the contacts by user
+    :param batch_size: int: The number of rows per batch
+    :return: An async iterator of row batches
+    """
+    result = await db.stream(export_contacts_query(user, batch_size))
+    async for rows in result.partitions():
+        yield rows
+
+
+async def get_contact(db: AsyncSession, contact_id: int, user: User) -> Contact:
+    """
+    The get_contact function returns the contact with the given id if it belongs to the user.
+
+    :param db: AsyncSession: Pass the async database session to the function
+    :param contact_id: int: Specify the contact id
+    :param user: User: Ensure that the user has access to the contact
+    :return: A contact object or None
+    """
+    result = await db.execute(select(Contact).filter(Contact.id == contact_id, Contact.user_id == user.id))
+    return result.scalars().first()
+
+
+async def create_contact(db: AsyncSession, contact: ContactCreate, user: User) -> Contact:
+    """
+    The create_contact function creates a new contact in the database.
+
+    The row is written with a single INSERT ... RETURNING instead of add + flush + refresh,
+    on databases without RETURNING the ORM path is used.
+
+    :param db: AsyncSession: Access the database
+    :param contact: ContactCreate: Create a new contact
+    :param user: User: Get the user id from the user object
+    :return: The newly created contact
+    """
+    if db.get_bind().dialect.insert_returning:
+        values = contact_values(contact.dict())
+        result = await db.execute(insert(Contact).values(**values, user_id=user.id).returning(*CONTACT_COLUMNS))
+        db_contact = result.one()
+        await db.commit()
+    else:
+        db_contact = Contact(**contact.dict(), user_id=user.id)
+        db.add(db_contact)
+        await db.commit()
+        await db.refresh(db_contact)
+    contact_search_index.upsert(db_contact)
+    await contact_versions.abump(db_contact.user_id)
+    return db_contact
+
+
+async def import_contacts(db: AsyncSession, records: Iterable[Tuple[int, Optional[dict], Optional[str]]], user: User,
+                          chunk_size: int = 1000) -> dict:
+    """
+    The import_contacts function bulk inserts contacts streamed from an uploaded file.
+    It runs the chunked import of the sync repository on the async connection through run_sync.
+
+    :param db: AsyncSession: Access the database
+    :param records: Iterable: (row number, record, parse error) tuples
+    :param user: User: The owner of the imported contacts
+    :param chunk_size: int: The number of rows inserted per statement
+    :return: A dict with the inserted and failed row counts and the per-row errors
+    """
+    user_id = user.id
+    result = await db.run_sync(repository_contacts.import_contacts, records, user, chunk_size, bump_version=False)
+    if result["inserted"]:
+        await contact_versions.abump(user_id)
+    return result
+
+
+async def update_contact(db: AsyncSession, contact_id: int, contact: ContactUpdate, user: User) -> Contact:
+    """
+    The update_contact function updates a contact in the database.
+
+    A single UPDATE ... WHERE id = ... AND user_id = ... RETURNING both checks ownership and
+    returns the new row, on databases without RETURNING the ORM path is used.
+
+    :param db: AsyncSession: Access the database
+    :param contact_id: int: Find the contact in the database
+    :param contact: ContactUpdate: Get the data from the request body
+    :param user: User: Ensure that the user is only able to update their own contacts
+    :return: The updated contact
+    """
+    changes = contact.dict(exclude_unset=True)
+    if changes and db.get_bind().dialect.update_returning:
+        result = await db.execute(
+            update(Contact).where(Contact.id == contact_id, Contact.user_id == user.id)
+            .values(**contact_values(changes)).returning(*CONTACT_COLUMNS),
+            execution_options={"synchronize_session": False},
+        )
+        db_contact = result.one_or_none()
+        if db_contact is None:
+            raise ValueError("Contact not found")
+        await db.commit()
+    else:
+        db_contact = await get_contact(db, contact_id, user)
+        if not db_contact:
+            raise ValueError("Contact not found")
+        for field, value in changes.items():
+            setattr(db_contact, field, value)
+        await db.commit()
+        await db.refresh(db_contact)
+    contact_search_index.upsert(db_contact)
+    await contact_versions.abump(db_contact.user_id)
+    return db_contact
+
+
+async def delete_contact(db: AsyncSession, contact_id: int, user: User) -> Contact:
+    """
+    The delete_contact function deletes a contact from the database.
+
+    A single DELETE ... RETURNING removes the row and returns it,
+    on databases without RETURNING the ORM path is used.
+
+    :param db: AsyncSession: Pass the async database session to the function
+    :param contact_id: int: Specify the contact to delete
+    :param user: User: Make sure that the user is authorized to delete the contact
+    :return: The deleted contact
+    """
+    if db.get_bind().dialect.delete_returning:
+        result = await db.execute(
+            delete(Contact).where(Contact.id == contact_id, Contact.user_id == user.id).returning(*CONTACT_COLUMNS),
+            execution_options={"synchronize_session": False},
+        )
+        db_contact = result.one_or_none()
+        if db_contact is None:
+            raise ValueError("Contact not found")
+    else:
+        db_contact = await get_contact(db, contact_id, user)
+        if not db_contact:
+            raise ValueError("Contact not found")
+        await db.delete(db_contact)
+    await db.commit()
+    contact_search_index.remove(db_contact.user_id, contact_id)
+    await contact_versions.abump(db_contact.user_id)
+    return db_contact
+
+
+async def update_contacts_batch(db: AsyncSession, items: List[Tuple[int, dict]], user: User) -> List[Dict]:
+    """
+    The update_contacts_batch function applies partial updates to many contacts in one transaction,
+    running the set-based statements of the sync repository through run_sync.
+
+    :param db: AsyncSession: Access the database
+    :param items: List[Tuple[int, dict]]: (contact id, changed fields) pairs
+    :param user: User: Only the user's contacts are updated
+    :return: The outcome for each id
+    """
+    user_id = user.id
+    outcomes = await db.run_sync(repository_contacts.update_contacts_batch, items, user, bump_version=False)
+    if any(outcome["status"] == "updated" for outcome in outcomes):
+        await contact_versions.abump(user_id)
+    return outcomes
+
+
+async def delete_contacts_batch(db: AsyncSession, ids: List[int], user: User) -> List[Dict]:
+    """
+    The delete_contacts_batch function deletes many contacts with a single statement through run_sync.
+
+    :param db: AsyncSession: Access the database
+    :param ids: List[int]: The contact ids
+    :param user: User: Only the user's contacts are deleted
+    :return: The outcome for each id
+    """
+    user_id = user.id
+    outcomes = await db.run_sync(repository_contacts.delete_contacts_batch, ids, user, bump_version=False)
+    if any(outcome["status"] == "deleted" for outcome in outcomes):
+        await contact_versions.abump(user_id)
+    return outcomes
+
+
+async def search_contacts(db: AsyncSession, query: str, user: User, limit: Optional[int] = None) -> List[Contact]:
+    """
+    The search_contacts function searches the database for contacts that match a given query.
+    With contact_search_index enabled the query is answered from the in-process index,
+    with contact_search_engine set to fulltext the ranked, index backed query is used.
+
+    :param db: AsyncSession: Access the database
+    :param query: str: Search for a contact by first name, last name or email
+    :param user: User: Get the user id of the current user
+    :param limit: Optional[int]: The maximum number of results
+    :return: A list of contacts that match the query
+    """
+    if not query:
+        return []
+    if settings.contact_search_index:
+        if not contact_search_index.is_loaded(user.id):
+            result = await db.execute(select(Contact).filter(Contact.user_id == user.id))
+            contact_search_index.build(user.id, result.scalars().all())
+        contacts = contact_search_index.search(user.id, query, limit)
+        if contacts is not None:
+            return contacts
+    statement = None
+    if settings.contact_search_engine == "fulltext":
+        statement = fulltext_search_query(db.get_bind().dialect.name, query, user,
+                                          limit or settings.contact_search_limit)
+    if statement is None:
+        statement = select(Contact).filter(Contact.user_id == user.id).filter(or_(
+            Contact.first_name.ilike(f"%{query}%"),
+            Contact.last_name.ilike(f"%{query}%"),
+            Contact.email.ilike(f"%{query}%"),
+        ))
+        if limit:
+            statement = statement.limit(limit)
+    result = await db.execute(statement)
+    return result.scalars().all()
+
+
+async def get_contacts_with_birthdays(db: AsyncSession, user: User, days: int = 7) -> List[ContactBirthday]:
+    """
+    The get_contacts_with_birthdays function returns the contacts with birthdays in the next days days,
+    including today, matched on the (user_id, birthday_doy) index.
+
+    :param db: AsyncSession: Pass in the async database session
+    :param user: User: Get the user_id from the database
+    :param days: int: The length of the window in days
+    :return: A list of ContactBirthday ordered by days_until_birthday
+    """
+    today = date.today()
+    window = birthday_window(today, days)
+    statement = select(Contact).filter(Contact.user_id == user.id)
+    statement = statement.filter(window) if window is not None else statement.filter(Contact.birthday.isnot(None))
+    result = await db.execute(statement)
+    return to_birthdays(result.scalars().all(), today)
@@ -1,8 +1,11 @@
-from libgravatar import Gravatar
+from datetime import datetime
+
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 
 from src.database.models import User
 from src.schemas import UserModel
+from src.services.user_cache import user_cache
 from typing import Optional
 
 
@@ -28,6 +31,8 @@ def create_user(body: UserModel, db: Session) -> User:
     :return: A user object
     """
     try:
+        # imported on first signup, most workers never create users
+        from libgravatar import Gravatar
         g = Gravatar(body.email)
         avatar = g.get_image()
     except Exception as e:
@@ -50,8 +55,10 @@ def update_token(user: User, token: Optional[str], db: Session) -> None:
     :param db: Session: Pass the database session to the function
     :return: None
     """
+    email = user.email
     user.refresh_token = token
     db.commit()
+    user_cache.invalidate(email)
 
 
 def confirmed_email(email: str, db: Session) -> None:
@@ -67,6 +74,7 @@ def confirmed_email(email: str, db: Session) -> None:
     user = get_user_by_email(email, db)
     user.confirmed = True
     db.commit()
+    user_cache.invalidate(email)
 
 def update_avatar(email, url: str, db: Session) -> User:
     """
@@ -80,6 +88,7 @@ def update_avatar(email, url: str, db: Session) -> User:
     user = get_user_by_email(email, db)
     user.avatar = url
     db.commit()
+    user_cache.invalidate(email)
     return user
 
 def update_password(user: User, new_password: str, db: Session):
@@ -93,5 +102,28 @@ def update_password(user: User, new_password: str, db: Session):
     :param db: Session: Pass in the database session to the function
     :return: None
     """
+    email = user.email
     user.password = new_password
+    # whole seconds, as the iat claim of the access tokens issued from now on
+    user.tokens_revoked_at = datetime.utcnow().replace(microsecond=0)
+    db.commit()
+    user_cache.invalidate(email)
+
+
+def rehash_password(email: str, old_password: str, new_password: str, db: Session) -> bool:
+    """
+    The rehash_password function replaces a password hash by an upgraded hash of the same password.
+    The update only applies while the stored hash is still old_password, so a password
+    changed in the meantime is never overwritten. The cached user snapshot has no password,
+    so it stays valid.
+
+    :param email: str: The email of the user
+    :param old_password: str: The hash that was verified
+    :param new_password: str: The upgraded hash
+    :param db: Session: Pass in the database session to the function
+    :return: True if the hash was replaced
+    """
+    result = db.execute(update(User).where(User.email == email, User.password == old_password)
+                        .values(password=new_password))
     db.commit()
+    return result.rowcount == 1
@@ -0,0 +1,124 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import User
+from src.schemas import UserModel
+from src.services.user_cache import user_cache
+
+
+async def get_user_by_email(email: str, db: AsyncSession) -> User:
+    """
+    The get_user_by_email function returns the user with the given email, or None if no such user exists.
+
+    :param email: str: Specify the email of the user
+    :param db: AsyncSession: Pass the async database session to the function
+    :return: A user object
+    """
+    result = await db.execute(select(User).filter(User.email == email))
+    return result.scalars().first()
+
+
+async def create_user(body: UserModel, db: AsyncSession) -> User:
+    """
+    The create_user function creates a new user in the database.
+
+    :param body: UserModel: Define the data that will be used to create a new user
+    :param db: AsyncSession: Pass the async database session to the function
+    :return: A user object
+    """
+    try:
+        # imported on first signup, most workers never create users
+        from libgravatar import Gravatar
+        g = Gravatar(body.email)
+        avatar = g.get_image()
+    except Exception as e:
+        print(f"Failed to get Gravatar image: {e}")
+        avatar = None
+
+    new_user = User(**body.dict(), avatar=avatar)
+    db.add(new_user)
+    await db.commit()
+    await db.refresh(new_user)
+    return new_user
+
+
+async def update_token(user: User, token: Optional[str], db: AsyncSession) -> None:
+    """
+    The update_token function updates the refresh token for a user.
+
+    :param user: User: Identify the user
+    :param token: Optional[str]: The new refresh token, or None to revoke it
+    :param db: AsyncSession: Pass the async database session to the function
+    :return: None
+    """
+    email = user.email
+    user.refresh_token = token
+    await db.commit()
+    await user_cache.ainvalidate(email)
+
+
+async def confirmed_email(email: str, db: AsyncSession) -> None:
+    """
+    The confirmed_email function marks the user with the given email as confirmed.
+
+    :param email: str: Specify the email of the user to be confirmed
+    :param db: AsyncSession: Pass in the async database session to the function
+    :return: None
+    """
+    user = await get_user_by_email(email, db)
+    user.confirmed = True
+    await db.commit()
+    await user_cache.ainvalidate(email)
+
+
+async def update_avatar(email, url: str, db: AsyncSession) -> User:
+    """
+    The update_avatar function updates the avatar of a user.
+
+    :param email: Find the user in the database
+    :param url: str: The new avatar url
+    :param db: AsyncSession: Pass the async database session to the function
+    :return: The updated user object
+    """
+    user = await get_user_by_email(email, db)
+    user.avatar = url
+    await db.commit()
+    await user_cache.ainvalidate(email)
+    return user
+
+
+async def update_password(user: User, new_password: str, db: AsyncSession) -> None:
+    """
+    The update_password function sets a new (already hashed) password for the user.
+
+    :param user: User: The user whose password is changed
+    :param new_password: str: Pass in the new password to be set
+    :param db: AsyncSession: Pass in the async database session to the function
+    :return: None
+    """
+    email = user.email
+    user.password = new_password
+    # whole seconds, as the iat claim of the access tokens issued from now on
+    user.tokens_revoked_at = datetime.utcnow().replace(microsecond=0)
+    await db.commit()
+    await user_cache.ainvalidate(email)
+
+
+async def rehash_password(email: str, old_password: str, new_password: str, db: AsyncSession) -> bool:
+    """
+    The rehash_password function replaces a password hash by an upgraded hash of the same password,
+    only while the stored hash is still old_password.
+
+    :param email: str: The email of the user
+    :param old_password: str: The hash that was verified
+    :param new_password: str: The upgraded hash
+    :param db: AsyncSession: Pass in the async database session to the function
+    :return: True if the hash was replaced
+    """
+    result = await db.execute(update(User).where(User.email == email, User.password == old_password)
+                              .values(password=new_password))
+    await db.commit()
+    return result.rowcount == 1
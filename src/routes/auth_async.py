@@ -0,0 +1,150 @@
+from functools import lru_cache
+
+from fastapi import APIRouter, HTTPException, Depends, status, Security, BackgroundTasks, Request, Form
+from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.database.db import get_async_db
+from src.schemas import UserModel, UserResponse, TokenModel, RequestEmail
+from src.repository import users_async as repository_users
+from src.services.auth import auth_service
+from src.services.email import send_email, send_password_reset_email
+from src.services.rate_limit import limit_by_client
+
+router = APIRouter(prefix='/auth', tags=["auth"])
+security = HTTPBearer()
+
+
+@lru_cache(maxsize=None)
+def get_templates():
+    # Jinja2 is imported on the first reset password form, not at worker startup
+    from fastapi.templating import Jinja2Templates
+    return Jinja2Templates(directory="src/routes/templates")
+
+
+@router.post("/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
+async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Request,
+                 db: AsyncSession = Depends(get_async_db)):
+
+    exist_user = await repository_users.get_user_by_email(body.email, db)
+    if exist_user:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Account already exists")
+    body.password = await auth_service.get_password_hash_async(body.password)
+    new_user = await repository_users.create_user(body, db)
+    background_tasks.add_task(send_email, new_user.email, new_user.username, request.base_url)
+    return {"user": new_user, "detail": "User successfully created. Check your email for confirmation."}
+
+
+@router.post("/login", response_model=TokenModel, dependencies=[Depends(limit_by_client("login"))])
+async def login(background_tasks: BackgroundTasks, body: OAuth2PasswordRequestForm = Depends(),
+                db: AsyncSession = Depends(get_async_db)):
+
+    user = await repository_users.get_user_by_email(body.username, db)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email")
+    if not user.confirmed:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Email not confirmed")
+    if not await auth_service.verify_password_async(body.password, user.password):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password")
+    if auth_service.password_needs_update(user.password):
+        background_tasks.add_task(auth_service.rehash_password_async, user.email, body.password, user.password,
+                                  db.bind)
+    # Generate JWT
+    access_token = auth_service.create_access_token(data={"sub": user.email})
+    refresh_token = await auth_service.issue_refresh_token(user.email)
+    if refresh_token is None:
+        # no refresh token store, fall back to the single refresh_token column
+        refresh_token = auth_service.create_refresh_token(data={"sub": user.email})
+        await repository_users.update_token(user, refresh_token, db)
+    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+
+
+@router.get('/confirmed_email/{token}')
+async def confirmed_email(token: str, db: AsyncSession = Depends(get_async_db)):
+
+    email = auth_service.get_email_from_token(token)
+    user = await repository_users.get_user_by_email(email, db)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Verification error")
+    if user.confirmed:
+        return {"message": "Your email is already confirmed"}
+    await repository_users.confirmed_email(email, db)
+    return {"message": "Email confirmed"}
+
+
+@router.post('/request_email')
+async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, request: Request,
+                        db: AsyncSession = Depends(get_async_db)):
+
+    user = await repository_users.get_user_by_email(body.email, db)
+
+    if user.confirmed:
+        return {"message": "Your email is already confirmed"}
+    if user:
+        background_tasks.add_task(send_email, user.email, user.username, request.base_url)
+    return {"message": "Check your email for confirmation."}
+
+
+@router.get('/refresh_token', response_model=TokenModel)
+async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(security),
+                        db: AsyncSession = Depends(get_async_db)):
+
+    token = credentials.credentials
+    claims = auth_service.decode_refresh_claims(token)
+    email = claims["sub"]
+    access_token = auth_service.create_access_token(data={"sub": email})
+    if "fam" in claims:
+        # one Redis round trip, no database access
+        refresh_token = await auth_service.rotate_refresh_token(claims)
+        return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+
+    user = await repository_users.get_user_by_email(email, db)
+    if user.refresh_token != token:
+        await repository_users.update_token(user, None, db)
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+
+    # move the session to the refresh token store when it is available
+    refresh_token = await auth_service.issue_refresh_token(email)
+    if refresh_token is None:
+        refresh_token = auth_service.create_refresh_token(data={"sub": email})
+        await repository_users.update_token(user, refresh_token, db)
+    else:
+        await repository_users.update_token(user, None, db)
+    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+
+
+@router.post('/request_reset_password')
+async def request_reset_password(body: RequestEmail, background_tasks: BackgroundTasks, request: Request,
+                                 db: AsyncSession = Depends(get_async_db)):
+
+    user = await repository_users.get_user_by_email(body.email, db)
+
+    if user:
+        background_tasks.add_task(send_password_reset_email, user.email, user.username, request.base_url)
+    return {"message": "Check your email for confirmation."}
+
+
+@router.get('/reset_password/{token}')
+async def show_reset_password_form(token: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+
+    email = auth_service.get_email_from_token(token)
+    user = await repository_users.get_user_by_email(email, db)
+    if not user:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid token or user not found")
+    return get_templates().TemplateResponse("reset_password_form.html", {"request": request, "token": token})
+
+@router.post('/update_password/{token}')
+async def update_password(token: str, new_password: str = Form(...), db: AsyncSession = Depends(get_async_db)):
+
+    email = auth_service.get_email_from_token(token)
+    user = await repository_users.get_user_by_email(email, db)
+    if not user:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid token or user not found")
+
+    hashed_password = await auth_service.get_password_hash_async(new_password)
+    # the old sessions end before the password changes, so a Redis outage fails the change instead of
+    # leaving them valid, and again after it, for a login with the old password in between
+    await auth_service.revoke_refresh_tokens(email)
+    await repository_users.update_password(user, hashed_password, db)
+    await auth_service.revoke_refresh_tokens(email)
+
+    return {"message": "Password has been updated successfully"}
@@ -1,57 +1,154 @@
-from typing import List
-from fastapi import APIRouter, HTTPException, Depends, status, Query
+from typing import List, Optional, Union
+from fastapi import APIRouter, HTTPException, Depends, status, Query, UploadFile, File
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm.session import Session
 
-from src.database.db import get_db
+from src.database.replicas import replica_session, read_your_writes
+from src.database.shards import shard_session
 from src.database.models import User
-from src.schemas import ContactCreate, ContactUpdate, ContactResponse, ContactBirthday
+from src.schemas import ContactCreate, ContactUpdate, ContactResponse, ContactPage, ContactBirthday, \
+    BulkImportResponse, ContactBatchUpdate, ContactBatchDelete, ContactBatchResult
 from src.repository import contacts as repository_contacts
 from src.services.auth import auth_service
+from src.services import contacts_io
+from src.services.contact_versions import conditional_get
+from src.services.rate_limit import limit_by_user
+from src.conf.config import settings
 
 
 router = APIRouter(prefix='/contacts', tags=["contacts"])
-
-
-@router.get("/", response_model=List[ContactResponse])
+reads_limit = limit_by_user("reads", auth_service.get_current_user)
+writes_limit = limit_by_user("writes", auth_service.get_current_user)
+search_limit = limit_by_user("search", auth_service.get_current_user)
+# ETag checks, a client that already has the current contacts gets 304 before any query
+contacts_etag = conditional_get(auth_service.get_current_user)
+birthdays_etag = conditional_get(auth_service.get_current_user, daily=True)
+shard_db = shard_session(auth_service.get_current_user)
+replica_db = replica_session(auth_service.get_current_user, shard_db)
+pin_primary = read_your_writes(auth_service.get_current_user)
+# write routes count against the writes policy and keep the user's reads on the primary for a while
+write_dependencies = [Depends(writes_limit), Depends(pin_primary)]
+
+
+@router.get("/", response_model=Union[ContactPage, List[ContactResponse]],
+            dependencies=[Depends(reads_limit), Depends(contacts_etag)])
 def read_contacts(
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    paginate: str = Query("offset", regex="^(offset|cursor)$",
+                          description="offset returns a plain list, cursor returns a page with next_cursor"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page, implies paginate=cursor"),
+    sort: str = Query("id", regex="^(id|first_name|last_name|email|birthday)$", description="Cursor mode sort key"),
+    db: Session = Depends(replica_db),
     current_user: User = Depends(auth_service.get_current_user),
 ):
 
+    if paginate == "cursor" or cursor is not None:
+        try:
+            contacts, next_cursor = repository_contacts.get_contacts_page(limit, current_user, db, cursor, sort)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        return {"items": contacts, "next_cursor": next_cursor}
     contacts = repository_contacts.get_contacts(skip, limit, current_user, db)
     return contacts
 
 
-@router.put("/{contact_id}", response_model=ContactResponse)
+@router.get("/birthdays", response_model=List[ContactBirthday],
+            dependencies=[Depends(reads_limit), Depends(birthdays_etag)])
+def get_contacts_with_birthdays(
+    days: int = Query(7, ge=0, le=366, description="Window length in days, starting today"),
+    db: Session = Depends(replica_db),
+    current_user: User = Depends(auth_service.get_current_user),):
+
+    contacts = repository_contacts.get_contacts_with_birthdays(db, current_user, days)
+    return contacts
+
+
+@router.get("/export", dependencies=[Depends(reads_limit)])
+def export_contacts(
+    format: str = Query("ndjson", regex="^(csv|ndjson)$"),
+    db: Session = Depends(shard_db),
+    current_user: User = Depends(auth_service.get_current_user),
+):
+
+    def rows():
+        if format == "csv":
+            yield contacts_io.csv_header()
+        for batch in repository_contacts.stream_contacts(db, current_user, settings.contact_export_batch_size):
+            yield contacts_io.format_rows(batch, format)
+
+    return StreamingResponse(rows(), media_type=contacts_io.media_type(format),
+                             headers={"Content-Disposition": f'attachment; filename="contacts.{format}"'})
+
+
+@router.patch("/batch", response_model=List[ContactBatchResult], dependencies=write_dependencies)
+def update_contacts_batch(
+    body: ContactBatchUpdate,
+    db: Session = Depends(shard_db),
+    current_user: User = Depends(auth_service.get_current_user),
+):
+
+    items = [(item.id, item.dict(exclude_unset=True, exclude={"id"})) for item in body.items]
+    try:
+        return repository_contacts.update_contacts_batch(db, items, current_user)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+
+@router.delete("/batch", response_model=List[ContactBatchResult], dependencies=write_dependencies)
+def delete_contacts_batch(
+    body: ContactBatchDelete,
+    db: Session = Depends(shard_db),
+    current_user: User = Depends(auth_service.get_current_user),
+):
+
+    return repository_contacts.delete_contacts_batch(db, body.ids, current_user)
+
+
+@router.put("/{contact_id}", response_model=ContactResponse, dependencies=write_dependencies)
 def update_contact(
     contact_id: int,
     contact: ContactUpdate,
-    db: Session = Depends(get_db),
+    db: Session = Depends(shard_db),
     current_user: User = Depends(auth_service.get_current_user),
 ):
 
-    db_contact = repository_contacts.get_contact(db=db, contact_id=contact_id, user=current_user)
-    if not db_contact:
+    try:
+        return repository_contacts.update_contact(db=db, contact_id=contact_id, contact=contact, user=current_user)
+    except ValueError:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
-    return repository_contacts.update_contact(db=db, contact_id=contact_id, contact=contact, user=current_user)
 
 
-@router.post("/", response_model=ContactResponse)
+@router.post("/", response_model=ContactResponse, dependencies=write_dependencies)
 def create_contact(
     contact: ContactCreate,
-    db: Session = Depends(get_db),
+    db: Session = Depends(shard_db),
     current_user: User = Depends(auth_service.get_current_user),
 ):
 
     return repository_contacts.create_contact(db=db, contact=contact, user=current_user)
 
 
-@router.get("/{contact_id}", response_model=ContactResponse)
+@router.post("/bulk", response_model=BulkImportResponse, dependencies=write_dependencies)
+def import_contacts(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, regex="^(csv|ndjson)$", description="Defaults to the file type"),
+    db: Session = Depends(shard_db),
+    current_user: User = Depends(auth_service.get_current_user),
+):
+
+    file_format = contacts_io.detect_format(file.filename, file.content_type, format)
+    if file_format is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported file format, use csv or ndjson")
+    records = contacts_io.read_records(file.file, file_format)
+    return repository_contacts.import_contacts(db, records, current_user, settings.contact_bulk_chunk_size)
+
+
+@router.get("/{contact_id}", response_model=ContactResponse,
+            dependencies=[Depends(reads_limit), Depends(contacts_etag)])
 def read_contact(
     contact_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(shard_db),
     current_user: User = Depends(auth_service.get_current_user),
 ):
 
@@ -61,37 +158,28 @@ def read_contact(
     return contact
 
 
-@router.delete("/{contact_id}", response_model=ContactResponse)
+@router.delete("/{contact_id}", response_model=ContactResponse, dependencies=write_dependencies)
 def delete_contact(
     contact_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(shard_db),
     current_user: User = Depends(auth_service.get_current_user),
 ):
 
-    db_contact = repository_contacts.get_contact(db=db, contact_id=contact_id, user=current_user)
-    if not db_contact:
+    try:
+        return repository_contacts.delete_contact(db=db, contact_id=contact_id, user=current_user)
+    except ValueError:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
-    repository_contacts.delete_contact(db=db, contact_id=contact_id, user=current_user)
-    return db_contact
 
 
-@router.post("/search", response_model=List[ContactResponse])
+@router.post("/search", response_model=List[ContactResponse], dependencies=[Depends(search_limit)])
 def search_contacts(
     query: str = Query(None, description="Search query"),
-    db: Session = Depends(get_db),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Maximum number of results"),
+    db: Session = Depends(replica_db),
     current_user: User = Depends(auth_service.get_current_user),
 ):
 
     if not query:
         return []
-    contacts = repository_contacts.search_contacts(db, query, current_user)
-    return contacts
-
-
-@router.get("/birthdays", response_model=List[ContactResponse])
-def get_contacts_with_birthdays(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(auth_service.get_current_user),):
-
-    contacts = repository_contacts.get_contacts_with_birthdays(db, current_user)
+    contacts = repository_contacts.search_contacts(db, query, current_user, limit)
     return contacts
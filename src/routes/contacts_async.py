@@ -0,0 +1,185 @@
+from typing import List, Optional, Union
+from fastapi import APIRouter, HTTPException, Depends, status, Query, UploadFile, File
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.replicas import async_replica_session, read_your_writes
+from src.database.shards import async_shard_session
+from src.database.models import User
+from src.schemas import ContactCreate, ContactUpdate, ContactResponse, ContactPage, ContactBirthday, \
+    BulkImportResponse, ContactBatchUpdate, ContactBatchDelete, ContactBatchResult
+from src.repository import contacts_async as repository_contacts
+from src.services.auth import auth_service
+from src.services import contacts_io
+from src.services.contact_versions import conditional_get
+from src.services.rate_limit import limit_by_user
+from src.conf.config import settings
+
+
+router = APIRouter(prefix='/contacts', tags=["contacts"])
+reads_limit = limit_by_user("reads", auth_service.get_current_user_async)
+writes_limit = limit_by_user("writes", auth_service.get_current_user_async)
+search_limit = limit_by_user("search", auth_service.get_current_user_async)
+# ETag checks, a client that already has the current contacts gets 304 before any query
+contacts_etag = conditional_get(auth_service.get_current_user_async)
+birthdays_etag = conditional_get(auth_service.get_current_user_async, daily=True)
+shard_db = async_shard_session(auth_service.get_current_user_async)
+replica_db = async_replica_session(auth_service.get_current_user_async, shard_db)
+pin_primary = read_your_writes(auth_service.get_current_user_async)
+# write routes count against the writes policy and keep the user's reads on the primary for a while
+write_dependencies = [Depends(writes_limit), Depends(pin_primary)]
+
+
+@router.get("/", response_model=Union[ContactPage, List[ContactResponse]],
+            dependencies=[Depends(reads_limit), Depends(contacts_etag)])
+async def read_contacts(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    paginate: str = Query("offset", regex="^(offset|cursor)$",
+                          description="offset returns a plain list, cursor returns a page with next_cursor"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page, implies paginate=cursor"),
+    sort: str = Query("id", regex="^(id|first_name|last_name|email|birthday)$", description="Cursor mode sort key"),
+    db: AsyncSession = Depends(replica_db),
+    current_user: User = Depends(auth_service.get_current_user_async),
+):
+
+    if paginate == "cursor" or cursor is not None:
+        try:
+            contacts, next_cursor = await repository_contacts.get_contacts_page(limit, current_user, db, cursor, sort)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        return {"items": contacts, "next_cursor": next_cursor}
+    contacts = await repository_contacts.get_contacts(skip, limit, current_user, db)
+    return contacts
+
+
+@router.get("/birthdays", response_model=List[ContactBirthday],
+            dependencies=[Depends(reads_limit), Depends(birthdays_etag)])
+async def get_contacts_with_birthdays(
+    days: int = Query(7, ge=0, le=366, description="Window length in days, starting today"),
+    db: AsyncSession = Depends(replica_db),
+    current_user: User = Depends(auth_service.get_current_user_async),):
+
+    contacts = await repository_contacts.get_contacts_with_birthdays(db, current_user, days)
+    return contacts
+
+
+@router.get("/export", dependencies=[Depends(reads_limit)])
+async def export_contacts(
+    format: str = Query("ndjson", regex="^(csv|ndjson)$"),
+    db: AsyncSession = Depends(shard_db),
+    current_user: User = Depends(auth_service.get_current_user_async),
+):
+
+    async def rows():
+        if format == "csv":
+            yield contacts_io.csv_header()
+        async for batch in repository_contacts.stream_contacts(db, current_user, settings.contact_export_batch_size):
+            yield contacts_io.format_rows(batch, format)
+
+    return StreamingResponse(rows(), media_type=contacts_io.media_type(format),
+                             headers={"Content-Disposition": f'attachment; filename="contacts.{format}"'})
+
+
+@router.patch("/batch", response_model=List[ContactBatchResult], dependencies=write_dependencies)
+async def update_contacts_batch(
+    body: ContactBatchUpdate,
+    db: AsyncSession = Depends(shard_db),
+    current_user: User = Depends(auth_service.get_current_user_async),
+):
+
+    items = [(item.id, item.dict(exclude_unset=True, exclude={"id"})) for item in body.items]
+    try:
+        return await repository_contacts.update_contacts_batch(db, items, current_user)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+
+@router.delete("/batch", response_model=List[ContactBatchResult], dependencies=write_dependencies)
+async def delete_contacts_batch(
+    body: ContactBatchDelete,
+    db: AsyncSession = Depends(shard_db),
+    current_user: User = Depends(auth_service.get_current_user_async),
+):
+
+    return await repository_contacts.delete_contacts_batch(db, body.ids, current_user)
+
+
+@router.put("/{contact_id}", response_model=ContactResponse, dependencies=write_dependencies)
+async def update_contact(
+    contact_id: int,
+    contact: ContactUpdate,
+    db: AsyncSession = Depends(shard_db),
+    current_user: User = Depends(auth_service.get_current_user_async),
+):
+
+    try:
+        return await repository_contacts.update_contact(db=db, contact_id=contact_id, contact=contact, user=current_user)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
+
+
+@router.post("/", response_model=ContactResponse, dependencies=write_dependencies)
+async def create_contact(
+    contact: ContactCreate,
+    db: AsyncSession = Depends(shard_db),
+    current_user: User = Depends(auth_service.get_current_user_async),
+):
+
+    return await repository_contacts.create_contact(db=db, contact=contact, user=current_user)
+
+
+@router.post("/bulk", response_model=BulkImportResponse, dependencies=write_dependencies)
+async def import_contacts(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, regex="^(csv|ndjson)$", description="Defaults to the file type"),
+    db: AsyncSession = Depends(shard_db),
+    current_user: User = Depends(auth_service.get_current_user_async),
+):
+
+    file_format = contacts_io.detect_format(file.filename, file.content_type, format)
+    if file_format is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported file format, use csv or ndjson")
+    records = contacts_io.read_records(file.file, file_format)
+    return await repository_contacts.import_contacts(db, records, current_user, settings.contact_bulk_chunk_size)
+
+
+@router.get("/{contact_id}", response_model=ContactResponse,
+            dependencies=[Depends(reads_limit), Depends(contacts_etag)])
+async def read_contact(
+    contact_id: int,
+    db: AsyncSession = Depends(shard_db),
+    current_user: User = Depends(auth_service.get_current_user_async),
+):
+
+    contact = await repository_contacts.get_contact(db, contact_id, current_user)
+    if contact is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
+    return contact
+
+
+@router.delete("/{contact_id}", response_model=ContactResponse, dependencies=write_dependencies)
+async def delete_contact(
+    contact_id: int,
+    db: AsyncSession = Depends(shard_db),
+    current_user: User = Depends(auth_service.get_current_user_async),
+):
+
+    try:
+        return await repository_contacts.delete_contact(db=db, contact_id=contact_id, user=current_user)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
+
+
+@router.post("/search", response_model=List[ContactResponse], dependencies=[Depends(search_limit)])
+async def search_contacts(
+    query: str = Query(None, description="Search query"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Maximum number of results"),
+    db: AsyncSession = Depends(replica_db),
+    current_user: User = Depends(auth_service.get_current_user_async),
+):
+
+    if not query:
+        return []
+    contacts = await repository_contacts.search_contacts(db, query, current_user, limit)
+    return contacts
@@ -0,0 +1,142 @@
+import secrets
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+
+from src.conf.config import settings
+
+from src.database import db
+from src.database.pool import pool_status
+from src.database.replicas import async_replica_router, primary_pins, replica_router
+from src.database.shards import shard_map
+from src.services.contact_versions import contact_versions
+from src.services.password_pool import password_pool
+from src.services.rate_limit import rate_limiter
+from src.services.refresh_tokens import refresh_tokens
+from src.services.route_audit import audit_routes
+from src.services.user_cache import user_cache
+
+
+
+def require_internal_token(x_internal_token: str = Header(None)) -> None:
+    """
+    The require_internal_token function guards the diagnostics: the X-Internal-Token header of the request
+    must match the internal_token setting.
+
+    :param x_internal_token: str: The X-Internal-Token header
+    :return: None
+    """
+    expected = settings.internal_token
+    if not expected or not x_internal_token or not secrets.compare_digest(x_internal_token, expected):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+
+
+router = APIRouter(prefix="/internal", tags=["internal"], include_in_schema=False,
+                   dependencies=[Depends(require_internal_token)])
+
+
+@router.get("/pool")
+def read_pool_stats():
+    """
+    The read_pool_stats function reports the state of the database connection pools:
+    size, checked-in/checked-out connections, overflow in use and the checkout wait time histogram.
+    It is meant for sizing db_pool_size/db_max_overflow against the worker count.
+
+    :return: Pool statistics for the sync engine and, in async mode, the async engine
+    """
+    return {
+        "sync": pool_status(db.engine.pool),
+        "async": pool_status(db.async_engine.pool) if db.async_engine is not None else None,
+    }
+
+
+@router.get("/replicas")
+def read_replica_stats():
+    """
+    The read_replica_stats function reports the read replicas of this worker process: the result of their
+    last health check, their lag, the reads they served and their pools, the reads that fell back to the primary
+    and the primary pins.
+
+    :return: Replica statistics for the sync router and, in async mode, the async router
+    """
+    return {
+        "sync": replica_router.stats(),
+        "async": async_replica_router.stats() if async_replica_router is not None else None,
+        "pins": primary_pins.stats(),
+    }
+
+
+@router.get("/shards")
+def read_shard_stats():
+    """
+    The read_shard_stats function reports the pools of the contact shards and the shard lookups
+    of this worker process.
+
+    :return: Shard statistics
+    """
+    return shard_map.stats()
+
+
+@router.get("/contact-versions")
+def read_contact_version_stats():
+    """
+    The read_contact_version_stats function reports the contact version bumps, the reads answered 304
+    and the Redis errors of the contact version counters in this worker process.
+
+    :return: Contact version statistics
+    """
+    return contact_versions.stats()
+
+
+@router.get("/user-cache")
+def read_user_cache_stats():
+    """
+    The read_user_cache_stats function reports the hit/miss counters of the current user snapshot cache
+    in this worker process.
+
+    :return: User cache statistics
+    """
+    return user_cache.stats()
+
+
+@router.get("/password-pool")
+def read_password_pool_stats():
+    """
+    The read_password_pool_stats function reports the size, the operations in flight
+    and the rejected operations of the password pool.
+
+    :return: Password pool statistics
+    """
+    return password_pool.stats()
+
+
+@router.get("/refresh-tokens")
+def read_refresh_token_stats():
+    """
+    The read_refresh_token_stats function reports the issued, rotated, rejected and reused refresh tokens
+    and the Redis errors of the refresh token store in this worker process.
+
+    :return: Refresh token store statistics
+    """
+    return refresh_tokens.stats()
+
+
+@router.get("/rate-limiter")
+def read_rate_limiter_stats():
+    """
+    The read_rate_limiter_stats function reports the kind, the allowed and rejected requests
+    and the Redis errors of the rate limiter in this worker process (and the buckets and syncs of the local one).
+
+    :return: Rate limiter statistics
+    """
+    return rate_limiter.stats()
+
+
+@router.get("/routes")
+def read_route_audit(request: Request):
+    """
+    The read_route_audit function reports the size of the route table, duplicate method/path pairs
+    and the cost of matching a request against the table.
+
+    :return: Route table audit
+    """
+    return audit_routes(request.app.routes)
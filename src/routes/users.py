@@ -1,13 +1,11 @@
 from fastapi import APIRouter, Depends, status, UploadFile, File
 from sqlalchemy.orm import Session
-import cloudinary
-import cloudinary.uploader
 
 from src.database.db import get_db
 from src.database.models import User
 from src.repository import users as repository_users
 from src.services.auth import auth_service
-from src.conf.config import settings
+from src.services.avatars import upload_avatar
 from src.schemas import UserDb
 
 router = APIRouter(prefix="/users", tags=["users"])
@@ -39,15 +37,6 @@ def update_avatar_user(file: UploadFile = File(), current_user: User = Depends(a
     :param db: Session: Access the database
     :return: The updated user object
     """
-    cloudinary.config(
-        cloud_name=settings.cloudinary_name,
-        api_key=settings.cloudinary_api_key,
-        api_secret=settings.cloudinary_api_secret,
-        secure=True
-    )
-
-    r = cloudinary.uploader.upload(file.file, public_id=f'ContactApp/{current_user.username}', overwrite=True)
-    src_url = cloudinary.CloudinaryImage(f'ContactApp/{current_user.username}')\
-                        .build_url(width=250, height=250, crop='fill', version=r.get('version'))
+    src_url = upload_avatar(file.file, current_user.username)
     user = repository_users.update_avatar(current_user.email, src_url, db)
     return user
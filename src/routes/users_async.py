@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.db import get_async_db
+from src.database.models import User
+from src.repository import users_async as repository_users
+from src.services.auth import auth_service
+from src.services.avatars import upload_avatar
+from src.schemas import UserDb
+
+router = APIRouter(prefix="/users", tags=["users"])
+
+
+@router.get("/me/", response_model=UserDb)
+async def read_users_me(current_user: User = Depends(auth_service.get_current_user_async)):
+    """
+    The read_users_me function is a GET endpoint that returns the current user's information.
+
+    :param current_user: User: Get the current user
+    :return: The current user
+    """
+    return current_user
+
+
+@router.patch('/avatar', response_model=UserDb)
+async def update_avatar_user(file: UploadFile = File(),
+                             current_user: User = Depends(auth_service.get_current_user_async),
+                             db: AsyncSession = Depends(get_async_db)):
+    """
+    The update_avatar_user function uploads the new avatar to Cloudinary and stores its url.
+        The Cloudinary upload is a blocking HTTP call, so it is run in the threadpool
+        to keep the event loop free.
+
+    :param file: UploadFile: Upload the file to cloudinary
+    :param current_user: User: Get the current user's information
+    :param db: AsyncSession: Access the database
+    :return: The updated user object
+    """
+    src_url = await run_in_threadpool(upload_avatar, file.file, current_user.username)
+    user = await repository_users.update_avatar(current_user.email, src_url, db)
+    return user
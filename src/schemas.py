@@ -1,6 +1,6 @@
 from typing import List, Optional
 from datetime import date
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, validator
 from pydantic.fields import Field
 from datetime import datetime
 
@@ -20,12 +20,60 @@ class ContactUpdate(ContactBase):
     pass
 
 
+class ContactPatch(BaseModel):
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    birthday: Optional[date] = None
+    additional_info: Optional[str] = None
+
+    @validator("first_name", "last_name", "email", "phone", "birthday", pre=True)
+    def not_null(cls, value, field):
+        # the fields may be left out, but ContactResponse requires them, so they cannot be cleared
+        if value is None:
+            raise ValueError(f"{field.name} cannot be null")
+        return value
+
+class ContactBatchUpdateItem(ContactPatch):
+    id: int
+
+class ContactBatchUpdate(BaseModel):
+    items: List[ContactBatchUpdateItem] = Field(..., min_items=1, max_items=1000)
+
+    @validator("items")
+    def unique_ids(cls, items):
+        if len({item.id for item in items}) != len(items):
+            raise ValueError("Duplicate contact ids")
+        return items
+
+class ContactBatchDelete(BaseModel):
+    ids: List[int] = Field(..., min_items=1, max_items=1000)
+
+class ContactBatchResult(BaseModel):
+    id: int
+    status: str
+
+
 class ContactResponse(ContactBase):
     id: int
 
     class Config:
         orm_mode = True
 
+class ContactPage(BaseModel):
+    items: List[ContactResponse]
+    next_cursor: Optional[str] = None
+
+class BulkRowError(BaseModel):
+    row: int
+    detail: str
+
+class BulkImportResponse(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[BulkRowError]
+
 class SearchQuery(BaseModel):
     query: str
 
@@ -1,28 +1,35 @@
+import logging
+import calendar
 from typing import Optional
-import pickle
-import redis
 from jose import JWTError, jwt
 from fastapi import HTTPException, status, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from src.database.db import get_db
+from src.database.db import get_db, get_async_db
+from src.database.models import User
 from src.repository import users as repository_users
+from src.repository import users_async as repository_users_async
+from src.services.password_pool import PasswordPoolBusy, hash_password, needs_update, password_pool, pwd_context, \
+    verify_password
+from src.services.refresh_tokens import RefreshStoreUnavailable, refresh_tokens
+from src.services.token_cache import VerifiedTokenCache
+from src.services.user_cache import user_cache
+from src.conf.config import settings
 import os
 
+logger = logging.getLogger(__name__)
+
 
 
 class Auth:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    pwd_context = pwd_context
     SECRET_KEY = os.getenv("SECRET_KEY")
     ALGORITHM = os.getenv("ALGORITHM")
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
-    r = redis.Redis(
-        host=os.getenv("REDIS_HOST"),
-        port=int(os.getenv("REDIS_PORT")),
-        db=0
-    )
+    token_cache = VerifiedTokenCache(settings.jwt_cache_size)
 
     def verify_password(self, plain_password, hashed_password):
 
@@ -32,6 +39,89 @@ class Auth:
 
         return self.pwd_context.hash(password)
 
+    async def _run_password_task(self, fn, *args):
+        try:
+            return await password_pool.run(fn, *args)
+        except PasswordPoolBusy:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Too many password operations in progress, retry later",
+                                headers={"Retry-After": "1"})
+
+    async def verify_password_async(self, plain_password: str, hashed_password: str) -> bool:
+        """
+        The verify_password_async function checks a password on the password pool,
+        so the caller's thread or event loop is not held for the duration of bcrypt.
+
+        :param plain_password: str: The password to check
+        :param hashed_password: str: The stored hash
+        :return: True if the password matches
+        """
+        return await self._run_password_task(verify_password, plain_password, hashed_password)
+
+    async def get_password_hash_async(self, password: str) -> str:
+        """
+        The get_password_hash_async function hashes a password on the password pool.
+        Both wrappers answer 503 with Retry-After when the pool is saturated.
+
+        :param password: str: The plain password
+        :return: The password hash
+        """
+        return await self._run_password_task(hash_password, password)
+
+    def password_needs_update(self, hashed_password: str) -> bool:
+        """
+        The password_needs_update function tells whether a verified hash uses an outdated scheme or cost.
+
+        :param hashed_password: str: The stored hash
+        :return: True if the password should be rehashed
+        """
+        return needs_update(hashed_password)
+
+    async def _upgraded_hash(self, password: str) -> Optional[str]:
+        try:
+            return await password_pool.run(hash_password, password)
+        except PasswordPoolBusy:
+            # not urgent, the hash is upgraded on a later login
+            return None
+
+    async def rehash_password(self, email: str, password: str, old_password: str, bind) -> None:
+        """
+        The rehash_password function is run by login as a background task after a successful
+        verification of an outdated hash. It stores a hash with the current scheme and cost
+        unless the password has been changed meanwhile.
+
+        :param email: str: The email of the user
+        :param password: str: The verified plain password
+        :param old_password: str: The outdated hash
+        :param bind: The engine of the request session
+        :return: None
+        """
+        new_password = await self._upgraded_hash(password)
+        if new_password is None:
+            return
+
+        def store():
+            with Session(bind=bind) as db:
+                repository_users.rehash_password(email, old_password, new_password, db)
+
+        await run_in_threadpool(store)
+
+    async def rehash_password_async(self, email: str, password: str, old_password: str, bind) -> None:
+        """
+        The rehash_password_async function is the async session counterpart of rehash_password.
+
+        :param email: str: The email of the user
+        :param password: str: The verified plain password
+        :param old_password: str: The outdated hash
+        :param bind: The async engine of the request session
+        :return: None
+        """
+        new_password = await self._upgraded_hash(password)
+        if new_password is None:
+            return
+        async with AsyncSession(bind=bind) as db:
+            await repository_users_async.rehash_password(email, old_password, new_password, db)
+
     # define a function to generate a new access token
     def create_access_token(self, data: dict, expires_delta: Optional[float] = None):
 
@@ -51,46 +141,79 @@ class Auth:
         if expires_delta:
             expire = datetime.utcnow() + timedelta(seconds=expires_delta)
         else:
-            expire = datetime.utcnow() + timedelta(days=7)
+            expire = datetime.utcnow() + timedelta(seconds=settings.refresh_token_ttl)
         to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "refresh_token"})
         encoded_refresh_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
         return encoded_refresh_token
 
-    def decode_refresh_token(self, refresh_token: str):
+    def decode_refresh_claims(self, refresh_token: str) -> dict:
+        """
+        The decode_refresh_claims function returns the verified claims of a refresh token.
+        Tokens of a Redis session family carry fam and jti claims, tokens without them
+        are checked against the refresh_token column of the user.
 
+        :param refresh_token: str: The encoded JWT
+        :return: The claims of the token
+        """
         try:
             payload = jwt.decode(refresh_token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
             if payload['scope'] == 'refresh_token':
-                email = payload['sub']
-                return email
+                return payload
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid scope for token')
         except JWTError:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
 
-    def get_current_user(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    def decode_refresh_token(self, refresh_token: str):
 
-        credentials_exception = HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        return self.decode_refresh_claims(refresh_token)['sub']
 
+    async def issue_refresh_token(self, email: str) -> Optional[str]:
+        """
+        The issue_refresh_token function starts a new session family in the refresh token store.
+
+        :param email: str: The email of the user
+        :return: The first refresh token of the family, or None if the caller has to fall back
+            to the refresh_token column (store disabled or Redis unreachable)
+        """
+        if settings.refresh_token_store != "redis":
+            return None
+        claims = await refresh_tokens.aissue(email)
+        if claims is None:
+            return None
+        return self.create_refresh_token(data={"sub": email, **claims})
+
+    async def rotate_refresh_token(self, claims: dict) -> str:
+        """
+        The rotate_refresh_token function exchanges a refresh token of a session family for the next one,
+        without touching the database. A reused token revokes its family.
+
+        :param claims: dict: The verified claims of the presented token, with fam and jti
+        :return: The next refresh token of the family
+        """
+        email = claims["sub"]
         try:
-            # Decode JWT
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
-            if payload['scope'] == 'access_token':
-                email = payload["sub"]
-                if email is None:
-                    raise credentials_exception
-            else:
-                raise credentials_exception
-        except JWTError as e:
-            raise credentials_exception
+            next_claims = await refresh_tokens.arotate(email, claims["fam"], claims["jti"])
+        except RefreshStoreUnavailable:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Refresh tokens are temporarily unavailable, retry later",
+                                headers={"Retry-After": "1"})
+        if next_claims is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+        return self.create_refresh_token(data={"sub": email, **next_claims})
 
-        user = repository_users.get_user_by_email(email, db)
-        if user is None:
-            raise credentials_exception
-        return user
+    async def revoke_refresh_tokens(self, email: str) -> None:
+        """
+        The revoke_refresh_tokens function ends every session family of a user, e.g. before a password change.
+
+        :param email: str: The email of the user
+        :return: None
+        """
+        try:
+            await refresh_tokens.arevoke_all(email)
+        except RefreshStoreUnavailable:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Sessions cannot be revoked right now, retry later",
+                                headers={"Retry-After": "1"})
 
     def create_email_token(self, data: dict):
 
@@ -107,11 +230,43 @@ class Auth:
             email = payload["sub"]
             return email
         except JWTError as e:
-            print(e)
+            logger.info("invalid email verification token: %s", e)
             raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                                 detail="Invalid token for email verification")
 
-    def get_current_user(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    @staticmethod
+    def is_revoked(payload: dict, user: User) -> bool:
+        """
+        The is_revoked function tells whether an access token was issued before the tokens of its user
+        were revoked, i.e. before the last password change. It runs on every request, so a cached token
+        stops working as soon as the user (or its cached snapshot) carries the new tokens_revoked_at.
+
+        :param payload: dict: The claims of the access token
+        :param user: User: The user the token was issued for
+        :return: True if the token must be rejected
+        """
+        if user.tokens_revoked_at is None:
+            return False
+        return payload.get("iat", 0) < calendar.timegm(user.tokens_revoked_at.utctimetuple())
+
+    def decode_access_token(self, token: str) -> dict:
+        """
+        The decode_access_token function returns the verified claims of a token.
+        The signature of a token is verified once, its claims are then served from token_cache
+        until the token expires. Revocation depends on the user, see is_revoked.
+
+        :param token: str: The encoded JWT
+        :return: The claims of the token, to be treated as read-only
+        """
+        payload = self.token_cache.get(token)
+        if payload is None:
+            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            self.token_cache.put(token, payload)
+        return payload
+
+    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+        # async, so cache hits are answered on the event loop over the shared async Redis client,
+        # only a miss hands the sync database lookup to the threadpool
 
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -121,7 +276,7 @@ class Auth:
 
         try:
             # Decode JWT
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            payload = self.decode_access_token(token)
             if payload['scope'] == 'access_token':
                 email = payload["sub"]
                 if email is None:
@@ -130,15 +285,44 @@ class Auth:
                 raise credentials_exception
         except JWTError as e:
             raise credentials_exception
-        user = self.r.get(f"user:{email}")
+        user = await user_cache.aget(email)
         if user is None:
-            user = repository_users.get_user_by_email(email, db)
+            user = await run_in_threadpool(repository_users.get_user_by_email, email, db)
             if user is None:
                 raise credentials_exception
-            self.r.set(f"user:{email}", pickle.dumps(user))
-            self.r.expire(f"user:{email}", 900)
-        else:
-            user = pickle.loads(user)
+            await user_cache.aset(user)
+        if self.is_revoked(payload, user):
+            raise credentials_exception
+        return user
+
+    async def get_current_user_async(self, token: str = Depends(oauth2_scheme),
+                                     db: AsyncSession = Depends(get_async_db)):
+
+        credentials_exception = HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+        try:
+            # Decode JWT
+            payload = self.decode_access_token(token)
+            if payload['scope'] == 'access_token':
+                email = payload["sub"]
+                if email is None:
+                    raise credentials_exception
+            else:
+                raise credentials_exception
+        except JWTError as e:
+            raise credentials_exception
+        user = await user_cache.aget(email)
+        if user is None:
+            user = await repository_users_async.get_user_by_email(email, db)
+            if user is None:
+                raise credentials_exception
+            await user_cache.aset(user)
+        if self.is_revoked(payload, user):
+            raise credentials_exception
         return user
 
 
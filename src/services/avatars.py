@@ -0,0 +1,41 @@
+from functools import lru_cache
+
+from src.conf.config import settings
+
+# the Cloudinary SDK is imported on the first avatar upload, workers that never upload avatars do not pay for it
+
+
+@lru_cache(maxsize=None)
+def configure_cloudinary() -> None:
+    """
+    The configure_cloudinary function sets the Cloudinary credentials once, on the first avatar upload,
+    instead of on every request or at import.
+
+    :return: None
+    """
+    import cloudinary
+
+    cloudinary.config(
+        cloud_name=settings.cloudinary_name,
+        api_key=settings.cloudinary_api_key,
+        api_secret=settings.cloudinary_api_secret,
+        secure=True
+    )
+
+
+def upload_avatar(file, username: str) -> str:
+    """
+    The upload_avatar function uploads an avatar to Cloudinary, replacing the previous one of the user.
+    It is a blocking HTTP call, async code runs it in the threadpool.
+
+    :param file: The uploaded file object
+    :param username: str: The username the avatar is stored under
+    :return: The url of the avatar cropped to 250x250
+    """
+    import cloudinary
+    import cloudinary.uploader
+
+    configure_cloudinary()
+    r = cloudinary.uploader.upload(file, public_id=f'ContactApp/{username}', overwrite=True)
+    return cloudinary.CloudinaryImage(f'ContactApp/{username}')\
+        .build_url(width=250, height=250, crop='fill', version=r.get('version'))
@@ -0,0 +1,222 @@
+import hashlib
+import threading
+import time
+from datetime import date
+from typing import Callable, Dict, Optional
+
+import redis
+import redis.asyncio as aioredis
+from fastapi import Depends, HTTPException, Request, Response, status
+
+from src.conf.config import settings
+from src.database.models import User
+from src.services.redis_client import async_redis, sync_redis
+
+
+def initial_version() -> int:
+    # a counter that is missing (new user, expired key, restarted worker) starts from the clock,
+    # so it never comes back to a version a client may still hold an ETag of
+    return time.time_ns() // 1000
+
+
+class ContactVersions:
+    """
+    Per-user version counters of the contact collection, kept in process.
+
+    The contact write functions of the repositories bump the counter of the user after they commit,
+    the ETags of the contact reads are derived from it (see conditional_get). The in-process counters
+    only see the writes of their own worker, use them with a single worker (e.g. tests), several workers
+    need the Redis counters.
+    """
+
+    kind = "memory"
+
+    def __init__(self):
+        self._versions: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        self.bumps = 0
+        self.not_modified = 0
+        self.errors = 0
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    async def aget(self, user_id: int) -> Optional[int]:
+        """
+        The aget function returns the version of the contacts of a user.
+
+        :param user_id: int: The id of the user
+        :return: The version, or None if it is unknown (Redis unreachable)
+        """
+        with self._lock:
+            return self._versions.setdefault(user_id, initial_version())
+
+    def bump(self, user_id: int) -> None:
+        """
+        The bump function records a change of the contacts of a user, call it after the commit.
+
+        :param user_id: int: The id of the user
+        :return: None
+        """
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, initial_version()) + 1
+            self.bumps += 1
+
+    async def abump(self, user_id: int) -> None:
+        """
+        The abump function is the async counterpart of bump.
+
+        :param user_id: int: The id of the user
+        :return: None
+        """
+        self.bump(user_id)
+
+    def record_not_modified(self) -> None:
+        self._count("not_modified")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._versions.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"kind": self.kind, "bumps": self.bumps, "not_modified": self.not_modified, "errors": self.errors}
+
+
+class RedisContactVersions(ContactVersions):
+    """
+    Contact version counters in Redis, shared by the workers: a read is one GET, a bump one
+    SET NX + INCR + EXPIRE pipeline. The sync repository bumps over client, the async one and
+    the ETag checks use aclient. While Redis is unreachable the reads go without ETags.
+    A bump lost to a Redis error leaves the old version in place until the next write or ttl,
+    so keep ttl in line with how stale a polling client may get in that case.
+    """
+
+    kind = "redis"
+
+    def __init__(self, client: redis.Redis, aclient: aioredis.Redis, ttl: int, version: int = 1):
+        super().__init__()
+        self.client = client
+        self.aclient = aclient
+        self.ttl = ttl
+        self.version = version
+
+    def key(self, user_id: int) -> str:
+        return f"contacts:v{self.version}:version:{user_id}"
+
+    async def aget(self, user_id: int) -> Optional[int]:
+        key = self.key(user_id)
+        try:
+            version = await self.aclient.get(key)
+            if version is None:
+                await self.aclient.set(key, initial_version(), nx=True, ex=self.ttl)
+                version = await self.aclient.get(key)
+        except redis.RedisError:
+            self._count("errors")
+            return None
+        return int(version) if version is not None else None
+
+    def _bump_pipeline(self, client, user_id: int):
+        pipe = client.pipeline(transaction=True)
+        pipe.set(self.key(user_id), initial_version(), nx=True)
+        pipe.incr(self.key(user_id))
+        pipe.expire(self.key(user_id), self.ttl)
+        return pipe
+
+    def bump(self, user_id: int) -> None:
+        try:
+            self._bump_pipeline(self.client, user_id).execute()
+        except redis.RedisError:
+            self._count("errors")
+            return
+        self._count("bumps")
+
+    async def abump(self, user_id: int) -> None:
+        try:
+            await self._bump_pipeline(self.aclient, user_id).execute()
+        except redis.RedisError:
+            self._count("errors")
+            return
+        self._count("bumps")
+
+    def clear(self) -> None:
+        pass
+
+
+def build_contact_versions(kind: str) -> ContactVersions:
+    """
+    The build_contact_versions function builds the version counters selected by the contact_versions setting.
+
+    :param kind: str: memory or redis
+    :return: The version counters
+    """
+    if kind == "memory":
+        return ContactVersions()
+    return RedisContactVersions(sync_redis, async_redis, ttl=settings.contact_version_ttl)
+
+
+contact_versions = build_contact_versions(settings.contact_versions)
+
+
+def make_etag(user_id: int, version: int, request: Request, daily: bool = False) -> str:
+    """
+    The make_etag function derives the strong ETag of a contact read from the version of the user's contacts
+    and the request: the path and the sorted query parameters, and today's date for daily responses.
+
+    :param user_id: int: The id of the user
+    :param version: int: The version of the user's contacts
+    :param request: Request: The request
+    :param daily: bool: The response also changes with the date, e.g. upcoming birthdays
+    :return: The quoted ETag
+    """
+    variant = [str(user_id), request.url.path, *(f"{name}={value}" for name, value
+                                                 in sorted(request.query_params.multi_items()))]
+    if daily:
+        variant.append(date.today().isoformat())
+    digest = hashlib.blake2b("\n".join(variant).encode(), digest_size=8).hexdigest()
+    return f'"{version:x}-{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    The etag_matches function compares an If-None-Match header with the current ETag, weakly as RFC 9110 asks.
+    "*" matches any current representation.
+
+    :param if_none_match: Optional[str]: The header
+    :param etag: str: The current ETag
+    :return: True if the client already has the current representation
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = {tag.strip() for tag in if_none_match.split(",")}
+    return etag in tags or f"W/{etag}" in tags
+
+
+def conditional_get(current_user: Callable, daily: bool = False) -> Callable:
+    """
+    The conditional_get function returns a route dependency for conditional contact reads.
+    It runs before the database session of the route is used: the response gets the ETag and Cache-Control
+    headers, and a request whose If-None-Match holds the current ETag is answered 304 right away.
+
+    :param current_user: Callable: The current user dependency
+    :param daily: bool: The response also changes with the date
+    :return: The dependency
+    """
+    async def check_etag(request: Request, response: Response, user: User = Depends(current_user)):
+        version = await contact_versions.aget(user.id)
+        if version is None:
+            return
+        etag = make_etag(user.id, version, request, daily)
+        headers = {"ETag": etag, "Cache-Control": settings.contact_cache_control}
+        if etag_matches(request.headers.get("If-None-Match"), etag):
+            contact_versions.record_not_modified()
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        response.headers.update(headers)
+
+    return check_etag
@@ -0,0 +1,122 @@
+import codecs
+import csv
+import io
+import json
+from datetime import date
+from typing import BinaryIO, Iterator, List, Optional, Sequence, Tuple
+
+CONTACT_FIELDS = ("first_name", "last_name", "email", "phone", "birthday", "additional_info")
+EXPORT_FIELDS = ("id",) + CONTACT_FIELDS
+
+FORMATS = {
+    "csv": ("text/csv", ".csv"),
+    "ndjson": ("application/x-ndjson", ".ndjson"),
+}
+
+
+def media_type(fmt: str) -> str:
+    """
+    The media_type function returns the content type of a supported format.
+
+    :param fmt: str: csv or ndjson
+    :return: The media type
+    """
+    return FORMATS[fmt][0]
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str], fmt: Optional[str] = None) -> Optional[str]:
+    """
+    The detect_format function picks the upload format from the explicit format parameter,
+    the content type or the file extension, in that order.
+
+    :param filename: Optional[str]: The uploaded file name
+    :param content_type: Optional[str]: The uploaded file content type
+    :param fmt: Optional[str]: The format requested by the client
+    :return: csv, ndjson or None if the format is not supported
+    """
+    if fmt:
+        return fmt if fmt in FORMATS else None
+    for name, (media_type, extension) in FORMATS.items():
+        if content_type == media_type or (filename or "").lower().endswith(extension):
+            return name
+    if (filename or "").lower().endswith(".jsonl"):
+        return "ndjson"
+    return None
+
+
+def read_records(file: BinaryIO, fmt: str) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """
+    The read_records function streams the rows of an uploaded CSV (with a header line) or NDJSON file.
+    The file is decoded and parsed incrementally, one line at a time, while the rows read before are
+    already being imported, so a row that can not be decoded or parsed becomes a row error:
+    an NDJSON line is skipped, a CSV file can not be resynchronized and ends with that row.
+
+    :param file: BinaryIO: The uploaded file
+    :param fmt: str: csv or ndjson
+    :return: An iterator of (row number, record, error) tuples, record is None when the row can not be parsed
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(codecs.iterdecode(file, "utf-8-sig"))
+        row = 1
+        while True:
+            try:
+                record = next(reader)
+            except StopIteration:
+                return
+            except UnicodeDecodeError as e:
+                yield row, None, f"Invalid UTF-8: {e.reason}, the rest of the file was not read"
+                return
+            except csv.Error as e:
+                yield row, None, f"Invalid CSV: {e}, the rest of the file was not read"
+                return
+            yield row, {field: record.get(field) or None for field in CONTACT_FIELDS}, None
+            row += 1
+    for row, data in enumerate(file, start=1):
+        try:
+            line = data.decode("utf-8-sig" if row == 1 else "utf-8")
+        except UnicodeDecodeError as e:
+            yield row, None, f"Invalid UTF-8: {e.reason}"
+            continue
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield row, None, f"Invalid JSON: {e.msg}"
+            continue
+        if not isinstance(record, dict):
+            yield row, None, "Expected a JSON object"
+            continue
+        yield row, record, None
+
+
+def csv_header() -> str:
+    """
+    The csv_header function returns the header line of exported CSV files.
+
+    :return: The CSV header line
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(EXPORT_FIELDS)
+    return buffer.getvalue()
+
+
+def format_rows(rows: List[Sequence], fmt: str) -> str:
+    """
+    The format_rows function serializes a batch of exported result rows, ordered as EXPORT_FIELDS,
+    straight from the result tuples without building ORM or Pydantic objects.
+
+    :param rows: List[Sequence]: The result rows
+    :param fmt: str: csv or ndjson
+    :return: The serialized lines of the batch
+    """
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerows(
+            [value.isoformat() if isinstance(value, date) else value for value in row] for row in rows
+        )
+        return buffer.getvalue()
+    return "".join(
+        json.dumps(dict(zip(EXPORT_FIELDS, row)), default=date.isoformat, ensure_ascii=False) + "\n" for row in rows
+    )
@@ -1,29 +1,44 @@
+from functools import lru_cache
 from pathlib import Path
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
 from pydantic import EmailStr
 from dotenv import load_dotenv
 from src.services.auth import auth_service
 import os
 
-load_dotenv()
-conf = ConnectionConfig(
-    MAIL_USERNAME=os.getenv("MAIL_USERNAME"),
-    MAIL_PASSWORD=os.getenv("MAIL_PASSWORD"),
-    MAIL_FROM=EmailStr(os.getenv("MAIL_FROM")),
-    MAIL_PORT=int(os.getenv("MAIL_PORT")),
-    MAIL_SERVER=os.getenv("MAIL_SERVER"),
-    MAIL_FROM_NAME=os.getenv("MAIL_FROM_NAME"),
-    MAIL_STARTTLS=os.getenv("MAIL_STARTTLS").lower() == "true",
-    MAIL_SSL_TLS=os.getenv("MAIL_SSL_TLS").lower() == "true",
-    USE_CREDENTIALS=os.getenv("USE_CREDENTIALS").lower() == "true",
-    VALIDATE_CERTS=os.getenv("VALIDATE_CERTS").lower() == "true",
-    TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
-)
+# fastapi_mail (and the Jinja2 environment of its templates) is imported on the first email,
+# workers that never send mail do not pay for it at startup
+
+
+@lru_cache(maxsize=None)
+def get_mail_config():
+    """
+    The get_mail_config function builds the mail connection settings from the environment on first use,
+    so importing the app does not require the mail settings.
+
+    :return: The fastapi_mail ConnectionConfig
+    """
+    from fastapi_mail import ConnectionConfig
+
+    load_dotenv()
+    return ConnectionConfig(
+        MAIL_USERNAME=os.getenv("MAIL_USERNAME"),
+        MAIL_PASSWORD=os.getenv("MAIL_PASSWORD"),
+        MAIL_FROM=EmailStr(os.getenv("MAIL_FROM")),
+        MAIL_PORT=int(os.getenv("MAIL_PORT")),
+        MAIL_SERVER=os.getenv("MAIL_SERVER"),
+        MAIL_FROM_NAME=os.getenv("MAIL_FROM_NAME"),
+        MAIL_STARTTLS=os.getenv("MAIL_STARTTLS").lower() == "true",
+        MAIL_SSL_TLS=os.getenv("MAIL_SSL_TLS").lower() == "true",
+        USE_CREDENTIALS=os.getenv("USE_CREDENTIALS").lower() == "true",
+        VALIDATE_CERTS=os.getenv("VALIDATE_CERTS").lower() == "true",
+        TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
+    )
 
 
 def send_email(email: EmailStr, username: str, host: str):
+    from fastapi_mail import FastMail, MessageSchema, MessageType
+    from fastapi_mail.errors import ConnectionErrors
 
     try:
         token_verification = auth_service.create_email_token({"sub": email})
@@ -34,13 +49,16 @@ def send_email(email: EmailStr, username: str, host: str):
             subtype=MessageType.html
         )
 
-        fm = FastMail(conf)
+        fm = FastMail(get_mail_config())
         fm.send_message(message, template_name="email_template.html")
     except ConnectionErrors as err:
         print(err)
 
 
 def send_password_reset_email(email: EmailStr, username: str, host: str):
+    from fastapi_mail import FastMail, MessageSchema, MessageType
+    from fastapi_mail.errors import ConnectionErrors
+
     token_verification = auth_service.create_email_token({"sub": email})
 
     try:
@@ -51,8 +69,7 @@ def send_password_reset_email(email: EmailStr, username: str, host: str):
             subtype=MessageType.html
         )
 
-        fm = FastMail(conf)
+        fm = FastMail(get_mail_config())
         fm.send_message(message, template_name="password_reset_template.html")
     except ConnectionErrors as err:
         print(err)
-
@@ -0,0 +1,144 @@
+import asyncio
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional
+
+from passlib.context import CryptContext
+from passlib.hash import argon2
+
+from src.conf.config import settings
+
+
+def build_pwd_context() -> CryptContext:
+    """
+    The build_pwd_context function builds the password context from the settings.
+    New passwords are hashed with the first of password_schemes and its configured cost,
+    the other schemes are only kept to verify existing hashes. needs_update reports hashes
+    of another scheme or with other cost parameters, so they can be upgraded on login.
+
+    :return: The password context
+    """
+    schemes = [scheme.strip() for scheme in settings.password_schemes.split(",") if scheme.strip()]
+    options = {}
+    if "bcrypt" in schemes:
+        options["bcrypt__rounds"] = settings.bcrypt_rounds
+    if "argon2" in schemes:
+        if not argon2.has_backend():
+            raise RuntimeError("password_schemes includes argon2, install argon2-cffi (the argon2 extra)")
+        options.update(
+            argon2__time_cost=settings.argon2_time_cost,
+            argon2__memory_cost=settings.argon2_memory_cost,
+            argon2__parallelism=settings.argon2_parallelism,
+        )
+    return CryptContext(schemes=schemes, deprecated="auto", **options)
+
+
+pwd_context = build_pwd_context()
+
+
+def hash_password(password: str) -> str:
+    """
+    The hash_password function hashes a password with pwd_context.
+    It is a module level function so it can run in a process pool.
+
+    :param password: str: The plain password
+    :return: The password hash
+    """
+    return pwd_context.hash(password)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """
+    The verify_password function checks a password against its hash with pwd_context.
+
+    :param plain_password: str: The password to check
+    :param hashed_password: str: The stored hash
+    :return: True if the password matches
+    """
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def needs_update(hashed_password: str) -> bool:
+    """
+    The needs_update function tells whether a verified hash should be replaced by a hash
+    with the current scheme and cost.
+
+    :param hashed_password: str: The stored hash
+    :return: True if the password should be rehashed
+    """
+    return pwd_context.needs_update(hashed_password)
+
+
+class PasswordPoolBusy(Exception):
+    """Raised when the password pool already has max_pending operations queued."""
+
+
+class PasswordPool:
+    """
+    Dedicated executor for password hashing and verification, so bcrypt does not occupy
+    the threadpool that serves sync routes and database calls.
+
+    kind is thread or process. bcrypt releases the GIL while hashing, so threads run
+    hashes in parallel; the process pool is for hash schemes that do not. At most
+    workers operations run at once and at most max_pending more wait for a worker,
+    further operations are rejected with PasswordPoolBusy instead of queueing without bound.
+    The executor is created on first use.
+    """
+
+    def __init__(self, kind: str, workers: int, max_pending: int):
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[Executor] = None
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.kind == "process":
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password")
+            return self._executor
+
+    async def run(self, fn: Callable, *args):
+        """
+        The run function runs fn(*args) on the pool and waits for the result without blocking the event loop.
+
+        :param fn: Callable: A module level function, e.g. hash_password or verify_password
+        :param args: The arguments of fn
+        :return: The result of fn
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PasswordPoolBusy()
+        with self._lock:
+            self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"kind": self.kind, "workers": self.workers, "max_pending": self.max_pending,
+                    "in_flight": self.in_flight, "rejected": self.rejected}
+
+
+password_pool = PasswordPool(
+    kind=settings.password_pool,
+    workers=settings.password_workers,
+    max_pending=settings.password_max_pending,
+)
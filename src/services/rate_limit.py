@@ -0,0 +1,490 @@
+import abc
+import asyncio
+import math
+import threading
+import time
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+import redis
+import redis.asyncio as aioredis
+from fastapi import Depends, HTTPException, Request, Response, status
+
+from src.conf.config import settings
+from src.database.models import User
+from src.services.redis_client import async_redis
+
+
+class RateLimit(NamedTuple):
+    times: int
+    seconds: float
+
+
+class Decision(NamedTuple):
+    allowed: bool
+    # requests left, seconds until the limit has fully recovered, seconds until the next request is allowed
+    remaining: float
+    reset: float
+    retry_after: float
+
+
+def parse_rate_limit(value: str) -> RateLimit:
+    """
+    The parse_rate_limit function reads a limit written as times/seconds, e.g. 2/5 for 2 requests in 5 seconds.
+
+    :param value: str: The limit
+    :return: The parsed limit
+    """
+    times, _, seconds = value.partition("/")
+    return RateLimit(int(times), float(seconds or 1))
+
+
+def client_identifier(request: Request, trusted_proxies: Optional[int] = None) -> str:
+    """
+    The client_identifier function identifies the client of a request by its address.
+    The client can put anything in X-Forwarded-For, only the addresses appended by the trusted_proxies proxies
+    in front of the app are used: the trusted_proxies-th entry from the right is the peer of the outermost one.
+    Without trusted proxies, or with fewer entries than proxies, it is the peer address.
+
+    :param request: Request: The request
+    :param trusted_proxies: Optional[int]: The number of proxies in front of the app, the trusted_proxies setting
+        by default
+    :return: The client identifier
+    """
+    if trusted_proxies is None:
+        trusted_proxies = settings.trusted_proxies
+    forwarded = request.headers.get("X-Forwarded-For")
+    if trusted_proxies > 0 and forwarded:
+        hops = [hop.strip() for hop in forwarded.split(",")]
+        if len(hops) >= trusted_proxies and hops[-trusted_proxies]:
+            return hops[-trusted_proxies]
+    return request.client.host if request.client else "unknown"
+
+
+def sliding_window(limit: RateLimit, previous: int, current: int, now: float) -> Decision:
+    """
+    The sliding_window function decides a request from the counters of the current and the previous
+    fixed window. The previous window is weighted by the part of it still covered by a window of
+    limit.seconds ending now, which approximates a true sliding window with two counters.
+
+    :param limit: RateLimit: The limit
+    :param previous: int: The requests allowed in the previous window
+    :param current: int: The requests allowed so far in the current window
+    :param now: float: The current time.time()
+    :return: The decision, the caller counts the request if it is allowed
+    """
+    elapsed = now % limit.seconds
+    estimate = previous * (1 - elapsed / limit.seconds) + current
+    reset = (2 * limit.seconds if current else limit.seconds) - elapsed
+    if estimate + 1 <= limit.times:
+        return Decision(True, limit.times - estimate - 1, reset, 0.0)
+    if current + 1 > limit.times:
+        # wait for the next window, then for the current count to decay enough
+        retry_after = limit.seconds - elapsed + limit.seconds * max(0.0, 1 - (limit.times - 1) / current)
+    else:
+        retry_after = limit.seconds * (1 - (limit.times - 1 - current) / previous) - elapsed
+    return Decision(False, 0.0, reset, max(0.0, retry_after))
+
+
+class RateLimiter(abc.ABC):
+    """
+    Base of the rate limiters: limits by name and the FastAPI side of a check.
+
+    limits maps policy names (search, reads, writes, login) and, to override a single route,
+    route names to their RateLimit. A route is checked against its own entry if there is one,
+    else against the entry of its policy, and is not limited without either. Requests are
+    counted per identifier and name, see limit_by_user and limit_by_client.
+    Responses carry X-RateLimit-Limit, X-RateLimit-Remaining and X-RateLimit-Reset headers,
+    rejected requests get 429 with Retry-After.
+    """
+
+    def __init__(self, limits: Dict[str, RateLimit]):
+        self.limits = limits
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        self.allowed = 0
+        self.rejected = 0
+        self.errors = 0
+
+    def _count(self, decision: Decision) -> Decision:
+        with self._lock:
+            if decision.allowed:
+                self.allowed += 1
+            else:
+                self.rejected += 1
+        return decision
+
+    @abc.abstractmethod
+    async def acquire(self, identifier: str, name: str, limit: RateLimit) -> Decision:
+        """
+        The acquire function decides a request of identifier against limit and counts it if it is allowed.
+
+        :param identifier: str: The user or client the request is counted for
+        :param name: str: The route or policy name the limit belongs to
+        :param limit: RateLimit: The limit
+        :return: The decision
+        """
+
+    def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+    def headers(self, limit: RateLimit, decision: Decision) -> Dict[str, str]:
+        return {
+            "X-RateLimit-Limit": str(limit.times),
+            "X-RateLimit-Remaining": str(max(0, int(decision.remaining))),
+            "X-RateLimit-Reset": str(math.ceil(decision.reset)),
+        }
+
+    async def check(self, request: Request, response: Response, policy: str, identifier: str) -> None:
+        """
+        The check function counts a request against the limit of its route or policy.
+
+        :param request: Request: The request
+        :param response: Response: The response the limit headers are added to
+        :param policy: str: The policy of the route
+        :param identifier: str: The user or client the request is counted for
+        :return: None, raises 429 if the limit is exceeded
+        """
+        route = request.scope.get("route")
+        name = route.name if route is not None and route.name in self.limits else policy
+        limit = self.limits.get(name)
+        if limit is None:
+            return
+        decision = await self.acquire(identifier, name, limit)
+        headers = self.headers(limit, decision)
+        if not decision.allowed:
+            headers["Retry-After"] = str(math.ceil(decision.retry_after))
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too Many Requests",
+                                headers=headers)
+        response.headers.update(headers)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"kind": self.kind, "allowed": self.allowed, "rejected": self.rejected, "errors": self.errors}
+
+
+class MemoryRateLimiter(RateLimiter):
+    """
+    Sliding window rate limiter counting in process, without Redis.
+
+    Limits are per process, so it is meant for tests and single worker deployments.
+    Counters of windows that ended are swept once more than max_keys are held.
+    """
+
+    kind = "memory"
+
+    def __init__(self, limits: Dict[str, RateLimit], max_keys: int = 100000):
+        super().__init__(limits)
+        self.max_keys = max_keys
+        # window, requests in the previous window, requests in the current window
+        self._counters: Dict[Tuple[str, str], list] = {}
+
+    def hit(self, identifier: str, name: str, limit: RateLimit, now: Optional[float] = None) -> Decision:
+        now = time.time() if now is None else now
+        window = int(now // limit.seconds)
+        with self._lock:
+            counter = self._counters.get((identifier, name))
+            if counter is None:
+                if len(self._counters) >= self.max_keys:
+                    self._sweep(now)
+                counter = self._counters[(identifier, name)] = [window, 0, 0]
+            if counter[0] != window:
+                counter[1] = counter[2] if counter[0] == window - 1 else 0
+                counter[0], counter[2] = window, 0
+            decision = sliding_window(limit, counter[1], counter[2], now)
+            if decision.allowed:
+                counter[2] += 1
+        return self._count(decision)
+
+    def _sweep(self, now: float) -> None:
+        for (identifier, name), counter in list(self._counters.items()):
+            limit = self.limits.get(name)
+            if limit is None or counter[0] < int(now // limit.seconds) - 1:
+                del self._counters[(identifier, name)]
+
+    async def acquire(self, identifier: str, name: str, limit: RateLimit) -> Decision:
+        return self.hit(identifier, name, limit)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._counters.clear()
+
+
+# KEYS[1] counter of the current window, KEYS[2] counter of the previous window
+# ARGV[1] weight of the previous window, ARGV[2] limit, ARGV[3] ttl of the current counter
+# the request is only counted if it is allowed, the counters are returned as they were before it
+SLIDING_WINDOW_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+if previous * tonumber(ARGV[1]) + current + 1 > tonumber(ARGV[2]) then
+    return {0, previous, current}
+end
+redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return {1, previous, current}
+"""
+
+
+class RedisRateLimiter(RateLimiter):
+    """
+    Sliding window rate limiter counting in Redis, exact across workers.
+
+    A check is one Lua script call reading the counters of the current and the previous window
+    and incrementing the current one if the request is allowed. When Redis is unreachable
+    requests are allowed and counted as errors, an outage of the limiter does not stop the API.
+    """
+
+    kind = "redis"
+
+    def __init__(self, limits: Dict[str, RateLimit], client: aioredis.Redis, prefix: str = "ratelimit"):
+        super().__init__(limits)
+        self.client = client
+        self.prefix = prefix
+        # registered on first use, building the script digest needs the client
+        self._script = None
+
+    def key(self, identifier: str, name: str, window: int) -> str:
+        return f"{self.prefix}:{name}:{identifier}:{window}"
+
+    async def acquire(self, identifier: str, name: str, limit: RateLimit, now: Optional[float] = None) -> Decision:
+        now = time.time() if now is None else now
+        window = int(now // limit.seconds)
+        weight = 1 - (now % limit.seconds) / limit.seconds
+        try:
+            if self._script is None:
+                self._script = self.client.register_script(SLIDING_WINDOW_SCRIPT)
+            allowed, previous, current = await self._script(
+                keys=[self.key(identifier, name, window), self.key(identifier, name, window - 1)],
+                args=[weight, limit.times, 2 * math.ceil(limit.seconds)],
+                client=self.client,
+            )
+        except redis.RedisError:
+            with self._lock:
+                self.errors += 1
+            return Decision(True, limit.times, 0.0, 0.0)
+        decision = sliding_window(limit, int(previous), int(current), now)
+        # the script decided on the same counters, it is authoritative if a float comparison differs
+        if decision.allowed != bool(allowed):
+            decision = Decision(bool(allowed), 0.0, decision.reset, 0.0 if allowed else 1.0)
+        return self._count(decision)
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated", "pending", "window", "synced")
+
+    def __init__(self, capacity: int, now: float):
+        self.tokens = float(capacity)
+        self.updated = now
+        # requests taken since the last sync, and the Redis window they are counted in
+        self.pending = 0
+        self.window = 0
+        self.synced = True
+
+
+class LocalRateLimiter(RateLimiter):
+    """
+    Rate limiter keeping an approximate token bucket per identifier and name in process.
+
+    A request only takes a token from its local bucket, there is no Redis call on the request path.
+    Every sync_interval seconds the background sync adds the requests taken since the previous sync
+    to the counter of the current window in Redis, reads the counter of the previous window
+    (INCRBY + EXPIRE + GET for all active buckets in one pipeline) and lowers each local bucket
+    to what the sliding window estimate of all workers leaves of the limit. Between two syncs
+    a client can exceed the limit by what the other workers accept, that is the price of the
+    saved round trips. Without a Redis client the limit is per process.
+    """
+
+    kind = "local"
+
+    def __init__(self, limits: Dict[str, RateLimit], client: Optional[aioredis.Redis] = None,
+                 sync_interval: float = 0.5, prefix: str = "ratelimit"):
+        super().__init__(limits)
+        self.client = client
+        self.sync_interval = sync_interval
+        self.prefix = prefix
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def reset_stats(self) -> None:
+        super().reset_stats()
+        self.syncs = 0
+
+    def _refill(self, bucket: TokenBucket, limit: RateLimit, now: float) -> None:
+        bucket.tokens = min(limit.times, bucket.tokens + (now - bucket.updated) * limit.times / limit.seconds)
+        bucket.updated = now
+
+    def hit(self, identifier: str, name: str, limit: RateLimit, now: Optional[float] = None) -> Decision:
+        """
+        The hit function takes a token for a request.
+
+        :param identifier: str: The user or client
+        :param name: str: The policy or route name
+        :param limit: RateLimit: The limit of name
+        :param now: Optional[float]: The current time.time(), for tests
+        :return: The decision
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get((identifier, name))
+            if bucket is None:
+                bucket = self._buckets[(identifier, name)] = TokenBucket(limit.times, now)
+            self._refill(bucket, limit, now)
+            bucket.synced = False
+            per_token = limit.seconds / limit.times
+            if bucket.tokens < 1:
+                self.rejected += 1
+                return Decision(False, bucket.tokens, (limit.times - bucket.tokens) * per_token,
+                                (1 - bucket.tokens) * per_token)
+            bucket.tokens -= 1
+            window = int(now // limit.seconds)
+            if bucket.window != window:
+                # requests of the previous window that were not synced yet are dropped
+                bucket.window, bucket.pending = window, 0
+            bucket.pending += 1
+            self.allowed += 1
+            return Decision(True, bucket.tokens, (limit.times - bucket.tokens) * per_token, 0.0)
+
+    async def acquire(self, identifier: str, name: str, limit: RateLimit) -> Decision:
+        return self.hit(identifier, name, limit)
+
+    def key(self, identifier: str, name: str, window: int) -> str:
+        return f"{self.prefix}:{name}:{identifier}:{window}"
+
+    async def sync(self, now: Optional[float] = None) -> None:
+        """
+        The sync function reconciles the buckets used since the previous sync with Redis in one pipeline
+        and drops the buckets that are idle and full again.
+
+        :param now: Optional[float]: The current time.time(), for tests
+        :return: None
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            active = []
+            for (identifier, name), bucket in list(self._buckets.items()):
+                limit = self.limits.get(name)
+                if bucket.synced:
+                    if limit is None or now - bucket.updated >= limit.seconds:
+                        del self._buckets[(identifier, name)]
+                    continue
+                active.append((identifier, name, bucket, limit, bucket.window, bucket.pending))
+                bucket.synced = True
+                bucket.pending = 0
+        if not active or self.client is None:
+            return
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for identifier, name, bucket, limit, window, pending in active:
+                key = self.key(identifier, name, window)
+                pipe.incrby(key, pending)
+                # kept for the next window, which weights it as its previous window
+                pipe.expire(key, 2 * math.ceil(limit.seconds))
+                pipe.get(self.key(identifier, name, window - 1))
+            results = await pipe.execute()
+        except redis.RedisError:
+            with self._lock:
+                self.errors += 1
+            return
+        with self._lock:
+            self.syncs += 1
+            for (identifier, name, bucket, limit, window, pending), used, previous in zip(
+                    active, results[::3], results[2::3]):
+                if window == int(now // limit.seconds):
+                    weight = 1 - (now % limit.seconds) / limit.seconds
+                    estimate = int(previous or 0) * weight + int(used)
+                    bucket.tokens = min(bucket.tokens, max(0.0, limit.times - estimate))
+
+    async def _sync_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            await self.sync()
+
+    def start(self) -> None:
+        """
+        The start function starts the background sync on the running event loop.
+
+        :return: None
+        """
+        if self._task is None and self.client is not None:
+            self._task = asyncio.get_running_loop().create_task(self._sync_forever())
+
+    async def stop(self) -> None:
+        """
+        The stop function stops the background sync after a last sync.
+
+        :return: None
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+            await self.sync()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        with self._lock:
+            stats.update(buckets=len(self._buckets), syncs=self.syncs)
+        return stats
+
+
+def build_rate_limiter(kind: str, limits: Dict[str, RateLimit], client: Optional[aioredis.Redis]) -> RateLimiter:
+    """
+    The build_rate_limiter function builds the rate limiter selected by the rate_limiter setting.
+
+    :param kind: str: memory, redis or local
+    :param limits: Dict[str, RateLimit]: The limits by policy and route name
+    :param client: Optional[aioredis.Redis]: The async Redis client
+    :return: The rate limiter
+    """
+    if kind == "memory":
+        return MemoryRateLimiter(limits)
+    if kind == "local":
+        return LocalRateLimiter(limits, client, sync_interval=settings.rate_limit_sync_interval)
+    return RedisRateLimiter(limits, client)
+
+
+rate_limiter = build_rate_limiter(
+    settings.rate_limiter,
+    {name: parse_rate_limit(value) for name, value in settings.rate_limits.items()},
+    async_redis,
+)
+
+
+def limit_by_user(policy: str, current_user: Callable) -> Callable:
+    """
+    The limit_by_user function returns a route dependency counting requests per authenticated user.
+    current_user is the dependency the route already uses (auth_service.get_current_user or
+    get_current_user_async), FastAPI resolves it once per request for both.
+
+    :param policy: str: The policy of the route
+    :param current_user: Callable: The current user dependency
+    :return: The dependency
+    """
+    async def check_user_rate_limit(request: Request, response: Response, user: User = Depends(current_user)):
+        await rate_limiter.check(request, response, policy, f"user:{user.id}")
+
+    return check_user_rate_limit
+
+
+def limit_by_client(policy: str) -> Callable:
+    """
+    The limit_by_client function returns a route dependency counting requests per client address,
+    for routes without an authenticated user such as login.
+
+    :param policy: str: The policy of the route
+    :return: The dependency
+    """
+    async def check_client_rate_limit(request: Request, response: Response):
+        await rate_limiter.check(request, response, policy, f"ip:{client_identifier(request)}")
+
+    return check_client_rate_limit
@@ -0,0 +1,84 @@
+import threading
+from typing import Callable, Optional
+
+import redis
+import redis.asyncio as aioredis
+
+from src.conf.config import settings
+
+
+def get_redis_options() -> dict:
+    """
+    The get_redis_options function collects the connection settings shared by the Redis clients.
+    The short connect timeout lets requests fall back to the database quickly when Redis is down.
+
+    :return: Keyword arguments for redis.Redis / redis.asyncio.Redis
+    """
+    return {
+        "host": settings.redis_host,
+        "port": settings.redis_port,
+        "db": 0,
+        "encoding": "utf-8",
+        "decode_responses": True,
+        "socket_connect_timeout": settings.redis_connect_timeout,
+    }
+
+
+class LazyRedis:
+    """
+    Stand-in for a Redis client that builds the client on first use, so importing the app
+    (workers, test collection, Alembic) does not set up connection pools it may never use.
+    Every other attribute is forwarded to the client, so resolve and detach must not shadow Redis commands.
+    """
+
+    def __init__(self, factory: Callable):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def built(self) -> bool:
+        return self._client is not None
+
+    def resolve(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return self._client
+
+    def detach(self) -> Optional[object]:
+        with self._lock:
+            client, self._client = self._client, None
+        return client
+
+    def __getattr__(self, name: str):
+        return getattr(self.resolve(), name)
+
+
+# shared by the rate limiter and the auth service, its connection pool is bound to the server's event loop
+async_redis = LazyRedis(lambda: aioredis.Redis(
+    **get_redis_options(),
+    socket_timeout=settings.redis_timeout,
+    max_connections=settings.redis_max_connections,
+))
+
+# for code running outside the event loop: the sync repository and request threads, an unresponsive
+# server costs a request at most redis_timeout
+sync_redis = LazyRedis(lambda: redis.Redis(**get_redis_options(), socket_timeout=settings.redis_timeout))
+
+# only for the cache invalidation listener, no socket_timeout so it can block on pub/sub
+pubsub_redis = LazyRedis(lambda: redis.Redis(**get_redis_options()))
+
+
+async def close_redis() -> None:
+    """
+    The close_redis function closes the connections of the async client on shutdown, if it was used.
+    A later use builds a new client, e.g. on the event loop of the next application lifespan.
+
+    :return: None
+    """
+    client = async_redis.detach()
+    if client is not None:
+        await client.close()
+        await client.connection_pool.disconnect()
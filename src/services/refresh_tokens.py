@@ -0,0 +1,234 @@
+import secrets
+import threading
+from typing import Optional
+
+import redis
+import redis.asyncio as aioredis
+
+from src.conf.config import settings
+from src.services.redis_client import async_redis, sync_redis
+
+# bump when the key layout changes, families stored by older code then simply stop validating
+REFRESH_STORE_VERSION = 1
+
+# KEYS[1] family hash, KEYS[2] session set of the user
+# ARGV[1] presented jti, ARGV[2] new jti, ARGV[3] ttl, ARGV[4] family id
+# returns 1 when rotated, 0 when the family is unknown (expired or revoked), -1 when a rotated jti is reused
+ROTATE_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], 'jti')
+if not current then
+    return 0
+end
+if current ~= ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    redis.call('SREM', KEYS[2], ARGV[4])
+    return -1
+end
+redis.call('HSET', KEYS[1], 'jti', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+-- the session set has to outlive every family it lists, or revoking the sessions misses this one
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return 1
+"""
+
+# KEYS[1] session set of the user, ARGV[1] family key prefix
+# deletes the set and every family it lists in one step, so a login in between cannot outlive the revocation
+REVOKE_SCRIPT = """
+local families = redis.call('SMEMBERS', KEYS[1])
+for _, family in ipairs(families) do
+    redis.call('DEL', ARGV[1] .. family)
+end
+redis.call('DEL', KEYS[1])
+return #families
+"""
+
+
+class RefreshStoreUnavailable(Exception):
+    """Raised when a Redis backed refresh token cannot be checked because Redis is unreachable."""
+
+
+def new_token_id() -> str:
+    return secrets.token_urlsafe(16)
+
+
+class RefreshTokenStore:
+    """
+    Redis store of refresh token families, one family per login session.
+
+    Login starts a family: a random family id (fam claim) whose hash holds the jti of the only
+    refresh token of the family that is still valid. Refreshing rotates the jti atomically in a
+    Lua script, so a refresh is one Redis round trip and no database write. Presenting a jti that
+    has already been rotated means the token was copied: the whole family is revoked and the
+    holders of both copies have to log in again. Families expire ttl seconds after their last
+    rotation, and the session set of a user lists its families so they can all be revoked at once.
+
+    Code running on the event loop uses the a* methods over the async client aclient, sync code
+    uses the blocking methods over client. issue returns None when Redis is unreachable, the caller
+    then falls back to the refresh_token column of the user.
+    """
+
+    def __init__(self, client: redis.Redis, ttl: int, aclient: Optional[aioredis.Redis] = None,
+                 version: int = REFRESH_STORE_VERSION):
+        self.client = client
+        self.aclient = aclient
+        self.ttl = ttl
+        self.version = version
+        # registered on first use, building the script digests needs the client
+        self._rotate = None
+        self._arotate = None
+        self._revoke = None
+        self._arevoke = None
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def family_key(self, family: str) -> str:
+        return f"refresh:v{self.version}:family:{family}"
+
+    def sessions_key(self, email: str) -> str:
+        return f"refresh:v{self.version}:sessions:{email}"
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.issued = 0
+            self.rotated = 0
+            self.rejected = 0
+            self.reused = 0
+            self.errors = 0
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _issue_pipeline(self, client, email: str, family: str, jti: str):
+        pipe = client.pipeline(transaction=True)
+        pipe.hset(self.family_key(family), mapping={"email": email, "jti": jti})
+        pipe.expire(self.family_key(family), self.ttl)
+        pipe.sadd(self.sessions_key(email), family)
+        pipe.expire(self.sessions_key(email), self.ttl)
+        return pipe
+
+    def issue(self, email: str) -> Optional[dict]:
+        """
+        The issue function starts a new family for a login session.
+
+        :param email: str: The email of the user
+        :return: The fam and jti claims of the first refresh token, or None if Redis is unreachable
+        """
+        family, jti = new_token_id(), new_token_id()
+        try:
+            self._issue_pipeline(self.client, email, family, jti).execute()
+        except redis.RedisError:
+            self._count("errors")
+            return None
+        self._count("issued")
+        return {"fam": family, "jti": jti}
+
+    async def aissue(self, email: str) -> Optional[dict]:
+        """
+        The aissue function is the async counterpart of issue.
+
+        :param email: str: The email of the user
+        :return: The fam and jti claims of the first refresh token, or None if Redis is unreachable
+        """
+        family, jti = new_token_id(), new_token_id()
+        try:
+            await self._issue_pipeline(self.aclient, email, family, jti).execute()
+        except redis.RedisError:
+            self._count("errors")
+            return None
+        self._count("issued")
+        return {"fam": family, "jti": jti}
+
+    def _rotated(self, result: int, family: str, jti: str) -> Optional[dict]:
+        if result == 1:
+            self._count("rotated")
+            return {"fam": family, "jti": jti}
+        self._count("reused" if result == -1 else "rejected")
+        return None
+
+    def rotate(self, email: str, family: str, jti: str) -> Optional[dict]:
+        """
+        The rotate function replaces the valid refresh token of a family by a new one.
+
+        :param email: str: The email of the user
+        :param family: str: The fam claim of the presented token
+        :param jti: str: The jti claim of the presented token
+        :return: The claims of the next refresh token, or None if the token is expired, revoked or reused
+        """
+        new_jti = new_token_id()
+        try:
+            if self._rotate is None:
+                self._rotate = self.client.register_script(ROTATE_SCRIPT)
+            result = self._rotate(keys=[self.family_key(family), self.sessions_key(email)],
+                                  args=[jti, new_jti, self.ttl, family], client=self.client)
+        except redis.RedisError as e:
+            self._count("errors")
+            raise RefreshStoreUnavailable() from e
+        return self._rotated(int(result), family, new_jti)
+
+    async def arotate(self, email: str, family: str, jti: str) -> Optional[dict]:
+        """
+        The arotate function is the async counterpart of rotate.
+
+        :param email: str: The email of the user
+        :param family: str: The fam claim of the presented token
+        :param jti: str: The jti claim of the presented token
+        :return: The claims of the next refresh token, or None if the token is expired, revoked or reused
+        """
+        new_jti = new_token_id()
+        try:
+            if self._arotate is None:
+                self._arotate = self.aclient.register_script(ROTATE_SCRIPT)
+            result = await self._arotate(keys=[self.family_key(family), self.sessions_key(email)],
+                                         args=[jti, new_jti, self.ttl, family], client=self.aclient)
+        except redis.RedisError as e:
+            self._count("errors")
+            raise RefreshStoreUnavailable() from e
+        return self._rotated(int(result), family, new_jti)
+
+    def revoke_all(self, email: str) -> None:
+        """
+        The revoke_all function ends every session of a user, e.g. after a password change.
+        The session set and its families are deleted atomically in a Lua script.
+
+        :param email: str: The email of the user
+        :return: None
+        :raises RefreshStoreUnavailable: Redis is unreachable, the sessions may still be valid
+        """
+        try:
+            if self._revoke is None:
+                self._revoke = self.client.register_script(REVOKE_SCRIPT)
+            self._revoke(keys=[self.sessions_key(email)], args=[self.family_key("")], client=self.client)
+        except redis.RedisError as e:
+            self._count("errors")
+            raise RefreshStoreUnavailable() from e
+
+    async def arevoke_all(self, email: str) -> None:
+        """
+        The arevoke_all function is the async counterpart of revoke_all.
+
+        :param email: str: The email of the user
+        :return: None
+        :raises RefreshStoreUnavailable: Redis is unreachable, the sessions may still be valid
+        """
+        try:
+            if self._arevoke is None:
+                self._arevoke = self.aclient.register_script(REVOKE_SCRIPT)
+            await self._arevoke(keys=[self.sessions_key(email)], args=[self.family_key("")], client=self.aclient)
+        except redis.RedisError as e:
+            self._count("errors")
+            raise RefreshStoreUnavailable() from e
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "version": self.version,
+                "issued": self.issued,
+                "rotated": self.rotated,
+                "rejected": self.rejected,
+                "reused": self.reused,
+                "errors": self.errors,
+            }
+
+
+refresh_tokens = RefreshTokenStore(sync_redis, ttl=settings.refresh_token_ttl, aclient=async_redis)
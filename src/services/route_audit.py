@@ -0,0 +1,95 @@
+import logging
+import re
+import time
+from typing import Iterable, List
+
+from starlette.routing import BaseRoute, Match
+
+logger = logging.getLogger(__name__)
+
+PATH_PARAM = re.compile(r"{[^}]+}")
+
+
+def sample_path(path: str) -> str:
+    """
+    The sample_path function fills the parameters of a route path, so the path can be matched.
+
+    :param path: str: The route path, e.g. /contacts/{contact_id}
+    :return: A concrete path, e.g. /contacts/1
+    """
+    return PATH_PARAM.sub("1", path)
+
+
+def audit_routes(routes: Iterable[BaseRoute], repeat: int = 100) -> dict:
+    """
+    The audit_routes function inspects the route table of an application.
+
+    Starlette matches a request by trying the routes in order, so a route at position n costs
+    n regex matches and a path that is not found costs one per route. The report holds the number
+    of routes, the method/path pairs registered more than once (only the first is ever reached),
+    the mean and the worst number of routes tried per request, and the measured time to match
+    a request to each endpoint on average and to scan the whole table for a path that is not found.
+
+    :param routes: Iterable[BaseRoute]: The routes, e.g. app.routes
+    :param repeat: int: The number of rounds the measured times are averaged over
+    :return: The report
+    """
+    routes = list(routes)
+    first_index = {}
+    duplicates: List[dict] = []
+    scans = []
+    for index, route in enumerate(routes):
+        for method in sorted(getattr(route, "methods", None) or ()):
+            key = (method, route.path)
+            if key in first_index:
+                duplicates.append({"method": method, "path": route.path, "first": first_index[key], "index": index})
+                continue
+            first_index[key] = index
+            scans.append(index + 1)
+
+    def scan(scope: dict) -> None:
+        for route in routes:
+            if route.matches(scope)[0] == Match.FULL:
+                return
+
+    def timed(scopes: List[dict]) -> float:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for scope in scopes:
+                scan(scope)
+        return (time.perf_counter() - start) / repeat / len(scopes)
+
+    base_scope = {"type": "http", "root_path": "", "headers": [], "query_string": b""}
+    endpoint_scopes = [dict(base_scope, method=method, path=sample_path(path)) for method, path in first_index]
+    match_time = timed(endpoint_scopes) if endpoint_scopes else 0.0
+    scan_time = timed([dict(base_scope, method="GET", path="/route-audit/not-found")])
+
+    return {
+        "routes": len(routes),
+        "endpoints": len(first_index),
+        "duplicates": duplicates,
+        "mean_match_scans": round(sum(scans) / len(scans), 2) if scans else 0.0,
+        "max_match_scans": len(routes),
+        "mean_match_us": round(match_time * 1e6, 2),
+        "full_scan_us": round(scan_time * 1e6, 2),
+    }
+
+
+def check_routes(routes: Iterable[BaseRoute], max_routes: int) -> dict:
+    """
+    The check_routes function audits the route table at startup and logs the report.
+    Duplicate method/path pairs stop the startup, a table larger than max_routes is logged as a warning.
+
+    :param routes: Iterable[BaseRoute]: The routes, e.g. app.routes
+    :param max_routes: int: The route table budget
+    :return: The report
+    """
+    report = audit_routes(routes, repeat=10)
+    logger.info("route table: %(routes)d routes, %(mean_match_scans).1f routes tried per request on average, "
+                "full scan %(full_scan_us).1f us", report)
+    if report["duplicates"]:
+        pairs = ", ".join(f"{duplicate['method']} {duplicate['path']}" for duplicate in report["duplicates"])
+        raise RuntimeError(f"Duplicate routes registered: {pairs}")
+    if report["routes"] > max_routes:
+        logger.warning("route table has %d routes, over the budget of %d", report["routes"], max_routes)
+    return report
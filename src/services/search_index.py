@@ -0,0 +1,223 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set
+
+from src.conf.config import settings
+
+SEARCH_FIELDS = ("first_name", "last_name", "email", "phone")
+SNAPSHOT_FIELDS = ("id", "first_name", "last_name", "email", "phone", "birthday", "additional_info")
+
+# rough per-entry costs of the CPython objects behind an index, used for the memory budget
+GRAM_BYTES = 200
+POSTING_BYTES = 40
+DOC_BYTES = 800
+
+TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+def tokenize(value: Optional[str]) -> List[str]:
+    """
+    The tokenize function lower-cases a value and splits it into alphanumeric tokens,
+    e.g. "john.doe@example.com" becomes ["john", "doe", "example", "com"].
+
+    :param value: Optional[str]: The field value
+    :return: A list of tokens
+    """
+    return TOKEN_RE.findall(value.lower()) if value else []
+
+
+class UserIndex:
+    """Inverted index of one user's contacts: token prefix -> contact ids."""
+
+    __slots__ = ("docs", "postings", "size", "built_at")
+
+    def __init__(self):
+        self.docs: Dict[int, tuple] = {}
+        self.postings: Dict[str, Set[int]] = {}
+        self.size = 0
+        self.built_at = time.monotonic()
+
+
+class ContactSearchIndex:
+    """
+    In-process search index over the contacts of recently active users.
+
+    A user's index is built lazily from the database on their first search and then
+    kept current by the contact write functions of the repository. Every token of
+    first name, last name, email and phone is indexed by all of its prefixes (up to
+    max_prefix characters), so a query matches contacts having, for every query token,
+    a field token starting with it. Indexes are evicted least recently used first once
+    the estimated memory use exceeds memory_budget bytes, and rebuilt after ttl seconds
+    so changes made through other worker processes become visible.
+    """
+
+    def __init__(self, memory_budget: int, ttl: float, max_prefix: int = 16):
+        self.memory_budget = memory_budget
+        self.ttl = ttl
+        self.max_prefix = max_prefix
+        self.memory_used = 0
+        self._users: "OrderedDict[int, UserIndex]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def _grams(self, tokens: Iterable[str]) -> Set[str]:
+        grams = set()
+        for token in tokens:
+            for length in range(1, min(len(token), self.max_prefix) + 1):
+                grams.add(token[:length])
+        return grams
+
+    def _add(self, index: UserIndex, contact) -> int:
+        size = 0
+        snapshot = {field: getattr(contact, field) for field in SNAPSHOT_FIELDS}
+        tokens = frozenset(token for field in SEARCH_FIELDS for token in tokenize(snapshot[field]))
+        if snapshot["id"] in index.docs:
+            size += self._remove(index, snapshot["id"])
+        index.docs[snapshot["id"]] = (snapshot, tokens)
+        size += DOC_BYTES
+        for gram in self._grams(tokens):
+            posting = index.postings.get(gram)
+            if posting is None:
+                posting = index.postings[gram] = set()
+                size += GRAM_BYTES
+            posting.add(snapshot["id"])
+            size += POSTING_BYTES
+        index.size += size
+        return size
+
+    def _remove(self, index: UserIndex, contact_id: int) -> int:
+        doc = index.docs.pop(contact_id, None)
+        if doc is None:
+            return 0
+        size = DOC_BYTES
+        for gram in self._grams(doc[1]):
+            posting = index.postings.get(gram)
+            if posting is None:
+                continue
+            posting.discard(contact_id)
+            size += POSTING_BYTES
+            if not posting:
+                del index.postings[gram]
+                size += GRAM_BYTES
+        index.size -= size
+        return -size
+
+    def _evict(self) -> None:
+        while self.memory_used > self.memory_budget and len(self._users) > 1:
+            _, index = self._users.popitem(last=False)
+            self.memory_used -= index.size
+
+    def is_loaded(self, user_id: int) -> bool:
+        """
+        The is_loaded function tells whether a fresh index of the user is in memory.
+
+        :param user_id: int: The user id
+        :return: True if search can be answered from memory
+        """
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is None:
+                return False
+            if time.monotonic() - index.built_at > self.ttl:
+                self.invalidate(user_id)
+                return False
+            return True
+
+    def build(self, user_id: int, contacts: Iterable) -> None:
+        """
+        The build function (re)builds the index of a user from all of their contacts.
+
+        :param user_id: int: The user id
+        :param contacts: Iterable: The user's contacts
+        :return: None
+        """
+        index = UserIndex()
+        for contact in contacts:
+            self._add(index, contact)
+        with self._lock:
+            self.invalidate(user_id)
+            self._users[user_id] = index
+            self.memory_used += index.size
+            self._evict()
+
+    def search(self, user_id: int, query: str, limit: Optional[int] = None) -> Optional[List[dict]]:
+        """
+        The search function answers a query from the user's index.
+
+        :param user_id: int: The user id
+        :param query: str: The search string
+        :param limit: Optional[int]: The maximum number of results
+        :return: Contact snapshots ordered by id, or None if the user's index is not loaded
+        """
+        tokens = tokenize(query)
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is None:
+                return None
+            self._users.move_to_end(user_id)
+            if not tokens:
+                return []
+            candidates = None
+            for token in sorted(tokens, key=len, reverse=True):
+                posting = index.postings.get(token[:self.max_prefix], set())
+                candidates = set(posting) if candidates is None else candidates & posting
+                if not candidates:
+                    return []
+            long_tokens = [token for token in tokens if len(token) > self.max_prefix]
+            results = []
+            for contact_id in sorted(candidates):
+                snapshot, doc_tokens = index.docs[contact_id]
+                if all(any(doc_token.startswith(token) for doc_token in doc_tokens) for token in long_tokens):
+                    results.append(snapshot)
+                    if limit and len(results) >= limit:
+                        break
+            return results
+
+    def upsert(self, contact) -> None:
+        """
+        The upsert function indexes a created or updated contact if its owner's index is loaded.
+
+        :param contact: Contact: The contact after the write
+        :return: None
+        """
+        with self._lock:
+            index = self._users.get(contact.user_id)
+            if index is not None:
+                self.memory_used += self._add(index, contact)
+                self._evict()
+
+    def remove(self, user_id: int, contact_id: int) -> None:
+        """
+        The remove function drops a deleted contact from its owner's index if it is loaded.
+
+        :param user_id: int: The owner of the contact
+        :param contact_id: int: The deleted contact id
+        :return: None
+        """
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is not None:
+                self.memory_used += self._remove(index, contact_id)
+
+    def invalidate(self, user_id: Optional[int] = None) -> None:
+        """
+        The invalidate function drops the index of a user, or of every user when user_id is None.
+
+        :param user_id: Optional[int]: The user id
+        :return: None
+        """
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+                self.memory_used = 0
+                return
+            index = self._users.pop(user_id, None)
+            if index is not None:
+                self.memory_used -= index.size
+
+
+contact_search_index = ContactSearchIndex(
+    memory_budget=settings.contact_search_index_memory_mb * 1024 * 1024,
+    ttl=settings.contact_search_index_ttl,
+)
@@ -0,0 +1,93 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+def token_key(token: str) -> bytes:
+    """
+    The token_key function returns the cache key of a token, its SHA-256 digest,
+    so the cache never holds usable tokens.
+
+    :param token: str: The encoded JWT
+    :return: The digest of the token
+    """
+    return hashlib.sha256(token.encode()).digest()
+
+
+class VerifiedTokenCache:
+    """
+    LRU cache of the claims of JWTs whose signature has already been verified.
+
+    An entry is kept until the token's exp claim, tokens without exp are never cached,
+    and at most max_size entries are held. A hit skips the signature check, not the
+    expiry check, so a cached token stops working exactly when jwt.decode would reject it.
+    The claims are shared between requests and must be treated as read-only.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[bytes, Tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[dict]:
+        """
+        The get function returns the verified claims of a token that has not expired yet.
+
+        :param token: str: The encoded JWT
+        :return: The claims, or None if the token has to be verified
+        """
+        key = token_key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.time():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, token: str, claims: dict) -> None:
+        """
+        The put function caches the claims of a freshly verified token until its exp claim.
+
+        :param token: str: The encoded JWT
+        :param claims: dict: The claims returned by jwt.decode
+        :return: None
+        """
+        if not self.max_size or not isinstance(claims.get("exp"), (int, float)):
+            return
+        with self._lock:
+            self._entries[token_key(token)] = (claims["exp"], claims)
+            self._entries.move_to_end(token_key(token))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, token: str) -> None:
+        """
+        The discard function drops a token, e.g. once it has been revoked.
+
+        :param token: str: The encoded JWT
+        :return: None
+        """
+        with self._lock:
+            self._entries.pop(token_key(token), None)
+
+    def clear(self) -> None:
+        """
+        The clear function drops every cached token, e.g. after the signing key has been rotated.
+
+        :return: None
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,305 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Tuple
+
+import redis
+import redis.asyncio as aioredis
+
+from src.conf.config import settings
+from src.database.models import User
+from src.services.redis_client import async_redis, pubsub_redis, sync_redis
+
+# bump when SNAPSHOT_FIELDS or their encoding change, entries written by older code are then simply missed
+USER_CACHE_VERSION = 2
+
+# the fields routes read from the current user, password and refresh token are never cached
+SNAPSHOT_FIELDS = ("id", "username", "email", "created_at", "avatar", "confirmed", "tokens_revoked_at")
+
+# workers publish the email of every invalidated user here and drop it from their local tier
+INVALIDATION_CHANNEL = "user-cache:invalidate"
+
+
+def dump_user(user: User) -> bytes:
+    """
+    The dump_user function serializes the snapshot fields of a user as a compact JSON array,
+    ordered as SNAPSHOT_FIELDS.
+
+    :param user: User: The user loaded from the database
+    :return: The cache payload
+    """
+    values = [getattr(user, field) for field in SNAPSHOT_FIELDS]
+    return json.dumps(values, default=datetime.isoformat, separators=(",", ":")).encode()
+
+
+def load_fields(payload: bytes) -> dict:
+    """
+    The load_fields function decodes a cache payload written by dump_user into a dict of snapshot fields.
+
+    :param payload: bytes: The cache payload
+    :return: The snapshot fields
+    """
+    fields = dict(zip(SNAPSHOT_FIELDS, json.loads(payload)))
+    for field in ("created_at", "tokens_revoked_at"):
+        if fields[field] is not None:
+            fields[field] = datetime.fromisoformat(fields[field])
+    return fields
+
+
+def load_user(payload: bytes) -> User:
+    """
+    The load_user function rebuilds a transient User from a cache payload written by dump_user.
+
+    :param payload: bytes: The cache payload
+    :return: A User that is not attached to any session
+    """
+    return User(**load_fields(payload))
+
+
+class UserCache:
+    """
+    Two-tier cache of user snapshots keyed by email, used to authenticate requests without a users query.
+
+    The first tier is an in-process LRU of at most local_size snapshots kept for local_ttl seconds,
+    the second is Redis with ttl seconds. Keys carry USER_CACHE_VERSION, so a deployment changing
+    the snapshot layout never reads old entries. Code running on the event loop uses the a* methods
+    over the async client aclient, sync code uses the blocking methods over client.
+
+    The repository functions changing a user call invalidate, which deletes the Redis entry and
+    publishes the email on INVALIDATION_CHANNEL. Every worker listens on that channel in a daemon
+    thread and drops the email from its local tier. Pub/sub delivery is not guaranteed, so local_ttl
+    bounds how long a worker can serve a stale snapshot, and the local tier is cleared whenever the
+    listener loses its connection. The listener blocks on its own client, listener_client (client by default),
+    so client can keep a socket timeout. Redis errors are counted and treated as misses, a cache outage
+    only costs the database lookup.
+    """
+
+    def __init__(self, client: redis.Redis, ttl: int, local_size: int = 0, local_ttl: float = 5.0,
+                 version: int = USER_CACHE_VERSION, aclient: Optional[aioredis.Redis] = None,
+                 listener_client: Optional[redis.Redis] = None):
+        self.client = client
+        self.aclient = aclient
+        self.listener_client = client if listener_client is None else listener_client
+        self.ttl = ttl
+        self.local_size = local_size
+        self.local_ttl = local_ttl
+        self.version = version
+        self._local: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._listener: Optional[threading.Thread] = None
+        self.reset_stats()
+
+    def key(self, email: str) -> str:
+        return f"user:v{self.version}:{email}"
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.local_hits = 0
+            self.hits = 0
+            self.misses = 0
+            self.errors = 0
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _local_get(self, email: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._local.get(email)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._local[email]
+                return None
+            self._local.move_to_end(email)
+            self.local_hits += 1
+            return entry[1]
+
+    def _local_put(self, email: str, fields: dict) -> None:
+        if not self.local_size:
+            return
+        self._start_listener()
+        with self._lock:
+            self._local[email] = (time.monotonic() + self.local_ttl, fields)
+            self._local.move_to_end(email)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
+
+    def _local_pop(self, email: str) -> None:
+        with self._lock:
+            self._local.pop(email, None)
+
+    def clear_local(self) -> None:
+        """
+        The clear_local function empties the in-process tier.
+
+        :return: None
+        """
+        with self._lock:
+            self._local.clear()
+
+    def _start_listener(self) -> None:
+        with self._lock:
+            if self._listener is not None:
+                return
+            self._listener = threading.Thread(target=self._listen, name="user-cache-invalidation", daemon=True)
+        self._listener.start()
+
+    def _listen(self) -> None:
+        while True:
+            pubsub = self.listener_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        email = message["data"]
+                        self._local_pop(email.decode() if isinstance(email, bytes) else email)
+            except redis.RedisError:
+                self._count("errors")
+            finally:
+                pubsub.close()
+            # invalidations published while disconnected are lost
+            self.clear_local()
+            time.sleep(self.local_ttl)
+
+    def _from_payload(self, email: str, payload) -> Optional[User]:
+        if payload is None:
+            self._count("misses")
+            return None
+        try:
+            fields = load_fields(payload)
+        except (ValueError, TypeError, KeyError):
+            self._count("misses")
+            return None
+        self._count("hits")
+        self._local_put(email, fields)
+        return User(**fields)
+
+    def _snapshot(self, user: User) -> bytes:
+        payload = dump_user(user)
+        self._local_put(user.email, load_fields(payload))
+        return payload
+
+    def get(self, email: str) -> Optional[User]:
+        """
+        The get function returns the cached snapshot of a user, from the local tier if possible.
+
+        :param email: str: The user email
+        :return: A transient User, or None on a miss
+        """
+        fields = self._local_get(email)
+        if fields is not None:
+            return User(**fields)
+        try:
+            payload = self.client.get(self.key(email))
+        except redis.RedisError:
+            self._count("errors")
+            payload = None
+        return self._from_payload(email, payload)
+
+    async def aget(self, email: str) -> Optional[User]:
+        """
+        The aget function is the async counterpart of get.
+
+        :param email: str: The user email
+        :return: A transient User, or None on a miss
+        """
+        fields = self._local_get(email)
+        if fields is not None:
+            return User(**fields)
+        try:
+            payload = await self.aclient.get(self.key(email))
+        except redis.RedisError:
+            self._count("errors")
+            payload = None
+        return self._from_payload(email, payload)
+
+    def set(self, user: User) -> None:
+        """
+        The set function caches the snapshot of a user in both tiers with a single SET ... EX.
+
+        :param user: User: The user loaded from the database
+        :return: None
+        """
+        payload = self._snapshot(user)
+        try:
+            self.client.set(self.key(user.email), payload, ex=self.ttl)
+        except redis.RedisError:
+            self._count("errors")
+
+    async def aset(self, user: User) -> None:
+        """
+        The aset function is the async counterpart of set.
+
+        :param user: User: The user loaded from the database
+        :return: None
+        """
+        payload = self._snapshot(user)
+        try:
+            await self.aclient.set(self.key(user.email), payload, ex=self.ttl)
+        except redis.RedisError:
+            self._count("errors")
+
+    def invalidate(self, email: str) -> None:
+        """
+        The invalidate function drops the cached snapshot of a user after the user has changed,
+        locally, in Redis and, through INVALIDATION_CHANNEL, in the other workers.
+        The DELETE and the PUBLISH are sent in one pipelined round trip.
+
+        :param email: str: The user email
+        :return: None
+        """
+        self._local_pop(email)
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.delete(self.key(email))
+            pipe.publish(INVALIDATION_CHANNEL, email)
+            pipe.execute()
+        except redis.RedisError:
+            self._count("errors")
+
+    async def ainvalidate(self, email: str) -> None:
+        """
+        The ainvalidate function is the async counterpart of invalidate.
+
+        :param email: str: The user email
+        :return: None
+        """
+        self._local_pop(email)
+        try:
+            pipe = self.aclient.pipeline(transaction=False)
+            pipe.delete(self.key(email))
+            pipe.publish(INVALIDATION_CHANNEL, email)
+            await pipe.execute()
+        except redis.RedisError:
+            self._count("errors")
+
+    def stats(self) -> dict:
+        """
+        The stats function reports the hit/miss counters of this process.
+
+        :return: Local tier and Redis hits, misses, Redis errors and the overall hit ratio
+        """
+        with self._lock:
+            lookups = self.local_hits + self.hits + self.misses
+            return {
+                "version": self.version,
+                "local_size": len(self._local),
+                "local_hits": self.local_hits,
+                "hits": self.hits,
+                "misses": self.misses,
+                "errors": self.errors,
+                "hit_ratio": round((self.local_hits + self.hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+user_cache = UserCache(
+    sync_redis,
+    ttl=settings.user_cache_ttl,
+    local_size=settings.user_cache_local_size,
+    local_ttl=settings.user_cache_local_ttl,
+    aclient=async_redis,
+    listener_client=pubsub_redis,
+)
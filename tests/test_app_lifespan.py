@@ -0,0 +1,15 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, inspect
+
+import main
+from src.conf.config import settings
+
+
+def test_lifespan_creates_tables(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'empty.db'}")
+    monkeypatch.setattr(main, "engine", engine)
+    monkeypatch.setattr(settings, "db_create_all", True)
+    with TestClient(main.create_app()):
+        tables = set(inspect(engine).get_table_names())
+    engine.dispose()
+    assert {"contacts", "users", "user_shards"} <= tables
@@ -0,0 +1,13 @@
+import os
+
+from benchmarks.import_time import DEFERRED_PACKAGES, measure_imports, total_us
+
+# generous, a regression that imports a heavy package eagerly again should still stand out
+IMPORT_TIME_BUDGET_MS = float(os.environ.get("IMPORT_TIME_BUDGET_MS", 2500))
+
+
+def test_worker_import_time():
+    imports = measure_imports("main")
+    loaded = {item.module.split(".")[0] for item in imports}
+    assert not loaded & set(DEFERRED_PACKAGES)
+    assert total_us(imports, "main") / 1000 < IMPORT_TIME_BUDGET_MS
@@ -1,6 +1,11 @@
-from unittest.mock import MagicMock, patch
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
 import pytest
+from passlib.hash import bcrypt
+
+from src.conf.config import settings
 from src.services.auth import auth_service
+from src.services.refresh_tokens import RefreshStoreUnavailable
 from src.database.models import User
 
 
@@ -57,6 +62,20 @@ def test_login_user(client, session, user):
     assert data["token_type"] == "bearer"
 
 
+def test_login_rehashes_outdated_hash(client, session, user):
+    current_user: User = session.query(User).filter(User.email == user.get('email')).first()
+    current_user.password = bcrypt.using(rounds=4).hash(user.get('password'))
+    session.commit()
+    response = client.post(
+        "/auth/login",
+        data={"username": user.get('email'), "password": user.get('password')},
+    )
+    assert response.status_code == 200, response.text
+    current_user = session.query(User).filter(User.email == user.get('email')).first()
+    assert current_user.password.startswith(f"$2b${settings.bcrypt_rounds:02d}$")
+    assert not auth_service.password_needs_update(current_user.password)
+
+
 def test_login_wrong_password(client, user):
     response = client.post(
         "/auth/login",
@@ -106,6 +125,31 @@ def test_refresh_token_invalid_token(client, session, user):
     data = response.json()
     assert "Could not validate credentials" in data["detail"]
 
+def test_refresh_token_family_rotation(client, session, user, monkeypatch):
+    store = MagicMock()
+    store.aissue = AsyncMock(return_value={"fam": "family", "jti": "first"})
+    store.arotate = AsyncMock(return_value={"fam": "family", "jti": "second"})
+    monkeypatch.setattr("src.services.auth.refresh_tokens", store)
+    response = client.post(
+        "/auth/login",
+        data={"username": user.get('email'), "password": user.get('password')},
+    )
+    assert response.status_code == 200, response.text
+    refresh_token = response.json()["refresh_token"]
+    assert auth_service.decode_refresh_claims(refresh_token)["jti"] == "first"
+
+    response = client.get("/auth/refresh_token", headers={"Authorization": f"Bearer {refresh_token}"})
+    assert response.status_code == 200, response.text
+    assert auth_service.decode_refresh_claims(response.json()["refresh_token"])["jti"] == "second"
+    store.arotate.assert_awaited_once_with(user.get('email'), "family", "first")
+
+    # a reused or revoked token is rejected without touching the refresh_token column
+    store.arotate.return_value = None
+    response = client.get("/auth/refresh_token", headers={"Authorization": f"Bearer {refresh_token}"})
+    assert response.status_code == 401, response.text
+    assert response.json()["detail"] == "Invalid refresh token"
+
+
 def test_request_reset_password(client, session, user, mock_send_email, monkeypatch):
     current_user: User = session.query(User).filter(User.email == user.get('email')).first()
     current_user.confirmed = True
@@ -127,3 +171,44 @@ def test_request_reset_password(client, session, user, mock_send_email, monkeypa
     assert data["message"] == "Check your email for confirmation."
 
 
+
+
+def test_update_password_fails_when_sessions_cannot_be_revoked(client, session, user, monkeypatch):
+    store = MagicMock()
+    store.arevoke_all = AsyncMock(side_effect=RefreshStoreUnavailable())
+    monkeypatch.setattr("src.services.auth.refresh_tokens", store)
+    old_hash = session.query(User).filter(User.email == user.get('email')).first().password
+    token = auth_service.create_email_token({"sub": user.get('email')})
+
+    response = client.post(f"/auth/update_password/{token}", data={"new_password": "new-password"})
+    assert response.status_code == 503, response.text
+    assert session.query(User).filter(User.email == user.get('email')).first().password == old_hash
+
+    store.arevoke_all = AsyncMock()
+    response = client.post(f"/auth/update_password/{token}", data={"new_password": "new-password"})
+    assert response.status_code == 200, response.text
+    assert store.arevoke_all.await_count == 2
+    session.expire_all()
+    assert session.query(User).filter(User.email == user.get('email')).first().password != old_hash
+
+
+def test_update_password_revokes_access_tokens(client, session, user, monkeypatch):
+    monkeypatch.setattr("src.services.auth.refresh_tokens.arevoke_all", AsyncMock())
+    # the previous test changed the password already
+    session.query(User).filter(User.email == user.get('email')).first().tokens_revoked_at = None
+    session.commit()
+    with patch("src.services.auth.datetime") as datetime_mock:
+        datetime_mock.utcnow.return_value = datetime.utcnow() - timedelta(minutes=1)
+        old_token = auth_service.create_access_token(data={"sub": user.get('email')})
+    response = client.get("/users/me/", headers={"Authorization": f"Bearer {old_token}"})
+    assert response.status_code == 200, response.text
+
+    token = auth_service.create_email_token({"sub": user.get('email')})
+    response = client.post(f"/auth/update_password/{token}", data={"new_password": "another-password"})
+    assert response.status_code == 200, response.text
+
+    response = client.get("/users/me/", headers={"Authorization": f"Bearer {old_token}"})
+    assert response.status_code == 401, response.text
+    new_token = auth_service.create_access_token(data={"sub": user.get('email')})
+    response = client.get("/users/me/", headers={"Authorization": f"Bearer {new_token}"})
+    assert response.status_code == 200, response.text
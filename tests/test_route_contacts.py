@@ -1,10 +1,15 @@
-from unittest.mock import MagicMock, patch
+import base64
+import csv
+import io
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
 from src.schemas import ContactCreate
 import pytest
 from datetime import date
 from fastapi.encoders import jsonable_encoder
-from src.database.models import User
-from src.services.auth import auth_service
+from src.database.models import Contact, User
+from src.services.rate_limit import RateLimit, rate_limiter
+from src.services.user_cache import user_cache
 
 
 @pytest.fixture()
@@ -54,7 +59,7 @@ def test_create_contact(client, token):
     assert "id" in data
 
 def test_get_contact(client, token):
-    with patch.object(auth_service, 'r') as r_mock:
+    with patch.object(user_cache, 'aclient', new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         response = client.get(
             "/contacts/1",
@@ -69,7 +74,7 @@ def test_get_contact(client, token):
         assert "id" in data
 
 def test_get_contact_not_found(client, token):
-    with patch.object(auth_service, 'r') as r_mock:
+    with patch.object(user_cache, 'aclient', new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         response = client.get(
             "/contacts/999",
@@ -78,7 +83,7 @@ def test_get_contact_not_found(client, token):
         assert response.status_code == 404, response.text
 
 def test_get_contacts(client, token):
-    with patch.object(auth_service, 'r') as r_mock:
+    with patch.object(user_cache, 'aclient', new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         response = client.get(
             "/contacts",
@@ -94,7 +99,7 @@ def test_get_contacts(client, token):
         assert "id" in data[0]
 
 def test_update_contact(client, token):
-    with patch.object(auth_service, 'r') as r_mock:
+    with patch.object(user_cache, 'aclient', new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         response = client.put(
             f"/contacts/1",
@@ -121,7 +126,7 @@ def test_update_contact(client, token):
         assert data["additional_info"] == "Updated information"
 
 def test_update_contact_not_found(client, token):
-    with patch.object(auth_service, 'r') as r_mock:
+    with patch.object(user_cache, 'aclient', new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         response = client.put(
             "/contacts/999",
@@ -139,7 +144,7 @@ def test_update_contact_not_found(client, token):
 
 
 def test_delete_contact(client, token):
-    with patch.object(auth_service, 'r') as r_mock:
+    with patch.object(user_cache, 'aclient', new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         response = client.delete(
             "/contacts/1",
@@ -157,7 +162,7 @@ def test_delete_contact(client, token):
 
 
 def test_repeat_delete_contact(client, token):
-    with patch.object(auth_service, 'r') as r_mock:
+    with patch.object(user_cache, 'aclient', new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         response = client.delete(
             "/contacts/1",
@@ -165,3 +170,391 @@ def test_repeat_delete_contact(client, token):
         )
         assert response.status_code == 404, response.text
 
+
+
+def test_get_contacts_cursor_pagination(client, token):
+    with patch.object(user_cache, 'aclient', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {token}"}
+        for i in range(3):
+            response = client.post(
+                "/contacts",
+                json={
+                    "first_name": f"Page{i}",
+                    "last_name": "Contact",
+                    "email": f"page{i}@example.com",
+                    "phone": f"55500{i}",
+                    "birthday": "1990-01-02",
+                },
+                headers=headers
+            )
+            assert response.status_code == 200, response.text
+
+        response = client.get("/contacts", params={"paginate": "cursor", "limit": 2}, headers=headers)
+        assert response.status_code == 200, response.text
+        first_page = response.json()
+        assert len(first_page["items"]) == 2
+        assert first_page["next_cursor"]
+
+        response = client.get("/contacts", params={"cursor": first_page["next_cursor"], "limit": 2}, headers=headers)
+        assert response.status_code == 200, response.text
+        second_page = response.json()
+        assert second_page["next_cursor"] is None
+        ids = [item["id"] for item in first_page["items"] + second_page["items"]]
+        assert ids == sorted(ids)
+        assert len(set(ids)) == 3
+
+
+def test_get_contacts_invalid_cursor(client, token):
+    with patch.object(user_cache, 'aclient', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.get(
+            "/contacts",
+            params={"cursor": "not-a-cursor"},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 400, response.text
+        forged = base64.urlsafe_b64encode(json.dumps({"s": "email", "v": {"x": 1}, "id": 1}).encode()).decode()
+        response = client.get(
+            "/contacts",
+            params={"cursor": forged, "sort": "email"},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 400, response.text
+
+
+def test_get_contacts_invalid_limit(client, token):
+    with patch.object(user_cache, 'aclient', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        for limit in (0, -1, 1001):
+            response = client.get(
+                "/contacts",
+                params={"paginate": "cursor", "limit": limit},
+                headers={"Authorization": f"Bearer {token}"}
+            )
+            assert response.status_code == 422, response.text
+
+
+def test_search_contacts_fulltext(client, token, monkeypatch):
+    monkeypatch.setattr("src.repository.contacts.settings.contact_search_engine", "fulltext")
+    with patch.object(user_cache, 'aclient', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.post(
+            "/contacts/search",
+            params={"query": "page1@exam", "limit": 5},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert [item["email"] for item in data] == ["page1@example.com"]
+
+        response = client.post(
+            "/contacts/search",
+            params={"query": "PAGE", "limit": 2},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 200, response.text
+        assert len(response.json()) == 2
+
+
+def test_search_contacts_in_memory_index(client, token, monkeypatch):
+    monkeypatch.setattr("src.repository.contacts.settings.contact_search_index", True)
+    with patch.object(user_cache, 'aclient', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {token}"}
+        response = client.post("/contacts/search", params={"query": "page"}, headers=headers)
+        assert response.status_code == 200, response.text
+        assert len(response.json()) == 3
+
+        response = client.post(
+            "/contacts",
+            json={
+                "first_name": "Indexed",
+                "last_name": "Contact",
+                "email": "indexed@example.com",
+                "phone": "5559999",
+                "birthday": "1990-01-02",
+            },
+            headers=headers
+        )
+        assert response.status_code == 200, response.text
+        response = client.post("/contacts/search", params={"query": "index"}, headers=headers)
+        assert [item["email"] for item in response.json()] == ["indexed@example.com"]
+
+
+def test_search_rate_limit_per_user(client, token, monkeypatch):
+    monkeypatch.setitem(rate_limiter.limits, "search", RateLimit(1, 60))
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.post("/contacts/search", params={"query": "page"}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.headers["X-RateLimit-Limit"] == "1"
+    assert response.headers["X-RateLimit-Remaining"] == "0"
+
+    response = client.post("/contacts/search", params={"query": "page"}, headers=headers)
+    assert response.status_code == 429, response.text
+    assert int(response.headers["Retry-After"]) > 0
+
+    # reads have their own policy
+    response = client.get("/contacts", headers=headers)
+    assert response.status_code == 200, response.text
+
+
+def test_get_contacts_with_birthdays(client, token):
+    today = date.today()
+    with patch.object(user_cache, 'aclient', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {token}"}
+        response = client.post(
+            "/contacts",
+            json={
+                "first_name": "Birthday",
+                "last_name": "Soon",
+                "email": "birthday@example.com",
+                "phone": "5557777",
+                "birthday": today.replace(year=1992).isoformat(),
+            },
+            headers=headers
+        )
+        assert response.status_code == 200, response.text
+
+        response = client.get("/contacts/birthdays", params={"days": 3}, headers=headers)
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert [item["full_name"] for item in data] == ["Birthday Soon"]
+        assert data[0]["days_until_birthday"] == 0
+
+
+def test_bulk_import_contacts_csv(client, token):
+    csv_data = (
+        "first_name,last_name,email,phone,birthday,additional_info\n"
+        "Bulk,One,bulk1@example.com,5551001,1990-05-01,\n"
+        "Bulk,Two,bulk2@example.com,5551002,1990-05-02,Friend\n"
+        "Bulk,Duplicate,bulk1@example.com,5551003,1990-05-03,\n"
+        "Bulk,Invalid,bulk4@example.com,5551004,not-a-date,\n"
+    )
+    with patch.object(user_cache, 'aclient', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.post(
+            "/contacts/bulk",
+            files={"file": ("contacts.csv", csv_data.encode(), "text/csv")},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert data["inserted"] == 2
+        assert data["failed"] == 2
+        assert [error["row"] for error in data["errors"]] == [4, 3]
+        assert "already exists" in data["errors"][1]["detail"]
+
+
+def test_bulk_import_contacts_bad_byte_after_first_chunk(client, token, monkeypatch):
+    monkeypatch.setattr("src.routes.contacts.settings.contact_bulk_chunk_size", 2)
+    csv_data = (
+        b"first_name,last_name,email,phone,birthday,additional_info\n"
+        b"Chunk,One,chunk1@example.com,5553001,1990-06-01,\n"
+        b"Chunk,Two,chunk2@example.com,5553002,1990-06-02,\n"
+        b"Chunk,Thr\xe9e,chunk3@example.com,5553003,1990-06-03,\n"
+        b"Chunk,Four,chunk4@example.com,5553004,1990-06-04,\n"
+    )
+    with patch.object(user_cache, 'aclient', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.post(
+            "/contacts/bulk",
+            files={"file": ("contacts.csv", csv_data, "text/csv")},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert data["inserted"] == 2
+        assert data["failed"] == 1
+        assert data["errors"][0]["row"] == 3
+        assert "Invalid UTF-8" in data["errors"][0]["detail"]
+
+
+def test_bulk_import_contacts_ndjson(client, token):
+    ndjson_data = (
+        '{"first_name": "Json", "last_name": "One", "email": "json1@example.com", "phone": "5552001", "birthday": "1991-01-01"}\n'
+        '\n'
+        '{"first_name": "Json", "last_name": "Two", "email": "json2@example.com", "phone": "5551001", "birthday": "1991-01-02"}\n'
+        'not json\n'
+    )
+    with patch.object(user_cache, 'aclient', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.post(
+            "/contacts/bulk",
+            files={"file": ("contacts.ndjson", ndjson_data.encode(), "application/octet-stream")},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert data["inserted"] == 1
+        assert {error["row"] for error in data["errors"]} == {3, 4}
+
+
+def test_bulk_import_contacts_unsupported_format(client, token):
+    with patch.object(user_cache, 'aclient', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.post(
+            "/contacts/bulk",
+            files={"file": ("contacts.xlsx", b"data", "application/octet-stream")},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 400, response.text
+
+
+def test_export_contacts_ndjson(client, token):
+    with patch.object(user_cache, 'aclient', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.get("/contacts/export", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200, response.text
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        emails = [line["email"] for line in lines]
+        assert "bulk1@example.com" in emails
+        assert [line["id"] for line in lines] == sorted(line["id"] for line in lines)
+
+
+def test_export_contacts_csv(client, token):
+    with patch.object(user_cache, 'aclient', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.get(
+            "/contacts/export",
+            params={"format": "csv"},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 200, response.text
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        bulk = next(row for row in rows if row["email"] == "bulk2@example.com")
+        assert bulk["birthday"] == "1990-05-02"
+        assert bulk["additional_info"] == "Friend"
+
+
+def test_update_contacts_batch(client, token, session):
+    ids = [contact.id for contact in session.query(Contact).filter(Contact.email.like("bulk%")).all()]
+    with patch.object(user_cache, 'aclient', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.patch(
+            "/contacts/batch",
+            json={"items": [{"id": ids[0], "additional_info": "Batch"},
+                            {"id": ids[1], "additional_info": "Batch"},
+                            {"id": ids[1] + 1000, "additional_info": "Batch"},
+                            {"id": ids[0] + 2000, "birthday": "1990-12-31"}]},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 200, response.text
+        assert [item["status"] for item in response.json()] == ["updated", "updated", "not_found", "not_found"]
+        response = client.get(f"/contacts/{ids[0]}", headers={"Authorization": f"Bearer {token}"})
+        assert response.json()["additional_info"] == "Batch"
+
+
+def test_update_contacts_batch_conflict(client, token, session):
+    ids = [contact.id for contact in session.query(Contact).filter(Contact.email.like("bulk%")).all()]
+    with patch.object(user_cache, 'aclient', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.patch(
+            "/contacts/batch",
+            json={"items": [{"id": ids[0], "email": "batch@example.com"}, {"id": ids[1], "email": "batch@example.com"}]},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 409, response.text
+
+
+def test_update_contacts_batch_rejects_null(client, token, session):
+    ids = [contact.id for contact in session.query(Contact).filter(Contact.email.like("bulk%")).all()]
+    with patch.object(user_cache, 'aclient', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.patch(
+            "/contacts/batch",
+            json={"items": [{"id": ids[0], "first_name": None}]},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 422, response.text
+        response = client.patch(
+            "/contacts/batch",
+            json={"items": [{"id": ids[0], "additional_info": None}]},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 200, response.text
+        response = client.get(f"/contacts/{ids[0]}", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200, response.text
+        assert response.json()["first_name"]
+        assert response.json()["additional_info"] is None
+
+
+def test_delete_contacts_batch(client, token, session):
+    ids = [contact.id for contact in session.query(Contact).filter(Contact.email.like("bulk%")).all()]
+    with patch.object(user_cache, 'aclient', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.request(
+            "DELETE",
+            "/contacts/batch",
+            json={"ids": ids + [ids[-1] + 1000]},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 200, response.text
+        assert [item["status"] for item in response.json()] == ["deleted"] * len(ids) + ["not_found"]
+        response = client.get(f"/contacts/{ids[0]}", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 404, response.text
+
+
+def test_contact_writes_round_trips(client, token, query_counter):
+    # the write itself is a single statement, the current user may come from the user cache
+    with patch.object(user_cache, 'aclient', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {token}"}
+        response = client.post("/contacts", json={"first_name": "Round", "last_name": "Trip",
+                                                  "email": "round.trip@example.com", "phone": "1234567890",
+                                                  "birthday": "1990-05-05"}, headers=headers)
+        assert response.status_code == 200, response.text
+        assert len([statement for statement in query_counter if 'contacts' in statement]) == 1, query_counter
+        contact_id = response.json()["id"]
+
+        query_counter.clear()
+        response = client.put(f"/contacts/{contact_id}", json={"first_name": "Round", "last_name": "Trip",
+                                                                "email": "round.trip@example.com",
+                                                                "phone": "0987654321",
+                                                                "birthday": "1990-05-06"}, headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.json()["phone"] == "0987654321"
+        assert len([statement for statement in query_counter if 'contacts' in statement]) == 1, query_counter
+
+        query_counter.clear()
+        response = client.delete(f"/contacts/{contact_id}", headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.json()["birthday"] == "1990-05-06"
+        assert len([statement for statement in query_counter if 'contacts' in statement]) == 1, query_counter
+
+        response = client.delete(f"/contacts/{contact_id}", headers=headers)
+        assert response.status_code == 404, response.text
+
+
+def test_get_contacts_conditional(client, token, query_counter):
+    # a client polling with the ETag of its copy gets 304 without a contact query until the contacts change
+    with patch.object(user_cache, 'aclient', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {token}"}
+        response = client.get("/contacts/", headers=headers)
+        assert response.status_code == 200, response.text
+        etag = response.headers["ETag"]
+        assert response.headers["Cache-Control"] == "private, no-cache"
+
+        query_counter.clear()
+        response = client.get("/contacts/", headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 304, response.text
+        assert response.headers["ETag"] == etag
+        assert not [statement for statement in query_counter if 'contacts' in statement], query_counter
+
+        response = client.get("/contacts/", headers={**headers, "If-None-Match": "*"})
+        assert response.status_code == 304, response.text
+        assert response.headers["ETag"] == etag
+
+        response = client.get("/contacts/", params={"limit": 1}, headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 200, response.text
+
+        response = client.post("/contacts", json={"first_name": "Etag", "last_name": "Poll",
+                                                  "email": "etag.poll@example.com", "phone": "5550001",
+                                                  "birthday": "1990-05-05"}, headers=headers)
+        assert response.status_code == 200, response.text
+        response = client.get("/contacts/", headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 200, response.text
+        assert response.headers["ETag"] != etag
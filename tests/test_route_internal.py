@@ -0,0 +1,22 @@
+from fastapi.testclient import TestClient
+
+from main import create_app
+from src.conf.config import settings
+
+
+def test_internal_not_mounted_without_token(monkeypatch):
+    monkeypatch.setattr(settings, "internal_token", None)
+    client = TestClient(create_app())
+    response = client.get("/internal/pool")
+    assert response.status_code == 404, response.text
+
+
+def test_internal_requires_token(monkeypatch):
+    monkeypatch.setattr(settings, "internal_token", "secret")
+    client = TestClient(create_app())
+    for headers in ({}, {"X-Internal-Token": "wrong"}):
+        response = client.get("/internal/pool", headers=headers)
+        assert response.status_code == 403, response.text
+    response = client.get("/internal/pool", headers={"X-Internal-Token": "secret"})
+    assert response.status_code == 200, response.text
+    assert "sync" in response.json()
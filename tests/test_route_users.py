@@ -35,8 +35,9 @@ def test_read_users_me(client, token):
 
 def test_update_avatar_user(client, token):
     avatar_url = "https://example.com/avatar.jpg"
-    with patch("src.routes.users.cloudinary") as mock_cloudinary:
-        mock_cloudinary.CloudinaryImage.return_value.build_url.return_value = avatar_url
+    with patch("cloudinary.uploader.upload", return_value={"version": 1}), \
+            patch("cloudinary.CloudinaryImage") as mock_image:
+        mock_image.return_value.build_url.return_value = avatar_url
         response = client.patch(
             "/users/avatar",
             files={"file": ("avatar.jpg", b"dummydata", "image/jpeg")},
@@ -0,0 +1,99 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import redis
+from starlette.requests import Request
+
+from src.services.contact_versions import ContactVersions, RedisContactVersions, etag_matches, make_etag
+
+
+def request(path: str, query: bytes = b"") -> Request:
+    return Request({"type": "http", "method": "GET", "path": path, "query_string": query, "headers": []})
+
+
+class ContactVersionsTests(unittest.TestCase):
+    def setUp(self):
+        self.versions = ContactVersions()
+
+    def test_bump_changes_version(self):
+        first = asyncio.run(self.versions.aget(1))
+        self.assertEqual(asyncio.run(self.versions.aget(1)), first)
+        self.versions.bump(1)
+        self.assertEqual(asyncio.run(self.versions.aget(1)), first + 1)
+        self.assertEqual(self.versions.stats()["bumps"], 1)
+
+    def test_versions_are_per_user(self):
+        first = asyncio.run(self.versions.aget(2))
+        self.versions.bump(1)
+        self.assertEqual(asyncio.run(self.versions.aget(2)), first)
+
+    def test_missing_version_starts_from_the_clock(self):
+        with patch("src.services.contact_versions.time.time_ns", return_value=5_000_000):
+            self.assertEqual(asyncio.run(self.versions.aget(1)), 5000)
+
+
+class RedisContactVersionsTests(unittest.TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.aclient = MagicMock()
+        self.aclient.get = AsyncMock(return_value="42")
+        self.aclient.set = AsyncMock()
+        self.versions = RedisContactVersions(self.client, self.aclient, ttl=3600)
+
+    def test_aget_reads_counter(self):
+        self.assertEqual(asyncio.run(self.versions.aget(7)), 42)
+        self.aclient.get.assert_awaited_once_with("contacts:v1:version:7")
+        self.aclient.set.assert_not_awaited()
+
+    def test_aget_initializes_missing_counter(self):
+        self.aclient.get.side_effect = [None, "1000"]
+        self.assertEqual(asyncio.run(self.versions.aget(7)), 1000)
+        self.aclient.set.assert_awaited_once()
+        self.assertTrue(self.aclient.set.call_args.kwargs["nx"])
+
+    def test_aget_without_redis_returns_none(self):
+        self.aclient.get.side_effect = redis.ConnectionError()
+        self.assertIsNone(asyncio.run(self.versions.aget(7)))
+        self.assertEqual(self.versions.stats()["errors"], 1)
+
+    def test_bump_increments_counter(self):
+        self.versions.bump(7)
+        pipe = self.client.pipeline.return_value
+        pipe.incr.assert_called_once_with("contacts:v1:version:7")
+        pipe.expire.assert_called_once_with("contacts:v1:version:7", 3600)
+        self.assertEqual(self.versions.stats()["bumps"], 1)
+
+    def test_bump_without_redis_is_counted(self):
+        self.client.pipeline.return_value.execute.side_effect = redis.ConnectionError()
+        self.versions.bump(7)
+        self.assertEqual(self.versions.stats()["errors"], 1)
+
+
+class ETagTests(unittest.TestCase):
+    def test_etag_depends_on_version_user_and_request(self):
+        etag = make_etag(1, 10, request("/contacts/", b"skip=0&limit=5"))
+        self.assertTrue(etag.startswith('"a-') and etag.endswith('"'))
+        self.assertEqual(etag, make_etag(1, 10, request("/contacts/", b"limit=5&skip=0")))
+        self.assertNotEqual(etag, make_etag(1, 11, request("/contacts/", b"skip=0&limit=5")))
+        self.assertNotEqual(etag, make_etag(2, 10, request("/contacts/", b"skip=0&limit=5")))
+        self.assertNotEqual(etag, make_etag(1, 10, request("/contacts/", b"skip=5&limit=5")))
+        self.assertNotEqual(etag, make_etag(1, 10, request("/contacts/1")))
+
+    def test_daily_etag_changes_with_the_date(self):
+        with patch("src.services.contact_versions.date") as today:
+            today.today.return_value.isoformat.return_value = "2026-10-16"
+            first = make_etag(1, 10, request("/contacts/birthdays"), daily=True)
+            today.today.return_value.isoformat.return_value = "2026-10-17"
+            self.assertNotEqual(first, make_etag(1, 10, request("/contacts/birthdays"), daily=True))
+
+    def test_etag_matches(self):
+        self.assertTrue(etag_matches('"a-1"', '"a-1"'))
+        self.assertTrue(etag_matches('"b-2", W/"a-1"', '"a-1"'))
+        self.assertTrue(etag_matches(' * ', '"a-1"'))
+        self.assertFalse(etag_matches('"a-2"', '"a-1"'))
+        self.assertFalse(etag_matches(None, '"a-1"'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import csv
+import io
+import unittest
+
+from datetime import date
+
+from src.services.contacts_io import detect_format, read_records, format_rows, csv_header
+
+
+class ContactsIOTests(unittest.TestCase):
+    def test_detect_format(self):
+        self.assertEqual(detect_format("contacts.csv", None), "csv")
+        self.assertEqual(detect_format("upload", "application/x-ndjson"), "ndjson")
+        self.assertEqual(detect_format("contacts.jsonl", None), "ndjson")
+        self.assertEqual(detect_format("contacts.csv", "text/csv", "ndjson"), "ndjson")
+        self.assertIsNone(detect_format("contacts.xlsx", None))
+
+    def test_read_csv_records(self):
+        data = io.BytesIO(
+            "﻿first_name,last_name,email,phone,birthday\n"
+            "John,Doe,john@example.com,123,1990-01-01\n".encode()
+        )
+        records = list(read_records(data, "csv"))
+        self.assertEqual(len(records), 1)
+        row, record, error = records[0]
+        self.assertEqual(row, 1)
+        self.assertEqual(record["first_name"], "John")
+        self.assertIsNone(record["additional_info"])
+        self.assertIsNone(error)
+
+    def test_read_ndjson_records(self):
+        data = io.BytesIO(b'{"first_name": "John"}\n\n[1, 2]\n{broken\n')
+        records = list(read_records(data, "ndjson"))
+        self.assertEqual([row for row, _, _ in records], [1, 3, 4])
+        self.assertEqual(records[0][1], {"first_name": "John"})
+        self.assertEqual(records[1][2], "Expected a JSON object")
+        self.assertTrue(records[2][2].startswith("Invalid JSON"))
+
+    def test_read_records_with_bad_bytes(self):
+        data = io.BytesIO(b'first_name,last_name\nJohn,Doe\nJos\xe9,Doe\nJane,Doe\n')
+        records = list(read_records(data, "csv"))
+        self.assertEqual([(row, error is None) for row, _, error in records], [(1, True), (2, False)])
+        self.assertIn("the rest of the file was not read", records[1][2])
+        data = io.BytesIO(b'first_name\nJohn\n' + b'x' * (csv.field_size_limit() + 1) + b'\n')
+        self.assertTrue(list(read_records(data, "csv"))[1][2].startswith("Invalid CSV"))
+        data = io.BytesIO(b'{"first_name": "John"}\n{"first_name": "Jos\xe9"}\n{"first_name": "Jane"}\n')
+        records = list(read_records(data, "ndjson"))
+        self.assertEqual([(row, error is None) for row, _, error in records], [(1, True), (2, False), (3, True)])
+
+    def test_format_rows(self):
+        rows = [(1, "John", "Doe", "john@example.com", "123", date(1990, 1, 1), None)]
+        self.assertEqual(csv_header(), "id,first_name,last_name,email,phone,birthday,additional_info\r\n")
+        self.assertEqual(format_rows(rows, "csv"), "1,John,Doe,john@example.com,123,1990-01-01,\r\n")
+        self.assertEqual(
+            format_rows(rows, "ndjson"),
+            '{"id": 1, "first_name": "John", "last_name": "Doe", "email": "john@example.com", '
+            '"phone": "123", "birthday": "1990-01-01", "additional_info": null}\n'
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
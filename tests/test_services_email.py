@@ -1,6 +1,7 @@
 
-from unittest.mock import patch
+from unittest.mock import AsyncMock, patch
 from src.services.auth import auth_service, repository_users
+from src.services.refresh_tokens import refresh_tokens
 
 
 from fastapi import status
@@ -8,7 +9,8 @@ from fastapi import status
 def test_update_password_success(client):
     with patch.object(auth_service, "get_email_from_token", return_value="test@example.com"):
         with patch.object(repository_users, "get_user_by_email", return_value=True):
-            with patch.object(repository_users, "update_password") as mock_update_password:
+            with patch.object(repository_users, "update_password") as mock_update_password, \
+                    patch.object(refresh_tokens, "arevoke_all", new_callable=AsyncMock):
                 response = client.post(
                     "/auth/update_password/test_token",
                     data={"new_password": "new_password"}
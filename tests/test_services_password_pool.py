@@ -0,0 +1,49 @@
+import asyncio
+import threading
+import unittest
+
+from fastapi import HTTPException
+from unittest.mock import patch
+
+from src.services.auth import auth_service
+from src.services.password_pool import PasswordPool, PasswordPoolBusy, hash_password, verify_password
+
+
+class PasswordPoolTests(unittest.IsolatedAsyncioTestCase):
+    async def test_hash_and_verify(self):
+        pool = PasswordPool(kind="thread", workers=2, max_pending=2)
+        hashed = await pool.run(hash_password, "secret")
+        self.assertTrue(await pool.run(verify_password, "secret", hashed))
+        self.assertFalse(await pool.run(verify_password, "wrong", hashed))
+        pool.shutdown()
+
+    async def test_process_pool(self):
+        pool = PasswordPool(kind="process", workers=1, max_pending=0)
+        hashed = await pool.run(hash_password, "secret")
+        self.assertTrue(verify_password("secret", hashed))
+        pool.shutdown()
+
+    async def test_back_pressure(self):
+        pool = PasswordPool(kind="thread", workers=1, max_pending=1)
+        release = threading.Event()
+        running = [asyncio.create_task(pool.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with self.assertRaises(PasswordPoolBusy):
+            await pool.run(release.wait)
+        self.assertEqual(pool.stats()["in_flight"], 2)
+        release.set()
+        await asyncio.gather(*running)
+        self.assertEqual(pool.stats(), {"kind": "thread", "workers": 1, "max_pending": 1, "in_flight": 0, "rejected": 1})
+        self.assertTrue(await pool.run(release.wait))
+        pool.shutdown()
+
+    async def test_saturated_pool_answers_503(self):
+        with patch("src.services.auth.password_pool.run", side_effect=PasswordPoolBusy()):
+            with self.assertRaises(HTTPException) as cm:
+                await auth_service.verify_password_async("secret", "hash")
+        self.assertEqual(cm.exception.status_code, 503)
+        self.assertEqual(cm.exception.headers, {"Retry-After": "1"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+import redis
+from fastapi import HTTPException
+
+from src.services.rate_limit import LocalRateLimiter, MemoryRateLimiter, RateLimit, RateLimiter, RedisRateLimiter, \
+    client_identifier, parse_rate_limit, sliding_window
+
+READS = RateLimit(2, 5)
+
+
+class SlidingWindowTests(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(parse_rate_limit('2/5'), RateLimit(2, 5.0))
+        self.assertEqual(parse_rate_limit('10'), RateLimit(10, 1.0))
+
+    def test_previous_window_is_weighted(self):
+        # 4 of 5 seconds of the previous window are still covered: 2 * 0.8 + 0 = 1.6 requests
+        self.assertFalse(sliding_window(READS, previous=2, current=0, now=101).allowed)
+        # half covered: 2 * 0.5 = 1 request, one more fits
+        decision = sliding_window(READS, previous=2, current=0, now=102.5)
+        self.assertTrue(decision.allowed)
+        self.assertEqual(decision.remaining, 0)
+
+    def test_client_identifier_ignores_client_controlled_hops(self):
+        request = MagicMock(headers={'X-Forwarded-For': 'spoofed, 203.0.113.7, 10.0.0.2'})
+        request.client.host = '10.0.0.1'
+        self.assertEqual(client_identifier(request, trusted_proxies=0), '10.0.0.1')
+        self.assertEqual(client_identifier(request, trusted_proxies=1), '10.0.0.2')
+        self.assertEqual(client_identifier(request, trusted_proxies=2), '203.0.113.7')
+        self.assertEqual(client_identifier(request, trusted_proxies=4), '10.0.0.1')
+
+    def test_base_limiter_is_abstract(self):
+        with self.assertRaises(TypeError):
+            RateLimiter({'reads': READS})
+
+    def test_retry_after(self):
+        decision = sliding_window(READS, previous=2, current=0, now=101)
+        self.assertAlmostEqual(decision.retry_after, 1.5)
+        decision = sliding_window(READS, previous=0, current=2, now=101)
+        self.assertAlmostEqual(decision.retry_after, 4 + 2.5)
+
+
+class MemoryRateLimiterTests(unittest.TestCase):
+    def setUp(self):
+        self.limiter = MemoryRateLimiter({'reads': READS})
+
+    def test_limit_per_identifier(self):
+        self.assertTrue(self.limiter.hit('user:1', 'reads', READS, now=100).allowed)
+        self.assertTrue(self.limiter.hit('user:1', 'reads', READS, now=100).allowed)
+        self.assertFalse(self.limiter.hit('user:1', 'reads', READS, now=101).allowed)
+        self.assertTrue(self.limiter.hit('user:2', 'reads', READS, now=101).allowed)
+        stats = self.limiter.stats()
+        self.assertEqual((stats['allowed'], stats['rejected']), (3, 1))
+
+    def test_window_slides(self):
+        self.limiter.hit('user:1', 'reads', READS, now=100)
+        self.limiter.hit('user:1', 'reads', READS, now=100)
+        self.assertFalse(self.limiter.hit('user:1', 'reads', READS, now=106).allowed)
+        self.assertTrue(self.limiter.hit('user:1', 'reads', READS, now=107.5).allowed)
+        self.assertTrue(self.limiter.hit('user:1', 'reads', READS, now=120).allowed)
+
+    def test_sweep_drops_ended_windows(self):
+        limiter = MemoryRateLimiter({'reads': READS}, max_keys=1)
+        limiter.hit('user:1', 'reads', READS, now=100)
+        limiter.hit('user:2', 'reads', READS, now=120)
+        self.assertEqual(list(limiter._counters), [('user:2', 'reads')])
+
+
+class CheckTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.limiter = MemoryRateLimiter({'search': RateLimit(1, 60), 'export_contacts': RateLimit(5, 60)})
+        self.response = MagicMock()
+        self.response.headers = {}
+
+    def request(self, route_name):
+        request = MagicMock()
+        request.scope = {'route': MagicMock()}
+        request.scope['route'].name = route_name
+        return request
+
+    async def test_headers_and_429(self):
+        await self.limiter.check(self.request('search_contacts'), self.response, 'search', 'user:1')
+        self.assertEqual(self.response.headers['X-RateLimit-Limit'], '1')
+        self.assertEqual(self.response.headers['X-RateLimit-Remaining'], '0')
+        with self.assertRaises(HTTPException) as error:
+            await self.limiter.check(self.request('search_contacts'), self.response, 'search', 'user:1')
+        self.assertEqual(error.exception.status_code, 429)
+        self.assertIn('Retry-After', error.exception.headers)
+
+    async def test_route_overrides_policy(self):
+        await self.limiter.check(self.request('export_contacts'), self.response, 'reads', 'user:1')
+        self.assertEqual(self.response.headers['X-RateLimit-Limit'], '5')
+
+    async def test_unlimited_policy(self):
+        await self.limiter.check(self.request('read_contacts'), self.response, 'reads', 'user:1')
+        self.assertEqual(self.response.headers, {})
+
+
+class RedisRateLimiterTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.script = AsyncMock()
+        self.client.register_script.return_value = self.script
+        self.limiter = RedisRateLimiter({'reads': READS}, self.client)
+
+    async def test_one_script_call_per_request(self):
+        self.script.return_value = [1, 0, 1]
+        decision = await self.limiter.acquire('user:1', 'reads', READS, now=101)
+        self.assertTrue(decision.allowed)
+        self.script.assert_awaited_once_with(
+            keys=['ratelimit:reads:user:1:20', 'ratelimit:reads:user:1:19'], args=[0.8, 2, 10], client=self.client)
+
+    async def test_script_decides(self):
+        self.script.return_value = [0, 0, 2]
+        self.assertFalse((await self.limiter.acquire('user:1', 'reads', READS, now=101)).allowed)
+
+    async def test_redis_down_allows(self):
+        self.script.side_effect = redis.ConnectionError()
+        self.assertTrue((await self.limiter.acquire('user:1', 'reads', READS, now=101)).allowed)
+        self.assertEqual(self.limiter.stats()['errors'], 1)
+
+
+class LocalRateLimiterTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.pipe = self.client.pipeline.return_value
+        self.pipe.execute = AsyncMock()
+        self.limiter = LocalRateLimiter({'reads': READS}, self.client)
+
+    def test_bucket_empties_and_refills(self):
+        self.assertTrue(self.limiter.hit('user:1', 'reads', READS, now=100).allowed)
+        self.assertEqual(self.limiter.hit('user:1', 'reads', READS, now=100).remaining, 0)
+        self.assertFalse(self.limiter.hit('user:1', 'reads', READS, now=101).allowed)
+        self.assertTrue(self.limiter.hit('user:1', 'reads', READS, now=103).allowed)
+        self.assertEqual(self.limiter.stats()['rejected'], 1)
+
+    async def test_sync_pushes_pending_requests_in_one_pipeline(self):
+        self.limiter.hit('user:1', 'reads', READS, now=100)
+        self.limiter.hit('user:2', 'reads', READS, now=100)
+        self.pipe.execute.return_value = [1, True, None, 1, True, None]
+        await self.limiter.sync(now=100.1)
+        self.client.pipeline.assert_called_once_with(transaction=False)
+        self.pipe.incrby.assert_any_call('ratelimit:reads:user:1:20', 1)
+        self.pipe.expire.assert_any_call('ratelimit:reads:user:1:20', 10)
+        self.pipe.get.assert_any_call('ratelimit:reads:user:1:19')
+        self.pipe.execute.assert_awaited_once()
+        self.assertEqual(self.limiter.stats()['syncs'], 1)
+
+    async def test_sync_applies_requests_of_other_workers(self):
+        self.limiter.hit('user:1', 'reads', READS, now=100)
+        self.pipe.execute.return_value = [1, True, '2']
+        await self.limiter.sync(now=100.1)
+        self.assertFalse(self.limiter.hit('user:1', 'reads', READS, now=100.2).allowed)
+
+    async def test_sync_skips_idle_buckets_and_drops_full_ones(self):
+        self.limiter.hit('user:1', 'reads', READS, now=100)
+        self.pipe.execute.return_value = [1, True, None]
+        await self.limiter.sync(now=100.1)
+        await self.limiter.sync(now=101)
+        self.assertEqual(self.pipe.execute.await_count, 1)
+        await self.limiter.sync(now=106)
+        self.assertEqual(self.limiter.stats()['buckets'], 0)
+
+    async def test_redis_errors_keep_local_limits(self):
+        self.limiter.hit('user:1', 'reads', READS, now=100)
+        self.pipe.execute.side_effect = redis.ConnectionError()
+        await self.limiter.sync(now=100.1)
+        self.assertEqual(self.limiter.stats()['errors'], 1)
+        self.assertTrue(self.limiter.hit('user:1', 'reads', READS, now=100.2).allowed)
+
+
+if __name__ == '__main__':
+    unittest.main()
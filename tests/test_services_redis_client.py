@@ -0,0 +1,47 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from src.conf.config import settings
+from src.services.redis_client import LazyRedis, close_redis, pubsub_redis, sync_redis
+
+
+class LazyRedisTests(unittest.TestCase):
+    def test_client_is_built_on_first_use(self):
+        factory = MagicMock()
+        client = LazyRedis(factory)
+        factory.assert_not_called()
+        self.assertFalse(client.built)
+        client.get('key')
+        client.set('key', 'value')
+        factory.assert_called_once_with()
+        factory.return_value.get.assert_called_once_with('key')
+        self.assertTrue(client.built)
+
+    def test_only_the_listener_client_blocks(self):
+        # building a client does not connect
+        sync_options = sync_redis._factory().connection_pool.connection_kwargs
+        pubsub_options = pubsub_redis._factory().connection_pool.connection_kwargs
+        self.assertEqual(sync_options['socket_timeout'], settings.redis_timeout)
+        self.assertIsNone(pubsub_options.get('socket_timeout'))
+
+
+class CloseRedisTests(unittest.IsolatedAsyncioTestCase):
+    async def test_close_unused_client(self):
+        with patch('src.services.redis_client.async_redis', LazyRedis(MagicMock())) as client:
+            await close_redis()
+            self.assertFalse(client.built)
+
+    async def test_close_resets_client(self):
+        built = AsyncMock()
+        built.connection_pool = AsyncMock()
+        with patch('src.services.redis_client.async_redis', LazyRedis(lambda: built)) as client:
+            await client.get('key')
+            built.get.assert_awaited_once_with('key')
+            await close_redis()
+            built.close.assert_awaited_once()
+            built.connection_pool.disconnect.assert_awaited_once()
+            self.assertFalse(client.built)
+
+
+if __name__ == '__main__':
+    unittest.main()
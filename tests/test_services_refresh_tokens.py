@@ -0,0 +1,108 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+import redis
+
+from src.services.refresh_tokens import REVOKE_SCRIPT, ROTATE_SCRIPT, RefreshStoreUnavailable, RefreshTokenStore
+
+
+class RefreshTokenStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.store = RefreshTokenStore(self.client, ttl=3600)
+        self.rotate = self.client.register_script.return_value
+
+    def test_registers_rotate_script_on_first_use(self):
+        self.client.register_script.assert_not_called()
+        self.rotate.return_value = 1
+        self.store.rotate('deadpool@example.com', 'fam', 'jti')
+        self.store.rotate('deadpool@example.com', 'fam', 'jti')
+        self.client.register_script.assert_called_once_with(ROTATE_SCRIPT)
+
+    def test_issue_starts_family(self):
+        claims = self.store.issue('deadpool@example.com')
+        pipe = self.client.pipeline.return_value
+        pipe.hset.assert_called_once_with(f"refresh:v1:family:{claims['fam']}",
+                                          mapping={'email': 'deadpool@example.com', 'jti': claims['jti']})
+        pipe.expire.assert_any_call(f"refresh:v1:family:{claims['fam']}", 3600)
+        pipe.sadd.assert_called_once_with('refresh:v1:sessions:deadpool@example.com', claims['fam'])
+        pipe.execute.assert_called_once()
+        self.assertEqual(self.store.stats()['issued'], 1)
+
+    def test_sessions_are_separate_families(self):
+        first = self.store.issue('deadpool@example.com')
+        second = self.store.issue('deadpool@example.com')
+        self.assertNotEqual(first['fam'], second['fam'])
+
+    def test_issue_without_redis_returns_none(self):
+        self.client.pipeline.return_value.execute.side_effect = redis.ConnectionError()
+        self.assertIsNone(self.store.issue('deadpool@example.com'))
+        self.assertEqual(self.store.stats()['errors'], 1)
+
+    def test_rotate_returns_next_jti(self):
+        self.rotate.return_value = 1
+        claims = self.store.rotate('deadpool@example.com', 'fam', 'jti')
+        self.assertEqual(claims['fam'], 'fam')
+        self.assertNotEqual(claims['jti'], 'jti')
+        self.rotate.assert_called_once_with(
+            keys=['refresh:v1:family:fam', 'refresh:v1:sessions:deadpool@example.com'],
+            args=['jti', claims['jti'], 3600, 'fam'], client=self.client)
+
+    def test_rotate_rejects_unknown_and_reused_tokens(self):
+        self.rotate.return_value = 0
+        self.assertIsNone(self.store.rotate('deadpool@example.com', 'fam', 'jti'))
+        self.rotate.return_value = -1
+        self.assertIsNone(self.store.rotate('deadpool@example.com', 'fam', 'jti'))
+        stats = self.store.stats()
+        self.assertEqual((stats['rejected'], stats['reused'], stats['rotated']), (1, 1, 0))
+
+    def test_rotate_without_redis_raises(self):
+        self.rotate.side_effect = redis.ConnectionError()
+        with self.assertRaises(RefreshStoreUnavailable):
+            self.store.rotate('deadpool@example.com', 'fam', 'jti')
+
+    def test_revoke_all_deletes_families_in_one_script(self):
+        self.store.revoke_all('deadpool@example.com')
+        self.client.register_script.assert_called_once_with(REVOKE_SCRIPT)
+        self.rotate.assert_called_once_with(keys=['refresh:v1:sessions:deadpool@example.com'],
+                                            args=['refresh:v1:family:'], client=self.client)
+        self.client.smembers.assert_not_called()
+        self.client.delete.assert_not_called()
+
+    def test_revoke_all_raises_on_redis_errors(self):
+        self.rotate.side_effect = redis.ConnectionError()
+        with self.assertRaises(RefreshStoreUnavailable):
+            self.store.revoke_all('deadpool@example.com')
+
+
+class AsyncRefreshTokenStoreTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.aclient = AsyncMock()
+        self.aclient.pipeline = MagicMock()
+        self.aclient.pipeline.return_value.execute = AsyncMock()
+        self.aclient.register_script = MagicMock(return_value=AsyncMock())
+        self.store = RefreshTokenStore(MagicMock(), ttl=3600, aclient=self.aclient)
+
+    async def test_aissue_and_arotate(self):
+        claims = await self.store.aissue('deadpool@example.com')
+        self.aclient.pipeline.return_value.execute.assert_awaited_once()
+        self.aclient.register_script.return_value.return_value = 1
+        next_claims = await self.store.arotate('deadpool@example.com', claims['fam'], claims['jti'])
+        self.assertEqual(next_claims['fam'], claims['fam'])
+        self.assertNotEqual(next_claims['jti'], claims['jti'])
+
+    async def test_arevoke_all_deletes_families_in_one_script(self):
+        await self.store.arevoke_all('deadpool@example.com')
+        self.aclient.register_script.assert_called_once_with(REVOKE_SCRIPT)
+        self.aclient.register_script.return_value.assert_awaited_once_with(
+            keys=['refresh:v1:sessions:deadpool@example.com'], args=['refresh:v1:family:'], client=self.aclient)
+
+    async def test_arevoke_all_raises_on_redis_errors(self):
+        self.aclient.register_script.return_value.side_effect = redis.ConnectionError()
+        with self.assertRaises(RefreshStoreUnavailable):
+            await self.store.arevoke_all('deadpool@example.com')
+        self.assertEqual(self.store.stats()['errors'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+
+from fastapi import APIRouter, FastAPI
+
+from main import app
+from src.conf.config import settings
+from src.services.route_audit import audit_routes, check_routes, sample_path
+
+
+def endpoint():
+    return {}
+
+
+class RouteAuditTests(unittest.TestCase):
+    def make_app(self, include_twice: bool) -> FastAPI:
+        router = APIRouter(prefix='/contacts')
+        router.add_api_route('/', endpoint, methods=['GET'])
+        router.add_api_route('/{contact_id}', endpoint, methods=['GET', 'DELETE'])
+        test_app = FastAPI(openapi_url=None, docs_url=None, redoc_url=None)
+        test_app.include_router(router)
+        if include_twice:
+            test_app.include_router(router)
+        return test_app
+
+    def test_report(self):
+        report = audit_routes(self.make_app(include_twice=False).routes, repeat=1)
+        self.assertEqual((report['routes'], report['endpoints'], report['duplicates']), (2, 3, []))
+        self.assertEqual(report['mean_match_scans'], round((1 + 2 + 2) / 3, 2))
+        self.assertEqual(report['max_match_scans'], 2)
+
+    def test_router_included_twice(self):
+        routes = self.make_app(include_twice=True).routes
+        report = audit_routes(routes, repeat=1)
+        self.assertEqual(report['routes'], 4)
+        self.assertEqual([(d['method'], d['path'], d['first'], d['index']) for d in report['duplicates']],
+                         [('GET', '/contacts/', 0, 2), ('DELETE', '/contacts/{contact_id}', 1, 3),
+                          ('GET', '/contacts/{contact_id}', 1, 3)])
+        with self.assertRaises(RuntimeError):
+            check_routes(routes, max_routes=64)
+
+    def test_app_route_table(self):
+        report = audit_routes(app.routes, repeat=1)
+        self.assertEqual(report['duplicates'], [])
+        self.assertLessEqual(report['routes'], settings.route_table_max)
+
+    def test_sample_path(self):
+        self.assertEqual(sample_path('/contacts/{contact_id}/notes/{note_id}'), '/contacts/1/notes/1')
+
+
+if __name__ == '__main__':
+    unittest.main()
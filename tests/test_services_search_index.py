@@ -0,0 +1,69 @@
+import unittest
+from datetime import date
+
+from src.database.models import Contact
+from src.services.search_index import ContactSearchIndex, tokenize
+
+
+def make_contact(contact_id, first_name, last_name, email, phone, user_id=1):
+    return Contact(id=contact_id, first_name=first_name, last_name=last_name, email=email, phone=phone,
+                   birthday=date(1990, 1, 1), user_id=user_id)
+
+
+class ContactSearchIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.index = ContactSearchIndex(memory_budget=10 * 1024 * 1024, ttl=60)
+        self.index.build(1, [
+            make_contact(1, 'John', 'Doe', 'john.doe@example.com', '380501112233'),
+            make_contact(2, 'Johnny', 'Johnson', 'johnny@example.com', '380501112244'),
+            make_contact(3, 'Jane', 'Smith', 'jane@sample.org', '380671112255'),
+        ])
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize('John.Doe@Example.com'), ['john', 'doe', 'example', 'com'])
+        self.assertEqual(tokenize(None), [])
+
+    def test_prefix_search(self):
+        results = self.index.search(1, 'joh')
+        self.assertEqual([contact['id'] for contact in results], [1, 2])
+
+    def test_all_tokens_must_match(self):
+        results = self.index.search(1, 'john doe')
+        self.assertEqual([contact['id'] for contact in results], [1])
+
+    def test_search_by_phone_and_limit(self):
+        self.assertEqual(len(self.index.search(1, '38050', limit=1)), 1)
+        self.assertEqual([contact['id'] for contact in self.index.search(1, '38067')], [3])
+
+    def test_not_loaded_user(self):
+        self.assertIsNone(self.index.search(2, 'john'))
+        self.assertFalse(self.index.is_loaded(2))
+
+    def test_incremental_updates(self):
+        self.index.upsert(make_contact(4, 'Bob', 'Marley', 'bob@example.com', '1'))
+        self.assertEqual([contact['id'] for contact in self.index.search(1, 'bob')], [4])
+        self.index.upsert(make_contact(1, 'Jack', 'Doe', 'jack@example.com', '380501112233'))
+        self.assertEqual([contact['id'] for contact in self.index.search(1, 'john')], [2])
+        self.index.remove(1, 2)
+        self.assertEqual(self.index.search(1, 'john'), [])
+
+    def test_remove_restores_memory(self):
+        used = self.index.memory_used
+        self.index.upsert(make_contact(4, 'Bob', 'Marley', 'bob@example.com', '1'))
+        self.index.remove(1, 4)
+        self.assertEqual(self.index.memory_used, used)
+
+    def test_lru_eviction(self):
+        self.index.memory_budget = self.index.memory_used + 1
+        self.index.build(2, [make_contact(10, 'Ann', 'Lee', 'ann@example.com', '2', user_id=2)])
+        self.assertFalse(self.index.is_loaded(1))
+        self.assertTrue(self.index.is_loaded(2))
+
+    def test_ttl_expiry(self):
+        self.index.ttl = -1
+        self.assertFalse(self.index.is_loaded(1))
+        self.assertEqual(self.index.memory_used, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
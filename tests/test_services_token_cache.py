@@ -0,0 +1,71 @@
+import time
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from jose import JWTError, jwt
+
+from src.database.models import User
+from src.services.auth import auth_service
+from src.services.token_cache import VerifiedTokenCache, token_key
+
+
+class VerifiedTokenCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.cache = VerifiedTokenCache(max_size=2)
+        self.claims = {"sub": "deadpool@example.com", "scope": "access_token", "exp": time.time() + 60}
+
+    def test_hit_until_exp(self):
+        self.cache.put("token", self.claims)
+        self.assertEqual(self.cache.get("token"), self.claims)
+        with patch("src.services.token_cache.time.time", return_value=self.claims["exp"]):
+            self.assertIsNone(self.cache.get("token"))
+        self.assertEqual(self.cache.stats(), {"size": 0, "hits": 1, "misses": 1})
+
+    def test_tokens_without_exp_are_not_cached(self):
+        self.cache.put("token", {"sub": "deadpool@example.com"})
+        self.assertIsNone(self.cache.get("token"))
+
+    def test_bounded(self):
+        for token in ("a", "b", "c"):
+            self.cache.put(token, self.claims)
+        self.assertIsNone(self.cache.get("a"))
+        self.assertIsNotNone(self.cache.get("c"))
+
+    def test_keyed_by_digest(self):
+        self.cache.put("token", self.claims)
+        self.assertEqual(list(self.cache._entries), [token_key("token")])
+        self.cache.discard("token")
+        self.assertIsNone(self.cache.get("token"))
+
+
+class DecodeAccessTokenTests(unittest.TestCase):
+    def setUp(self):
+        auth_service.token_cache.clear()
+        self.token = auth_service.create_access_token(data={"sub": "deadpool@example.com"})
+
+    def tearDown(self):
+        auth_service.token_cache.clear()
+
+    def test_signature_verified_once(self):
+        with patch("src.services.auth.jwt.decode", wraps=jwt.decode) as decode_mock:
+            first = auth_service.decode_access_token(self.token)
+            second = auth_service.decode_access_token(self.token)
+        self.assertEqual(first["sub"], "deadpool@example.com")
+        self.assertIs(first, second)
+        decode_mock.assert_called_once()
+
+    def test_invalid_token_is_not_cached(self):
+        with self.assertRaises(JWTError):
+            auth_service.decode_access_token(self.token + "x")
+        self.assertEqual(auth_service.token_cache.stats()["size"], 0)
+
+    def test_tokens_issued_before_revocation_are_revoked(self):
+        claims = auth_service.decode_access_token(self.token)
+        issued_at = datetime.utcfromtimestamp(claims["iat"])
+        self.assertFalse(auth_service.is_revoked(claims, User(tokens_revoked_at=None)))
+        self.assertFalse(auth_service.is_revoked(claims, User(tokens_revoked_at=issued_at)))
+        self.assertTrue(auth_service.is_revoked(claims, User(tokens_revoked_at=issued_at + timedelta(seconds=1))))
+
+if __name__ == '__main__':
+    unittest.main()
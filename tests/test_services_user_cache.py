@@ -0,0 +1,171 @@
+import unittest
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import redis
+
+from src.database.models import User
+from src.services.user_cache import INVALIDATION_CHANNEL, UserCache, dump_user, load_user
+
+
+class UserCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.cache = UserCache(self.client, ttl=900)
+        self.user = User(id=1, username='deadpool', email='deadpool@example.com', password='secret',
+                         refresh_token='token', avatar='https://example.com/avatar.jpg', confirmed=True,
+                         created_at=datetime(2023, 5, 1, 12, 30), tokens_revoked_at=datetime(2023, 6, 1, 8, 0))
+
+    def test_snapshot_round_trip(self):
+        user = load_user(dump_user(self.user))
+        self.assertEqual(user.id, 1)
+        self.assertEqual(user.email, 'deadpool@example.com')
+        self.assertEqual(user.created_at, datetime(2023, 5, 1, 12, 30))
+        self.assertEqual(user.tokens_revoked_at, datetime(2023, 6, 1, 8, 0))
+        self.assertTrue(user.confirmed)
+        self.assertIsNone(user.password)
+        self.assertIsNone(user.refresh_token)
+
+    def test_snapshot_is_compact(self):
+        payload = dump_user(self.user)
+        self.assertNotIn(b'secret', payload)
+        self.assertLess(len(payload), 120)
+
+    def test_set_uses_versioned_key_and_ttl(self):
+        self.cache.set(self.user)
+        self.client.set.assert_called_once_with('user:v2:deadpool@example.com', dump_user(self.user), ex=900)
+
+    def test_hit_and_miss_counters(self):
+        self.client.get.return_value = None
+        self.assertIsNone(self.cache.get('deadpool@example.com'))
+        self.client.get.return_value = dump_user(self.user)
+        self.assertEqual(self.cache.get('deadpool@example.com').username, 'deadpool')
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['hit_ratio']), (1, 1, 0.5))
+
+    def test_unreadable_payload_is_a_miss(self):
+        self.client.get.return_value = b'\x80\x04legacy pickle'
+        self.assertIsNone(self.cache.get('deadpool@example.com'))
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+    def test_redis_errors_are_misses(self):
+        self.client.get.side_effect = redis.ConnectionError()
+        self.client.pipeline().execute.side_effect = redis.ConnectionError()
+        self.assertIsNone(self.cache.get('deadpool@example.com'))
+        self.cache.invalidate('deadpool@example.com')
+        stats = self.cache.stats()
+        self.assertEqual((stats['misses'], stats['errors']), (1, 2))
+
+    def test_invalidate(self):
+        self.cache.invalidate('deadpool@example.com')
+        pipe = self.client.pipeline()
+        pipe.delete.assert_called_once_with('user:v2:deadpool@example.com')
+        pipe.publish.assert_called_once_with(INVALIDATION_CHANNEL, 'deadpool@example.com')
+        pipe.execute.assert_called_once()
+
+
+class LocalTierTests(unittest.TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.cache = UserCache(self.client, ttl=900, local_size=2, local_ttl=60)
+        self.cache._start_listener = MagicMock()
+        self.user = User(id=1, username='deadpool', email='deadpool@example.com',
+                         created_at=datetime(2023, 5, 1, 12, 30), confirmed=True)
+
+    def test_local_hit_skips_redis(self):
+        self.cache.set(self.user)
+        user = self.cache.get('deadpool@example.com')
+        self.assertEqual(user.username, 'deadpool')
+        self.assertIsNot(user, self.user)
+        self.client.get.assert_not_called()
+        self.assertEqual(self.cache.stats()['local_hits'], 1)
+
+    def test_redis_hit_fills_local_tier(self):
+        self.client.get.return_value = dump_user(self.user)
+        self.cache.get('deadpool@example.com')
+        self.cache.get('deadpool@example.com')
+        self.client.get.assert_called_once()
+
+    def test_local_tier_is_bounded(self):
+        for user_id in range(3):
+            self.cache.set(User(id=user_id, email=f'user{user_id}@example.com'))
+        self.client.get.return_value = None
+        self.assertIsNone(self.cache.get('user0@example.com'))
+        self.assertEqual(self.cache.get('user2@example.com').id, 2)
+        self.assertEqual(self.cache.stats()['local_size'], 2)
+
+    def test_local_entries_expire(self):
+        self.cache.local_ttl = 0
+        self.cache.set(self.user)
+        self.client.get.return_value = None
+        self.assertIsNone(self.cache.get('deadpool@example.com'))
+
+    def test_invalidate_drops_local_entry(self):
+        self.cache.set(self.user)
+        self.client.get.return_value = None
+        self.cache.invalidate('deadpool@example.com')
+        self.assertIsNone(self.cache.get('deadpool@example.com'))
+
+    def test_invalidation_message_drops_local_entry(self):
+        self.cache.set(self.user)
+        self.client.pubsub().listen.return_value = iter([
+            {'type': 'message', 'channel': INVALIDATION_CHANNEL.encode(), 'data': b'deadpool@example.com'},
+        ])
+        self.client.get.return_value = None
+        self.cache.clear_local = MagicMock()
+        with patch('src.services.user_cache.time.sleep', side_effect=StopIteration):
+            with self.assertRaises(StopIteration):
+                self.cache._listen()
+        self.assertIsNone(self.cache.get('deadpool@example.com'))
+        self.cache.clear_local.assert_called_once()
+
+    def test_listener_uses_its_own_client(self):
+        listener_client = MagicMock()
+        listener_client.pubsub().listen.return_value = iter([])
+        cache = UserCache(self.client, ttl=900, local_size=2, listener_client=listener_client)
+        with patch('src.services.user_cache.time.sleep', side_effect=StopIteration):
+            with self.assertRaises(StopIteration):
+                cache._listen()
+        listener_client.pubsub().subscribe.assert_called_once_with(INVALIDATION_CHANNEL)
+        self.client.pubsub.assert_not_called()
+
+
+class AsyncUserCacheTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.aclient = AsyncMock()
+        self.aclient.pipeline = MagicMock()
+        self.cache = UserCache(MagicMock(), ttl=900, aclient=self.aclient)
+        self.user = User(id=1, username='deadpool', email='deadpool@example.com',
+                         created_at=datetime(2023, 5, 1, 12, 30), confirmed=True)
+
+    async def test_aset_single_set_with_expiry(self):
+        await self.cache.aset(self.user)
+        self.aclient.set.assert_awaited_once_with('user:v2:deadpool@example.com', dump_user(self.user), ex=900)
+        self.aclient.expire.assert_not_called()
+
+    async def test_aget_decodes_str_payload(self):
+        self.aclient.get.return_value = dump_user(self.user).decode()
+        user = await self.cache.aget('deadpool@example.com')
+        self.assertEqual(user.username, 'deadpool')
+        self.assertEqual(self.cache.stats()['hits'], 1)
+
+    async def test_redis_down_is_a_miss(self):
+        self.aclient.get.side_effect = redis.ConnectionError()
+        self.aclient.set.side_effect = redis.ConnectionError()
+        self.assertIsNone(await self.cache.aget('deadpool@example.com'))
+        await self.cache.aset(self.user)
+        stats = self.cache.stats()
+        self.assertEqual((stats['misses'], stats['errors']), (1, 2))
+
+    async def test_ainvalidate_pipelines_delete_and_publish(self):
+        pipe = self.aclient.pipeline.return_value
+        pipe.execute = AsyncMock()
+        await self.cache.ainvalidate('deadpool@example.com')
+        self.aclient.pipeline.assert_called_once_with(transaction=False)
+        pipe.delete.assert_called_once_with('user:v2:deadpool@example.com')
+        pipe.publish.assert_called_once_with(INVALIDATION_CHANNEL, 'deadpool@example.com')
+        pipe.execute.assert_awaited_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
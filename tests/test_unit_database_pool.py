@@ -0,0 +1,56 @@
+import unittest
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from src.database.pool import PoolStats, InstrumentedQueuePool, pool_status
+
+
+class PoolStatsTests(unittest.TestCase):
+    def test_observe_buckets(self):
+        stats = PoolStats(buckets=[1, 10])
+        stats.observe(0.5)
+        stats.observe(5)
+        stats.observe(50)
+        histogram = stats.histogram()
+        self.assertEqual(histogram["checkouts"], 3)
+        self.assertEqual(histogram["buckets"], {"le_1ms": 1, "le_10ms": 1, "inf": 1})
+        self.assertEqual(histogram["wait_max_ms"], 50)
+
+    def test_empty_histogram(self):
+        histogram = PoolStats().histogram()
+        self.assertEqual(histogram["checkouts"], 0)
+        self.assertEqual(histogram["wait_avg_ms"], 0.0)
+
+
+class InstrumentedQueuePoolTests(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite://", poolclass=InstrumentedQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.01
+        )
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def test_checkout_is_recorded(self):
+        with self.engine.connect() as connection:
+            connection.execute(text("select 1"))
+            status = pool_status(self.engine.pool)
+            self.assertEqual(status["checked_out"], 1)
+        status = pool_status(self.engine.pool)
+        self.assertEqual(status["checked_out"], 0)
+        self.assertEqual(status["size"], 1)
+        self.assertEqual(status["wait"]["checkouts"], 1)
+
+    def test_timeout_is_recorded(self):
+        with self.engine.connect():
+            with self.assertRaises(PoolTimeoutError):
+                self.engine.connect()
+        self.assertEqual(pool_status(self.engine.pool)["wait"]["timeouts"], 1)
+
+    def test_pool_status_without_pool(self):
+        self.assertIsNone(pool_status(None))
+
+
+if __name__ == '__main__':
+    unittest.main()
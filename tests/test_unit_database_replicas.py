@@ -0,0 +1,170 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+import redis
+from sqlalchemy import create_engine, insert, select, text, update
+
+from src.database.models import Base, User
+from src.database.replicas import PrimaryPins, RedisPrimaryPins, ReplicaRouter, RoutingSession
+
+LAG_QUERY = "SELECT seconds FROM replication_lag"
+
+
+class ReplicaTestCase(unittest.TestCase):
+    # two SQLite files stand in for the primary and a replica, each user table names its database
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.engines = []
+        self.primary = self.database("primary")
+        self.replica = self.database("replica")
+
+    def tearDown(self):
+        for engine in self.engines:
+            engine.dispose()
+        self.directory.cleanup()
+
+    def database(self, name: str, lag: float = 0):
+        engine = create_engine(f"sqlite:///{os.path.join(self.directory.name, name)}.db")
+        self.engines.append(engine)
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as connection:
+            connection.execute(insert(User).values(id=1, username=name, email="deadpool@example.com", password="x"))
+            connection.execute(text("CREATE TABLE replication_lag (seconds FLOAT)"))
+            connection.execute(text("INSERT INTO replication_lag VALUES (:lag)"), {"lag": lag})
+        return engine
+
+    def set_lag(self, engine, lag: float) -> None:
+        with engine.begin() as connection:
+            connection.execute(text("UPDATE replication_lag SET seconds = :lag"), {"lag": lag})
+
+
+class RoutingSessionTests(ReplicaTestCase):
+    def session(self, replica=True):
+        return RoutingSession(primary=self.primary, replica=self.replica if replica else None, autoflush=False)
+
+    def test_reads_go_to_replica(self):
+        with self.session() as session:
+            self.assertEqual(session.execute(select(User.username)).scalar(), "replica")
+            self.assertEqual(session.query(User).first().username, "replica")
+
+    def test_without_replica_reads_primary(self):
+        with self.session(replica=False) as session:
+            self.assertEqual(session.execute(select(User.username)).scalar(), "primary")
+
+    def test_session_reads_its_writes(self):
+        with self.session() as session:
+            session.execute(update(User).values(username="updated"))
+            self.assertEqual(session.execute(select(User.username)).scalar(), "updated")
+            session.commit()
+        with self.replica.connect() as connection:
+            self.assertEqual(connection.execute(select(User.username)).scalar(), "replica")
+
+    def test_flush_goes_to_primary(self):
+        with self.session() as session:
+            session.add(User(id=2, username="new", email="new@example.com", password="x"))
+            session.flush()
+            self.assertEqual(session.query(User).filter(User.id == 2).one().username, "new")
+            session.rollback()
+
+    def test_select_for_update_goes_to_primary(self):
+        with self.session() as session:
+            self.assertEqual(session.execute(select(User.username).with_for_update()).scalar(), "primary")
+
+
+class ReplicaRouterTests(ReplicaTestCase):
+    def router(self, *replicas, check_interval=0, max_lag=5):
+        return ReplicaRouter(self.primary, list(replicas), max_lag=max_lag, check_interval=check_interval,
+                             lag_query=LAG_QUERY)
+
+    def test_round_robin(self):
+        second = self.database("second")
+        router = self.router(self.replica, second)
+        self.assertEqual([router.choose() for _ in range(4)], [self.replica, second, self.replica, second])
+        self.assertEqual([replica["reads"] for replica in router.stats()["replicas"]], [2, 2])
+
+    def test_without_replicas(self):
+        router = self.router()
+        self.assertIsNone(router.choose())
+        self.assertEqual(router.stats()["fallbacks"], 0)
+
+    def test_down_replica_is_skipped(self):
+        down = create_engine(f"sqlite:///{os.path.join(self.directory.name, 'missing', 'replica.db')}")
+        self.engines.append(down)
+        router = self.router(down, self.replica)
+        self.assertEqual([router.choose() for _ in range(2)], [self.replica, self.replica])
+        stats = router.stats()["replicas"][0]
+        self.assertFalse(stats["healthy"])
+        self.assertGreaterEqual(stats["errors"], 1)
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        router = self.router(self.replica)
+        self.set_lag(self.replica, 30)
+        self.assertIsNone(router.choose())
+        self.assertEqual(router.stats()["fallbacks"], 1)
+        self.assertEqual(router.stats()["replicas"][0]["lag"], 30)
+        self.set_lag(self.replica, 1)
+        self.assertIs(router.choose(), self.replica)
+
+    def test_checks_run_once_per_interval(self):
+        router = self.router(self.replica, check_interval=60)
+        self.assertIs(router.choose(), self.replica)
+        self.set_lag(self.replica, 30)
+        self.assertIs(router.choose(), self.replica)
+
+
+class PrimaryPinsTests(unittest.TestCase):
+    def test_pin(self):
+        pins = PrimaryPins(seconds=60)
+        self.assertFalse(pins.pinned(1))
+        pins.pin(1)
+        self.assertTrue(pins.pinned(1))
+        pins.clear()
+        self.assertFalse(pins.pinned(1))
+
+    def test_pin_expires(self):
+        pins = PrimaryPins(seconds=0)
+        pins.pin(1)
+        self.assertFalse(pins.pinned(1))
+
+    def test_oldest_pins_are_dropped(self):
+        pins = PrimaryPins(seconds=60, size=2)
+        for user_id in (1, 2, 3):
+            pins.pin(user_id)
+        self.assertEqual([pins.pinned(user_id) for user_id in (1, 2, 3)], [False, True, True])
+
+
+class RedisPrimaryPinsTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.aclient = AsyncMock()
+        self.pins = RedisPrimaryPins(self.client, self.aclient, seconds=10)
+
+    async def test_pin_is_shared(self):
+        await self.pins.apin(1)
+        self.aclient.set.assert_awaited_once_with('replicas:v1:pin:1', 1, px=10000)
+        # another worker only sees the Redis key
+        other = RedisPrimaryPins(self.client, self.aclient, seconds=10)
+        self.client.exists.return_value = 1
+        self.assertTrue(other.pinned(1))
+        self.aclient.exists.return_value = 0
+        self.assertFalse(await other.apinned(2))
+
+    async def test_local_pin_skips_redis(self):
+        self.pins.pin(1)
+        self.client.set.assert_called_once_with('replicas:v1:pin:1', 1, px=10000)
+        self.assertTrue(await self.pins.apinned(1))
+        self.aclient.exists.assert_not_awaited()
+
+    async def test_redis_errors_read_from_the_primary(self):
+        self.client.exists.side_effect = redis.ConnectionError()
+        self.aclient.exists.side_effect = redis.ConnectionError()
+        self.assertTrue(self.pins.pinned(1))
+        self.assertTrue(await self.pins.apinned(1))
+        self.assertEqual(self.pins.stats()['errors'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import os
+import tempfile
+import unittest
+from datetime import date
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.exc import IntegrityError
+
+from src.database.models import Base, Contact, User, UserShard
+from src.database.rebalance import move_user, record_assignments
+from src.database.shards import MAIN_SHARD, ShardMap
+
+
+class ShardTestCase(unittest.TestCase):
+    # SQLite files stand in for the main database and the shard "east"
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.main = self.database("main")
+        self.east = self.database("east")
+        self.shards = ShardMap(self.main, {"east": self.east}, lookup_ttl=60)
+        with self.main.begin() as connection:
+            connection.execute(insert(User), [
+                {"id": user_id, "username": f"user{user_id}", "email": f"user{user_id}@example.com",
+                 "password": "hash", "confirmed": True} for user_id in range(1, 4)
+            ])
+
+    def tearDown(self):
+        self.main.dispose()
+        self.east.dispose()
+        self.directory.cleanup()
+
+    def database(self, name: str):
+        engine = create_engine(f"sqlite:///{os.path.join(self.directory.name, name)}.db")
+        Base.metadata.create_all(bind=engine)
+        return engine
+
+    def add_contacts(self, engine, user_id: int, ids):
+        with engine.begin() as connection:
+            connection.execute(insert(Contact), [
+                {"id": contact_id, "first_name": f"contact{contact_id}", "last_name": "Doe",
+                 "email": f"contact{contact_id}@example.com", "phone": f"+100{contact_id}",
+                 "birthday": date(1990, 1, 1), "user_id": user_id} for contact_id in ids
+            ])
+
+    def contact_ids(self, engine, user_id: int):
+        with engine.connect() as connection:
+            return connection.execute(select(Contact.id).where(Contact.user_id == user_id)
+                                      .order_by(Contact.id)).scalars().all()
+
+
+class ShardMapTests(ShardTestCase):
+    def test_hash_is_stable(self):
+        self.assertEqual([self.shards.hashed(user_id) for user_id in range(100)],
+                         [ShardMap(self.main, {"east": self.east}).hashed(user_id) for user_id in range(100)])
+        self.assertEqual({self.shards.hashed(user_id) for user_id in range(100)}, {MAIN_SHARD, "east"})
+
+    def test_without_shards_everything_is_main(self):
+        shards = ShardMap(self.main, {})
+        self.assertFalse(shards.enabled)
+        self.assertEqual(shards.shard_for(1), MAIN_SHARD)
+        self.assertEqual(shards.lookups, 0)
+
+    def test_lookup_table_overrides_hash(self):
+        other = "east" if self.shards.hashed(1) == MAIN_SHARD else MAIN_SHARD
+        self.shards.assign(1, other)
+        self.assertEqual(self.shards.shard_for(1), other)
+
+    def test_lookups_are_cached(self):
+        self.shards.shard_for(1)
+        self.shards.shard_for(1)
+        self.assertEqual(self.shards.lookups, 1)
+        with self.main.begin() as connection:
+            connection.execute(insert(UserShard).values(user_id=1, shard="west"))
+        self.assertEqual(self.shards.shard_for(1), self.shards.hashed(1))
+        self.shards.forget(1)
+        with self.assertRaises(LookupError):
+            self.shards.shard_for(1)
+
+    def test_check_id_ranges(self):
+        self.assertEqual(self.shards.check_id_ranges(), [])
+        self.add_contacts(self.main, 1, [1, 2])
+        self.add_contacts(self.east, 2, [10, 11])
+        self.assertEqual(self.shards.check_id_ranges(), [(MAIN_SHARD, 1, 2), ("east", 10, 11)])
+        self.add_contacts(self.east, 2, [2])
+        with self.assertRaises(RuntimeError):
+            self.shards.check_id_ranges()
+
+    def test_ensure_user_copies_the_user_row(self):
+        with self.main.connect() as connection:
+            user = connection.execute(select(User).where(User.id == 2)).first()
+        self.shards.ensure_user("east", user)
+        self.shards.ensure_user("east", user)
+        with self.east.connect() as connection:
+            copies = connection.execute(select(User.email, User.password).where(User.id == 2)).all()
+        self.assertEqual([tuple(copy) for copy in copies], [("user2@example.com", "")])
+
+
+class RebalanceTests(ShardTestCase):
+    def setUp(self):
+        super().setUp()
+        self.shards.assign(1, MAIN_SHARD)
+        self.add_contacts(self.main, 1, range(1, 8))
+
+    def test_move_user(self):
+        result = move_user(self.shards, 1, "east", batch_size=3, settle=0)
+        self.assertEqual(result, {"user_id": 1, "source": MAIN_SHARD, "target": "east", "copied": 7, "deleted": 7})
+        self.assertEqual(self.contact_ids(self.east, 1), list(range(1, 8)))
+        self.assertEqual(self.contact_ids(self.main, 1), [])
+        self.assertEqual(self.shards.shard_for(1), "east")
+
+    def test_contacts_created_during_the_move_are_copied(self):
+        result = move_user(self.shards, 1, "east", batch_size=3,
+                           sleep=lambda seconds: self.add_contacts(self.main, 1, [8]))
+        self.assertEqual(result["copied"], 8)
+        self.assertEqual(self.contact_ids(self.east, 1), list(range(1, 9)))
+
+    def test_overlapping_ids_stop_the_move(self):
+        self.add_contacts(self.east, 2, [5])
+        with self.assertRaises(RuntimeError):
+            move_user(self.shards, 1, "east", settle=0)
+        self.assertEqual(self.contact_ids(self.main, 1), list(range(1, 8)))
+
+    def test_move_to_the_same_shard(self):
+        self.assertEqual(move_user(self.shards, 1, MAIN_SHARD, settle=0)["copied"], 0)
+        self.assertEqual(self.contact_ids(self.main, 1), list(range(1, 8)))
+
+    def test_conflict_leaves_the_user_on_the_source(self):
+        with self.east.begin() as connection:
+            connection.execute(insert(Contact).values(id=100, first_name="taken", last_name="Doe",
+                                                      email="contact5@example.com", phone="+200", user_id=2))
+        with self.assertRaises(IntegrityError):
+            move_user(self.shards, 1, "east", batch_size=3, settle=0)
+        self.assertEqual(self.contact_ids(self.east, 1), [])
+        self.assertEqual(self.contact_ids(self.main, 1), list(range(1, 8)))
+        self.assertEqual(self.shards.shard_for(1), MAIN_SHARD)
+
+    def test_record_assignments(self):
+        self.assertEqual(record_assignments(self.shards, batch_size=1), 2)
+        self.assertEqual(record_assignments(self.shards), 0)
+        with self.main.connect() as connection:
+            recorded = dict(connection.execute(select(UserShard.user_id, UserShard.shard)).all())
+        self.assertEqual(recorded, {1: MAIN_SHARD, 2: self.shards.hashed(2), 3: self.shards.hashed(3)})
+
+
+if __name__ == '__main__':
+    unittest.main()
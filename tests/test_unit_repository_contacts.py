@@ -1,11 +1,15 @@
+import base64
+import json
 import unittest
 from unittest.mock import MagicMock
 from datetime import date, timedelta
 
+from sqlalchemy import create_engine
 from sqlalchemy.orm import Session
 
-from src.repository.contacts import get_contacts, get_contact, create_contact, update_contact, delete_contact, search_contacts, get_contacts_with_birthdays
-from src.database.models import Contact, User
+from src.repository.contacts import get_contacts, get_contact, create_contact, update_contact, delete_contact, search_contacts, get_contacts_with_birthdays, \
+    get_contacts_page, encode_cursor, decode_cursor, birthday_window, days_until_birthday, split_page
+from src.database.models import Base, Contact, User
 from src.schemas import ContactCreate, ContactUpdate
 
 
@@ -53,15 +57,77 @@ class ContactRepositoryTests(unittest.TestCase):
         contacts = get_contacts_with_birthdays(self.session, self.user)
 
         # Assert
-        self.assertEqual(contacts, expected_contacts)
+        self.assertEqual([contact.id for contact in contacts], [1, 2])
+        self.assertEqual([contact.days_until_birthday for contact in contacts], [0, 7])
+        self.assertEqual(contacts[0].full_name, 'John Doe')
         self.session.query().filter().filter().all.assert_called_once_with()
 
+    def test_birthday_window_wraps_around_new_year(self):
+        window = birthday_window(date(2023, 12, 28), 7)
+        self.assertEqual(str(window.compile(compile_kwargs={"literal_binds": True})),
+                         "contacts.birthday_doy >= 363 OR contacts.birthday_doy <= 4")
+        self.assertIsNone(birthday_window(date(2023, 12, 28), 365))
+
+    def test_birthday_window_keeps_feb_29_on_mar_1(self):
+        today = date(2023, 3, 1)
+        window = birthday_window(today, 0)
+        self.assertEqual(str(window.compile(compile_kwargs={"literal_binds": True})),
+                         "contacts.birthday_doy BETWEEN 60 AND 61")
+        self.assertEqual(days_until_birthday(date(1992, 2, 29), today), 0)
+        window = birthday_window(date(2024, 3, 1), 0)
+        self.assertEqual(str(window.compile(compile_kwargs={"literal_binds": True})),
+                         "contacts.birthday_doy BETWEEN 61 AND 61")
+
+    def test_days_until_birthday(self):
+        self.assertEqual(days_until_birthday(date(1990, 1, 2), date(2023, 12, 28)), 5)
+        self.assertEqual(days_until_birthday(date(1990, 12, 28), date(2023, 12, 28)), 0)
+        self.assertEqual(days_until_birthday(date(1992, 2, 29), date(2023, 2, 27)), 2)
+
+    def test_birthday_day_of_year_is_leap_normalized(self):
+        self.assertEqual(Contact(birthday=date(1991, 3, 1)).birthday_doy, 61)
+        self.assertEqual(Contact(birthday=date(1992, 2, 29)).birthday_doy, 60)
+
     def test_get_contacts(self):
         contacts = [Contact(), Contact(), Contact()]
         self.session.query().filter().offset().limit().all.return_value = contacts
         result = get_contacts(skip=0, limit=10, user=self.user, db=self.session)
         self.assertEqual(result, contacts)
 
+    def test_get_contacts_page(self):
+        contacts = [Contact(id=1), Contact(id=2), Contact(id=3)]
+        self.session.execute().scalars().all.return_value = contacts
+        page, next_cursor = get_contacts_page(limit=2, user=self.user, db=self.session)
+        self.assertEqual(page, contacts[:2])
+        self.assertEqual(decode_cursor(next_cursor, "id"), (2, 2))
+
+    def test_get_contacts_last_page(self):
+        contacts = [Contact(id=1)]
+        self.session.execute().scalars().all.return_value = contacts
+        page, next_cursor = get_contacts_page(limit=2, user=self.user, db=self.session)
+        self.assertEqual(page, contacts)
+        self.assertIsNone(next_cursor)
+
+    def test_cursor_round_trip(self):
+        contact = Contact(id=7, birthday=date(1990, 1, 1))
+        cursor = encode_cursor("birthday", contact)
+        self.assertEqual(decode_cursor(cursor, "birthday"), (date(1990, 1, 1), 7))
+
+    def test_cursor_with_forged_value(self):
+        for value in ({"x": 1}, [1], 1):
+            payload = json.dumps({"s": "email", "v": value, "id": 1}).encode()
+            with self.assertRaises(ValueError):
+                decode_cursor(base64.urlsafe_b64encode(payload).decode(), "email")
+
+    def test_split_page_without_rows(self):
+        self.assertEqual(split_page([], 2, "id"), ([], None))
+        self.assertEqual(split_page([Contact(id=1)], 0, "id"), ([], None))
+
+    def test_cursor_invalid(self):
+        with self.assertRaises(ValueError):
+            decode_cursor("not-a-cursor", "id")
+        with self.assertRaises(ValueError):
+            decode_cursor(encode_cursor("id", Contact(id=1)), "last_name")
+
     def test_get_contact_found(self):
         contact = Contact()
         self.session.query().filter().first.return_value = contact
@@ -93,27 +159,44 @@ class ContactRepositoryTests(unittest.TestCase):
             additional_info='Additional information',
             user_id=1
         )
-        self.session.add.side_effect = lambda obj: obj
-        self.session.commit.return_value = None
-        self.session.refresh.return_value = None
+        self.session.execute().one.return_value = created_contact
+        self.session.execute.reset_mock()
 
         # Act
         contact = create_contact(self.session, contact_data, self.user)
 
         # Assert
-        self.assertEqual(contact.id, None)
-        self.assertEqual(contact.first_name, created_contact.first_name)
+        self.assertEqual(contact, created_contact)
+        self.session.execute.assert_called_once()
+        self.session.commit.assert_called_once()
+        self.session.add.assert_not_called()
+        self.session.refresh.assert_not_called()
+
+    def test_create_contact_without_returning(self):
+        self.session.get_bind().dialect.insert_returning = False
+        contact_data = ContactCreate(first_name='John', last_name='Doe', email='john.doe@example.com',
+                                     phone='1234567890', birthday=date(1990, 1, 1))
+
+        contact = create_contact(self.session, contact_data, self.user)
+
+        self.assertEqual(contact.first_name, 'John')
+        self.assertEqual(contact.user_id, self.user.id)
+        self.session.add.assert_called_once_with(contact)
+        self.session.refresh.assert_called_once_with(contact)
 
     def test_remove_contact_found(self):
-        contact = Contact()
-        self.session.query().filter().first.return_value = contact
+        contact = Contact(id=1, user_id=1)
+        self.session.execute().one_or_none.return_value = contact
         result = delete_contact(contact_id=1, user=self.user, db=self.session)
         self.assertEqual(result, contact)
+        self.session.query.assert_not_called()
+        self.session.commit.assert_called_once()
 
     def test_delete_contact_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.session.execute().one_or_none.return_value = None
         with self.assertRaises(ValueError):
             delete_contact(db=self.session, contact_id=1, user=self.user)
+        self.session.commit.assert_not_called()
 
     def test_update_contact_found(self):
         contact_id = 1
@@ -126,7 +209,7 @@ class ContactRepositoryTests(unittest.TestCase):
             additional_info='Additional information',
         )
 
-        existing_contact = Contact(
+        updated_contact = Contact(
             id=1,
             first_name='John',
             last_name='Doe',
@@ -137,22 +220,16 @@ class ContactRepositoryTests(unittest.TestCase):
             user_id=1
         )
 
-        self.session.query().filter().first.return_value = existing_contact
-        self.session.commit.return_value = None
+        self.session.execute().one_or_none.return_value = updated_contact
+        self.session.execute.reset_mock()
 
         result = update_contact(self.session, contact_id, contact_data, self.user)
 
-        self.assertEqual(result.id, existing_contact.id)
-        self.assertEqual(result.first_name, contact_data.first_name)
-        self.assertEqual(result.last_name, contact_data.last_name)
-        self.assertEqual(result.email, contact_data.email)
-        self.assertEqual(result.phone, contact_data.phone)
-        self.assertEqual(result.birthday, contact_data.birthday)
-        self.assertEqual(result.additional_info, contact_data.additional_info)
-
-        self.session.query().filter().first.assert_called_once_with()
+        self.assertEqual(result, updated_contact)
+        self.session.execute.assert_called_once()
+        self.session.query.assert_not_called()
         self.session.commit.assert_called_once()
-        self.session.refresh.assert_called_once_with(existing_contact)
+        self.session.refresh.assert_not_called()
 
     def test_update_contact_not_found(self):
         contact_id = 1
@@ -165,10 +242,58 @@ class ContactRepositoryTests(unittest.TestCase):
             additional_info='Additional information',
         )
 
-        self.session.query().filter().first.return_value = None
+        self.session.execute().one_or_none.return_value = None
 
         with self.assertRaises(ValueError):
             update_contact(self.session, contact_id, contact_data, self.user)
+        self.session.commit.assert_not_called()
+
+    def test_update_contact_without_returning(self):
+        self.session.get_bind().dialect.update_returning = False
+        existing_contact = Contact(id=1, first_name='Jane', user_id=1)
+        self.session.query().filter().first.return_value = existing_contact
+
+        contact_data = ContactUpdate(first_name='John', last_name='Doe', email='john.doe@example.com',
+                                     phone='1234567890', birthday=date(1990, 1, 1))
+
+        result = update_contact(self.session, 1, contact_data, self.user)
+
+        self.assertEqual(result.first_name, 'John')
+        self.session.refresh.assert_called_once_with(existing_contact)
+
+class ContactPageNullsTests(unittest.TestCase):
+    # keyset pages over a real database, contacts without a birthday come last and are not skipped
+
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=self.engine)
+        self.session = Session(bind=self.engine)
+        self.user = User(id=1, username="user", email="user@example.com", password="hash")
+        birthdays = [None, date(1990, 1, 2), None, date(1990, 1, 1), date(1990, 1, 2)]
+        self.session.add(self.user)
+        self.session.add_all([Contact(id=contact_id, first_name=f"contact{contact_id}", birthday=birthday, user_id=1)
+                              for contact_id, birthday in enumerate(birthdays, start=1)])
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+
+    def test_pages_include_null_sort_keys(self):
+        ids, cursor = [], None
+        for _ in range(10):
+            page, cursor = get_contacts_page(limit=2, user=self.user, db=self.session, cursor=cursor, sort="birthday")
+            ids.extend(contact.id for contact in page)
+            if cursor is None:
+                break
+        self.assertEqual(ids, [4, 2, 5, 1, 3])
+
+    def test_cursor_inside_the_nulls(self):
+        cursor = encode_cursor("birthday", Contact(id=1, birthday=None))
+        page, next_cursor = get_contacts_page(limit=2, user=self.user, db=self.session, cursor=cursor, sort="birthday")
+        self.assertEqual([contact.id for contact in page], [3])
+        self.assertIsNone(next_cursor)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+from datetime import date
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.repository.contacts_async import get_contacts, get_contact, create_contact, update_contact, delete_contact, search_contacts
+from src.database.models import Contact, User
+from src.schemas import ContactCreate, ContactUpdate
+
+
+class AsyncContactRepositoryTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.session = AsyncMock(spec=AsyncSession)
+        self.result = MagicMock()
+        self.session.execute.return_value = self.result
+        self.session.get_bind = MagicMock()
+        self.user = User(id=1)
+        self.contact_data = ContactCreate(
+            first_name='John',
+            last_name='Doe',
+            email='john.doe@example.com',
+            phone='1234567890',
+            birthday=date(1990, 1, 1),
+            additional_info='Additional information'
+        )
+
+    async def test_get_contacts(self):
+        contacts = [Contact(), Contact(), Contact()]
+        self.result.scalars().all.return_value = contacts
+        result = await get_contacts(skip=0, limit=10, user=self.user, db=self.session)
+        self.assertEqual(result, contacts)
+        self.session.execute.assert_awaited_once()
+
+    async def test_get_contact_found(self):
+        contact = Contact()
+        self.result.scalars().first.return_value = contact
+        result = await get_contact(contact_id=1, user=self.user, db=self.session)
+        self.assertEqual(result, contact)
+
+    async def test_get_contact_not_found(self):
+        self.result.scalars().first.return_value = None
+        result = await get_contact(contact_id=1, user=self.user, db=self.session)
+        self.assertIsNone(result)
+
+    async def test_create_contact(self):
+        created_contact = Contact(id=1, first_name='John', user_id=1)
+        self.result.one.return_value = created_contact
+        contact = await create_contact(self.session, self.contact_data, self.user)
+        self.assertEqual(contact, created_contact)
+        self.session.execute.assert_awaited_once()
+        self.session.commit.assert_awaited_once()
+        self.session.refresh.assert_not_awaited()
+
+    async def test_create_contact_without_returning(self):
+        self.session.get_bind().dialect.insert_returning = False
+        contact = await create_contact(self.session, self.contact_data, self.user)
+        self.assertEqual(contact.first_name, 'John')
+        self.assertEqual(contact.user_id, self.user.id)
+        self.session.add.assert_called_once_with(contact)
+        self.session.refresh.assert_awaited_once_with(contact)
+
+    async def test_update_contact_found(self):
+        updated_contact = Contact(id=1, first_name='John', user_id=1)
+        self.result.one_or_none.return_value = updated_contact
+        result = await update_contact(self.session, 1, ContactUpdate(**self.contact_data.dict()), self.user)
+        self.assertEqual(result, updated_contact)
+        self.session.execute.assert_awaited_once()
+        self.session.commit.assert_awaited_once()
+
+    async def test_update_contact_not_found(self):
+        self.result.one_or_none.return_value = None
+        with self.assertRaises(ValueError):
+            await update_contact(self.session, 1, ContactUpdate(**self.contact_data.dict()), self.user)
+        self.session.commit.assert_not_awaited()
+
+    async def test_delete_contact_found(self):
+        contact = Contact(id=1, user_id=1)
+        self.result.one_or_none.return_value = contact
+        result = await delete_contact(contact_id=1, user=self.user, db=self.session)
+        self.assertEqual(result, contact)
+        self.session.execute.assert_awaited_once()
+        self.session.delete.assert_not_awaited()
+
+    async def test_delete_contact_not_found(self):
+        self.result.one_or_none.return_value = None
+        with self.assertRaises(ValueError):
+            await delete_contact(db=self.session, contact_id=1, user=self.user)
+
+    async def test_search_contacts_empty_query(self):
+        contacts = await search_contacts(self.session, None, self.user)
+        self.assertEqual(contacts, [])
+        self.session.execute.assert_not_awaited()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -11,6 +11,9 @@ class UserRepositoryTests(unittest.TestCase):
     def setUp(self):
         self.session = MagicMock(spec=Session())
         self.user = User(id=1)
+        patcher = patch('src.repository.users.user_cache')
+        self.user_cache = patcher.start()
+        self.addCleanup(patcher.stop)
 
     def test_get_user_by_email(self):
         # Arrange
@@ -37,7 +40,7 @@ class UserRepositoryTests(unittest.TestCase):
         g_mock.get_image.return_value = avatar_url
 
         Gravatar_mock = MagicMock(return_value=g_mock)
-        patcher = patch('src.repository.users.Gravatar', Gravatar_mock)
+        patcher = patch('libgravatar.Gravatar', Gravatar_mock)
         patcher.start()
 
         # Act
@@ -127,7 +130,7 @@ class UserRepositoryTests(unittest.TestCase):
         g_mock.get_image.side_effect = Exception("Failed to get Gravatar image")
 
         Gravatar_mock = MagicMock(return_value=g_mock)
-        patcher = patch('src.repository.users.Gravatar', Gravatar_mock)
+        patcher = patch('libgravatar.Gravatar', Gravatar_mock)
         patcher.start()
 
         # Act
@@ -143,6 +146,18 @@ class UserRepositoryTests(unittest.TestCase):
 
         patcher.stop()
 
+    def test_user_changes_invalidate_cache(self):
+        self.user.email = 'test@example.com'
+        self.session.query().filter().first.return_value = self.user
+
+        update_token(self.user, 'token123', self.session)
+        update_password(self.user, 'new_password', self.session)
+        update_avatar('test@example.com', 'https://example.com/avatar.jpg', self.session)
+        confirmed_email('test@example.com', self.session)
+
+        self.assertEqual(self.user_cache.invalidate.call_count, 4)
+        self.user_cache.invalidate.assert_called_with('test@example.com')
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.repository.users_async import get_user_by_email, create_user, update_token, confirmed_email, update_password, update_avatar
+from src.database.models import User
+from src.schemas import UserModel
+
+
+class AsyncUserRepositoryTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.session = AsyncMock(spec=AsyncSession)
+        self.result = MagicMock()
+        self.session.execute.return_value = self.result
+        self.user = User(id=1, email='test@example.com')
+        patcher = patch('src.repository.users_async.user_cache', new_callable=AsyncMock)
+        self.user_cache = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_get_user_by_email(self):
+        self.result.scalars().first.return_value = self.user
+        user = await get_user_by_email('test@example.com', self.session)
+        self.assertEqual(user, self.user)
+
+    async def test_create_user(self):
+        user_data = UserModel(email='test@example.com', username='test_user', password='password')
+        with patch('libgravatar.Gravatar') as gravatar_mock:
+            gravatar_mock.return_value.get_image.return_value = 'https://example.com/avatar.jpg'
+            created_user = await create_user(user_data, self.session)
+        self.assertEqual(created_user.avatar, 'https://example.com/avatar.jpg')
+        self.session.add.assert_called_once_with(created_user)
+        self.session.commit.assert_awaited_once()
+        self.session.refresh.assert_awaited_once_with(created_user)
+
+    async def test_update_token(self):
+        await update_token(self.user, 'token123', self.session)
+        self.assertEqual(self.user.refresh_token, 'token123')
+        self.session.commit.assert_awaited_once()
+
+    async def test_confirmed_email(self):
+        self.result.scalars().first.return_value = self.user
+        await confirmed_email('test@example.com', self.session)
+        self.assertTrue(self.user.confirmed)
+        self.session.commit.assert_awaited_once()
+
+    async def test_update_avatar(self):
+        self.result.scalars().first.return_value = self.user
+        user = await update_avatar('test@example.com', 'https://example.com/avatar.jpg', self.session)
+        self.assertEqual(user.avatar, 'https://example.com/avatar.jpg')
+        self.session.commit.assert_awaited_once()
+
+    async def test_update_password(self):
+        await update_password(self.user, 'new_password', self.session)
+        self.assertEqual(self.user.password, 'new_password')
+        self.session.commit.assert_awaited_once()
+
+    async def test_user_changes_invalidate_cache(self):
+        self.result.scalars().first.return_value = self.user
+        await update_token(self.user, 'token123', self.session)
+        await update_password(self.user, 'new_password', self.session)
+        await update_avatar('test@example.com', 'https://example.com/avatar.jpg', self.session)
+        await confirmed_email('test@example.com', self.session)
+        self.assertEqual(self.user_cache.ainvalidate.await_count, 4)
+        self.user_cache.ainvalidate.assert_awaited_with('test@example.com')
+
+
+if __name__ == '__main__':
+    unittest.main()